@@ -35,7 +35,33 @@
 
     # Category: Other
     OTHER_ITEM_NAME,            # 20
-) = range(21) 
+
+    # Editing an already published ad (/edit)
+    PUBLISHED_EDIT_CHOICE,      # 21
+    PUBLISHED_EDIT_VALUE,       # 22
+) = range(23) 
+
+# Readable names for the states above (logs, analytics)
+STATE_NAMES = {
+    LANG_SELECT: "LANG_SELECT", CATEGORY_SELECT: "CATEGORY_SELECT", PREVIEW: "PREVIEW",
+    EDIT_CHOICE: "EDIT_CHOICE", CHANGE_LANG_PROMPT: "CHANGE_LANG_PROMPT",
+    ASK_PRICE: "ASK_PRICE", ASK_LOCATION: "ASK_LOCATION", ASK_DESCRIPTION: "ASK_DESCRIPTION", ASK_MEDIA: "ASK_MEDIA",
+    CAR_MAKE_MODEL: "CAR_MAKE_MODEL", CAR_YEAR: "CAR_YEAR", CAR_MILEAGE: "CAR_MILEAGE",
+    HOUSE_PROPERTY_TYPE: "HOUSE_PROPERTY_TYPE", HOUSE_ROOMS: "HOUSE_ROOMS", HOUSE_AREA: "HOUSE_AREA",
+    HOUSE_YEAR_BUILT: "HOUSE_YEAR_BUILT",
+    ANIMAL_TYPE: "ANIMAL_TYPE", ANIMAL_BREED: "ANIMAL_BREED", ANIMAL_AGE: "ANIMAL_AGE", ANIMAL_SEX: "ANIMAL_SEX",
+    OTHER_ITEM_NAME: "OTHER_ITEM_NAME",
+    PUBLISHED_EDIT_CHOICE: "PUBLISHED_EDIT_CHOICE", PUBLISHED_EDIT_VALUE: "PUBLISHED_EDIT_VALUE",
+}
+
+# Terminal outcomes of the ad-creation flow (funnel analytics)
+FUNNEL_PUBLISHED = "PUBLISHED"
+FUNNEL_FAILED = "FAILED"
+FUNNEL_CANCELLED = "CANCELLED"
+FUNNEL_TIMEOUT = "TIMEOUT"
+FUNNEL_RESTARTED = "RESTARTED"
+FUNNEL_DUPLICATE = "DUPLICATE"
+FUNNEL_SUBMITTED = "SUBMITTED" # Sent to the moderation queue
 
 
 # Callback data prefixes
@@ -46,6 +72,10 @@ EDIT_FIELD_CALLBACK_PREFIX = "edit_field_"
 SKIP_FIELD_CALLBACK_PREFIX = "skip_field_" # For optional fields
 PROPERTY_TYPE_CALLBACK_PREFIX = "prop_type_"
 ANIMAL_SEX_CALLBACK_PREFIX = "animal_sex_"
+SEARCH_PAGE_CALLBACK_PREFIX = "srch_" # srch_n_<last id> / srch_p_<first id>
+MYADS_PAGE_CALLBACK_PREFIX = "myads_" # myads_n_<last id> / myads_p_<first id>
+UNSUBSCRIBE_CALLBACK_PREFIX = "unsub_" # unsub_<subscription id>
+PUBLISHED_EDIT_CALLBACK_PREFIX = "pedit_" # pedit_<field> / pedit_cancel
 
 
 # Callback data values for specific actions
@@ -90,4 +120,23 @@ EDITABLE_FIELDS_CATEGORY = {
     }
 }
 # Key for storing category-specific data dict within user_data
-CAT_SPECIFIC_DATA_KEY = "category_specific_data"
\ No newline at end of file
+CAT_SPECIFIC_DATA_KEY = "category_specific_data"
+# Key for typed values parsed from the user's answers (posts column -> number), see services/value_parser.py
+PARSED_VALUES_KEY = "parsed_values"
+# Key for the text of the user's last /search (pages are fetched with it)
+SEARCH_QUERY_KEY = "search_query"
+# /edit of a published ad: {"post_id": ..., "field": ...}, kept apart from the draft being created
+PUBLISHED_EDIT_KEY = "published_edit"
+# Content fingerprint of the draft, computed when the preview is shown (services/fingerprint.py)
+FINGERPRINT_KEY = "fingerprint"
+# Fingerprint the user chose to post despite the duplicate warning
+DUPLICATE_CONFIRMED_KEY = "duplicate_confirmed"
+# Idempotency token of the current draft, carried in the Post button's callback data
+DRAFT_TOKEN_KEY = "draft_token"
+# Separates the action from the draft token in preview callback data: action_post:<token>
+CALLBACK_TOKEN_SEPARATOR = ":"
+# Deep-link payload that opens an ad in the bot (digest posts link to https://t.me/<bot>?start=ad_<id>)
+AD_DEEP_LINK_PREFIX = "ad_"
+# Moderation queue buttons (mod_toggle:<id>, mod_approve, ...) and the moderator's page state in user_data
+MODERATION_CALLBACK_PREFIX = "mod_"
+MODERATION_PAGE_KEY = "moderation_page"
\ No newline at end of file
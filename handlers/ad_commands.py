@@ -0,0 +1,223 @@
+# selling_bot/handlers/ad_commands.py
+import logging
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler, ConversationHandler, MessageHandler, filters
+from telegram.constants import ParseMode
+
+import config
+import constants
+from localization import get_text, get_user_lang
+from services.storage import storage as db
+from services import message_formatter
+from services import value_parser
+from services.channel_router import channel_router
+from services import channel_publisher
+from services import expiry_scheduler
+from services.expiry_scheduler import format_utc, utcnow
+from handlers.conversation_flow import get_common_data
+from handlers.admin_commands import is_admin
+
+logger = logging.getLogger(__name__)
+
+BUMPABLE_STATUSES = ("published", "expired")
+EDITABLE_FIELDS = ("price", "location", "description") # Common fields an owner may change after publishing
+MAX_IDS_PER_COMMAND = 20
+
+
+def _parse_post_id(args) -> int | None:
+    """'/bump 42' or '/bump #42' (as shown in /myads) -> 42."""
+    if not args:
+        return None
+    value = args[0].lstrip("#")
+    return int(value) if value.isdigit() else None
+
+
+async def _get_post_with_text(post_id: int) -> dict | None:
+    """db.get_post, with the ad text rendered on demand for posts saved before it was stored."""
+    post = await db.get_post(post_id)
+    if post and not post['search_text']:
+        post['search_text'] = message_formatter.format_published_post(post)
+    return post
+
+
+async def _get_own_post(post_id: int, user_id: int, statuses: tuple) -> dict | None:
+    post = await _get_post_with_text(post_id)
+    if not post or post['user_id'] != user_id or post['status'] not in statuses:
+        return None
+    return post
+
+
+async def bump_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Reposts one of the user's ads at the top of the channel and restarts its lifetime."""
+    get_common_data(update, context)
+    lang = get_user_lang(context)
+    user_id = update.effective_user.id
+    post_id = _parse_post_id(context.args)
+    if post_id is None:
+        await update.message.reply_text(get_text("bump_usage", lang))
+        return
+    post = await _get_own_post(post_id, user_id, BUMPABLE_STATUSES)
+    if not post:
+        await update.message.reply_text(get_text("ad_not_found", lang, post_id=post_id))
+        return
+
+    next_allowed = expiry_scheduler.next_bump_allowed(post)
+    if utcnow() < next_allowed:
+        await update.message.reply_text(get_text("bump_too_soon", lang, time=format_utc(next_allowed)[:16]))
+        return
+    try:
+        sent_messages = await expiry_scheduler.bump_post(context.bot, post)
+    except Exception as e:
+        logger.error(f"Bump of post {post_id} failed: {e}", exc_info=True)
+        await update.message.reply_text(get_text("general_error", lang))
+        return
+
+    link = message_formatter.build_post_link(channel_router.main_chat, sent_messages[0].message_id) if sent_messages else None
+    await update.message.reply_text(get_text("bump_done", lang, post_id=post_id) + (f"\n{link}" if link else ""))
+
+
+# --- Deep links from digest posts ---
+async def open_ad_link(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/start ad_<id> (a link in a digest post or the review queue): sends the full ad with its media to the user."""
+    get_common_data(update, context)
+    lang = get_user_lang(context)
+    post_id = _parse_post_id([context.args[0][len(constants.AD_DEEP_LINK_PREFIX):]])
+    post = await _get_post_with_text(post_id) if post_id else None
+    # Moderators may open ads that are not (yet) public
+    if not post or (post['status'] != 'published' and not is_admin(update.effective_user.id)):
+        await update.message.reply_text(get_text("ad_not_found", lang, post_id=post_id))
+        return
+    await channel_publisher.send_ad(context.bot, update.effective_chat.id, post['search_text'], post['media_files'])
+
+
+def create_ad_link_handler() -> CommandHandler:
+    """Registered before the ad conversation, so its plain /start entry point doesn't take these links."""
+    return CommandHandler("start", open_ad_link, filters=filters.Regex(rf"^/start {constants.AD_DEEP_LINK_PREFIX}\d+$"))
+
+
+# --- /sold ---
+async def sold_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/sold 42 [43 ...]: marks ads as sold and relabels their channel posts in place."""
+    get_common_data(update, context)
+    lang = get_user_lang(context)
+    user_id = update.effective_user.id
+    post_ids = [post_id for post_id in (_parse_post_id([arg]) for arg in (context.args or [])[:MAX_IDS_PER_COMMAND]) if post_id]
+    if not post_ids:
+        await update.message.reply_text(get_text("sold_usage", lang))
+        return
+
+    sold_ids = await db.mark_posts_sold(post_ids, user_id) # One transaction for the whole batch
+    for post_id in sold_ids:
+        post = await db.get_post(post_id)
+        if post:
+            # Coalesced and paced by the edit queue; the caption is edited in place, nothing is reposted
+            await channel_router.enqueue_edit_everywhere(
+                post, message_formatter.format_status_label(get_text("channel_ad_sold", post['user_lang']), post['search_text'])
+            )
+    if not sold_ids:
+        await update.message.reply_text(get_text("ad_not_found", lang, post_id=", #".join(map(str, post_ids))))
+        return
+    await update.message.reply_text(get_text("sold_done", lang, post_ids=", ".join(f"#{post_id}" for post_id in sold_ids)))
+
+
+# --- /edit of a published ad ---
+def _published_edit_keyboard(lang: str) -> InlineKeyboardMarkup:
+    prefix = constants.PUBLISHED_EDIT_CALLBACK_PREFIX
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(get_text(f"btn_edit_{field}", lang), callback_data=f"{prefix}{field}") for field in EDITABLE_FIELDS],
+        [InlineKeyboardButton(get_text("btn_cancel", lang), callback_data=f"{prefix}cancel")],
+    ])
+
+
+async def edit_published_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    get_common_data(update, context)
+    lang = get_user_lang(context)
+    post_id = _parse_post_id(context.args)
+    if post_id is None:
+        await update.message.reply_text(get_text("edit_published_usage", lang))
+        return ConversationHandler.END
+    if not await _get_own_post(post_id, update.effective_user.id, ("published",)):
+        await update.message.reply_text(get_text("ad_not_found", lang, post_id=post_id))
+        return ConversationHandler.END
+
+    context.user_data[constants.PUBLISHED_EDIT_KEY] = {"post_id": post_id}
+    await update.message.reply_text(get_text("edit_published_choose", lang, post_id=post_id),
+                                    reply_markup=_published_edit_keyboard(lang))
+    return constants.PUBLISHED_EDIT_CHOICE
+
+
+async def handle_published_edit_choice(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+    lang = get_user_lang(context)
+    field = query.data[len(constants.PUBLISHED_EDIT_CALLBACK_PREFIX):]
+    edit = context.user_data.get(constants.PUBLISHED_EDIT_KEY)
+    if field not in EDITABLE_FIELDS or not edit:
+        context.user_data.pop(constants.PUBLISHED_EDIT_KEY, None)
+        await query.edit_message_text(get_text("edit_published_cancelled", lang))
+        return ConversationHandler.END
+    edit["field"] = field
+    await query.edit_message_text(get_text("edit_published_ask", lang, field_name=get_text(f"btn_edit_{field}", lang)),
+                                  parse_mode=ParseMode.MARKDOWN)
+    return constants.PUBLISHED_EDIT_VALUE
+
+
+async def handle_published_edit_value(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    lang = get_user_lang(context)
+    user_id = update.effective_user.id
+    edit = context.user_data.get(constants.PUBLISHED_EDIT_KEY) or {}
+    field, value = edit.get("field"), update.message.text.strip()
+
+    columns = {field: value}
+    if field == "price":
+        price_columns = value_parser.parse_price_columns(value)
+        if not price_columns:
+            await update.message.reply_text(get_text("price_invalid", lang))
+            return constants.PUBLISHED_EDIT_VALUE
+        columns.update(price_columns)
+    elif field == "description" and len(value) > config.MAX_DESCRIPTION_LENGTH:
+        await update.message.reply_text(get_text("description_too_long", lang))
+        return constants.PUBLISHED_EDIT_VALUE
+    elif not value:
+        await update.message.reply_text(get_text("invalid_input", lang))
+        return constants.PUBLISHED_EDIT_VALUE
+
+    context.user_data.pop(constants.PUBLISHED_EDIT_KEY, None)
+    post = await _get_own_post(edit.get("post_id"), user_id, ("published",))
+    rendered_text = message_formatter.format_published_post({**post, **columns}) if post else None
+    if not post or not await db.update_published_post(post['id'], user_id, columns, rendered_text):
+        await update.message.reply_text(get_text("ad_not_found", lang, post_id=edit.get("post_id")))
+        return ConversationHandler.END
+
+    await channel_router.enqueue_edit_everywhere(post, rendered_text)
+    logger.info(f"User {user_id} edited {field} of published post {post['id']}.")
+    await update.message.reply_text(get_text("edit_published_done", lang, post_id=post['id']))
+    return ConversationHandler.END
+
+
+async def cancel_published_edit(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    context.user_data.pop(constants.PUBLISHED_EDIT_KEY, None)
+    await update.message.reply_text(get_text("edit_published_cancelled", get_user_lang(context)))
+    return ConversationHandler.END
+
+
+def create_ad_handlers() -> list:
+    published_edit_conv = ConversationHandler(
+        entry_points=[CommandHandler("edit", edit_published_command)],
+        states={
+            constants.PUBLISHED_EDIT_CHOICE: [
+                CallbackQueryHandler(handle_published_edit_choice, pattern=f"^{constants.PUBLISHED_EDIT_CALLBACK_PREFIX}")
+            ],
+            constants.PUBLISHED_EDIT_VALUE: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_published_edit_value)
+            ],
+        },
+        fallbacks=[CommandHandler("cancel", cancel_published_edit)],
+        conversation_timeout=60 * 10,
+        per_user=True, per_chat=True,
+    )
+    return [
+        published_edit_conv,
+        CommandHandler("bump", bump_command),
+        CommandHandler("sold", sold_command),
+    ]
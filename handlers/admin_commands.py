@@ -0,0 +1,302 @@
+# selling_bot/handlers/admin_commands.py
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from telegram import Update
+from telegram.ext import Application, ContextTypes, ConversationHandler
+
+import config
+import constants
+from services import profiler
+from services import funnel_stats
+from services.storage import storage as db
+from services import broadcast as broadcast_service
+from services.broadcast import broadcast_engine
+from services import export
+from services import archive
+
+logger = logging.getLogger(__name__)
+
+
+def is_admin(user_id: int) -> bool:
+    return user_id in config.ADMIN_USER_IDS
+
+
+async def _reject_non_admin(update: Update) -> bool:
+    """Returns True (and logs) if the caller is not an admin. Non-admins get no reply, the command stays hidden."""
+    user = update.effective_user
+    if user and is_admin(user.id):
+        return False
+    logger.warning(f"User {user.id if user else 'unknown'} tried to use an admin command.")
+    return True
+
+
+# --- Profiling ---
+def _application_structures(application: Application) -> dict:
+    """Sizes of the PTB in-memory maps that tend to grow with traffic."""
+    sizes = {
+        "user_data.users": len(application.user_data),
+        "user_data.keys": sum(len(data) for data in application.user_data.values()),
+        "chat_data.chats": len(application.chat_data),
+        "bot_data.keys": len(application.bot_data),
+    }
+    for group in application.handlers.values():
+        for handler in group:
+            if isinstance(handler, ConversationHandler):
+                name = handler.name or handler.entry_points[0].callback.__name__
+                # No public accessor for the live conversation map
+                sizes[f"conversations.{name}"] = len(getattr(handler, "_conversations", {}))
+    return sizes
+
+
+async def _run_profile_and_report(application: Application, seconds: float, report_chat_id: int | None):
+    try:
+        result = await profiler.run_profile_window(seconds, lambda: _application_structures(application))
+    except RuntimeError as e:
+        logger.warning(f"Profiling request ignored: {e}")
+        if report_chat_id:
+            await application.bot.send_message(report_chat_id, str(e))
+        return
+    if report_chat_id:
+        await application.bot.send_message(
+            report_chat_id,
+            f"Profile finished.\nStacks: {result['stacks_path']}\nMemory: {result['memory_path']}\n\n{result['summary']}"
+        )
+
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/profile [seconds] - samples the running worker for a fixed window."""
+    if await _reject_non_admin(update):
+        return
+    seconds = config.PROFILE_DEFAULT_SECONDS
+    if context.args:
+        try:
+            seconds = float(context.args[0])
+        except ValueError:
+            await update.message.reply_text("Usage: /profile [seconds]")
+            return
+    if profiler.is_running():
+        await update.message.reply_text("A profiling window is already running.")
+        return
+    seconds = max(1.0, min(seconds, config.PROFILE_MAX_SECONDS))
+    await update.message.reply_text(f"Profiling for {seconds:.0f}s...")
+    # Run in the background so this handler (and the user's update slot) is released immediately
+    context.application.create_task(
+        _run_profile_and_report(context.application, seconds, update.effective_chat.id), update=update
+    )
+
+
+def install_profile_signal(application: Application, signum: int):
+    """Starts a default-length profiling window when the process receives `signum` (e.g. SIGUSR1)."""
+    loop = asyncio.get_running_loop()
+
+    def _on_signal():
+        if profiler.is_running():
+            logger.warning("Profiling signal received while a window is already running, ignoring.")
+            return
+        logger.info("Profiling signal received.")
+        application.create_task(_run_profile_and_report(application, config.PROFILE_DEFAULT_SECONDS, None))
+
+    try:
+        loop.add_signal_handler(signum, _on_signal)
+    except (NotImplementedError, AttributeError, ValueError) as e: # Windows has no add_signal_handler / SIGUSR1
+        logger.warning(f"Could not install profiling signal handler: {e}")
+
+
+# --- Funnel stats ---
+FUNNEL_TERMINAL_DROPS = (constants.FUNNEL_CANCELLED, constants.FUNNEL_TIMEOUT, constants.FUNNEL_RESTARTED,
+                         constants.FUNNEL_FAILED, constants.FUNNEL_DUPLICATE)
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+def _format_ms(ms) -> str:
+    if ms is None:
+        return "-"
+    return f"{ms / 1000:.1f}s" if ms < 60_000 else f"{ms / 60_000:.1f}m"
+
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/stats [hours] - ad-creation funnel from the per-minute rollups (default: last 24h)."""
+    if await _reject_non_admin(update):
+        return
+    hours = 24
+    if context.args:
+        try:
+            hours = max(1, int(context.args[0]))
+        except ValueError:
+            await update.message.reply_text("Usage: /stats [hours]")
+            return
+
+    since = (datetime.now(timezone.utc) - timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M:%S")
+    summary = await funnel_stats.get_funnel_summary(since)
+    if not summary:
+        await update.message.reply_text(f"No funnel data for the last {hours}h.")
+        return
+
+    lines = [f"Ad funnel, last {hours}h (count, p50, p90 time in step)"]
+    for category in sorted(summary):
+        transitions = summary[category]
+        lines.append(f"\n[{category}]")
+        for (from_state, to_state), sketch in sorted(transitions.items(), key=lambda item: -item[1].count):
+            lines.append(f"{from_state} → {to_state}: {int(sketch.count)}, "
+                         f"{_format_ms(sketch.quantile(0.5))}, {_format_ms(sketch.quantile(0.9))}")
+
+        drops = {}
+        for (from_state, to_state), sketch in transitions.items():
+            if to_state in FUNNEL_TERMINAL_DROPS:
+                drops[from_state] = drops.get(from_state, 0) + int(sketch.count)
+        if drops:
+            lines.append("Drop-off: " + ", ".join(f"{state} {count}" for state, count in
+                                                  sorted(drops.items(), key=lambda item: -item[1])))
+
+    text = "\n".join(lines)
+    if len(text) > TELEGRAM_MESSAGE_LIMIT:
+        text = text[:TELEGRAM_MESSAGE_LIMIT - 4] + "\n..."
+    await update.message.reply_text(text)
+
+
+# --- Dashboard ---
+PUBLISH_FAILURE_PREFIX = "failed_to_publish_" # Every failed_to_publish_* variant, old ones included
+PUBLISH_SUCCESS_STATUSES = ("published", "expired", "sold") # Reached the channel at some point
+
+
+def _format_status_counts(counts: dict) -> str:
+    return ", ".join(f"{status} {count}" for status, count in sorted(counts.items(), key=lambda item: -item[1]))
+
+
+def _format_dashboard(totals: list, daily: list, days: int) -> str:
+    by_status, by_category = {}, {}
+    for category, status, count in totals:
+        by_status[status] = by_status.get(status, 0) + count
+        by_category.setdefault(category, {})[status] = count
+    failed = sum(count for status, count in by_status.items() if (status or "").startswith(PUBLISH_FAILURE_PREFIX))
+    attempted = failed + sum(by_status.get(status, 0) for status in PUBLISH_SUCCESS_STATUSES)
+
+    lines = [f"Posts: {sum(by_status.values())} ({_format_status_counts(by_status)})",
+             "Publish failure rate: " + (f"{failed / attempted:.1%} ({failed} of {attempted})" if attempted else "-")]
+    for category in sorted(by_category):
+        lines.append(f"[{category}] {_format_status_counts(by_category[category])}")
+
+    lines.append(f"\nNew posts per day, last {days} days")
+    per_day = {}
+    for day, category, _, count in daily:
+        per_day.setdefault(day, {})
+        per_day[day][category] = per_day[day].get(category, 0) + count
+    for day, categories in per_day.items():
+        lines.append(f"{day}: {sum(categories.values())} (" + ", ".join(f"{category} {count}" for category, count in
+                                                                     sorted(categories.items())) + ")")
+    if not per_day:
+        lines.append("None.")
+    text = "\n".join(lines)
+    return text if len(text) <= TELEGRAM_MESSAGE_LIMIT else text[:TELEGRAM_MESSAGE_LIMIT - 4] + "\n..."
+
+
+async def dashboard_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/dashboard [days] - post counts and publish failure rate, read from the summary tables only."""
+    if await _reject_non_admin(update):
+        return
+    days = 7
+    if context.args:
+        try:
+            days = max(1, int(context.args[0]))
+        except ValueError:
+            await update.message.reply_text("Usage: /dashboard [days]")
+            return
+    since_day = (datetime.now(timezone.utc) - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    try:
+        totals, daily = await db.get_post_stats(since_day)
+    except TimeoutError:
+        await update.message.reply_text("The database is busy, try /dashboard again in a moment.")
+        return
+    await update.message.reply_text(_format_dashboard(totals, daily, days))
+
+
+async def dashboard_rebuild_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/dashboard_rebuild - recomputes the summary tables from the posts table and the archives (one full scan)."""
+    if await _reject_non_admin(update):
+        return
+    await update.message.reply_text("Rebuilding post stats...")
+    total = await db.rebuild_post_stats(archive.archive_paths())
+    logger.info(f"Admin {update.effective_user.id} rebuilt the post stats.")
+    await update.message.reply_text(f"Post stats rebuilt from {total} posts.")
+
+
+# --- Broadcasts ---
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/broadcast <text> - sends the text to every user; without text, shows the progress of the latest broadcast."""
+    if await _reject_non_admin(update):
+        return
+    parts = update.message.text.split(maxsplit=1) # Keeps the announcement's line breaks
+    if len(parts) < 2:
+        broadcast = await db.get_broadcast()
+        await update.message.reply_text(broadcast_service.format_progress(broadcast) if broadcast else
+                                        "No broadcasts yet. Usage: /broadcast <text>")
+        return
+    broadcast_id = await broadcast_engine.begin(parts[1], update.effective_user.id)
+    if broadcast_id is None:
+        await update.message.reply_text(f"Broadcast #{broadcast_engine.running_id} is still running "
+                                        "(/broadcast for progress, /broadcast_cancel to stop it).")
+        return
+    logger.info(f"Admin {update.effective_user.id} started broadcast {broadcast_id}.")
+    await update.message.reply_text(f"Broadcast #{broadcast_id} started. You'll get a report when it's done.")
+
+
+async def broadcast_cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/broadcast_cancel - stops the running broadcast for good."""
+    if await _reject_non_admin(update):
+        return
+    broadcast_id = await broadcast_engine.cancel()
+    if not broadcast_id:
+        await update.message.reply_text("No broadcast is running.")
+        return
+    await update.message.reply_text(broadcast_service.format_progress(await db.get_broadcast(broadcast_id)))
+
+
+# --- Exports ---
+EXPORT_USAGE = ("Usage: /export [csv|parquet] [from=YYYY-MM-DD] [to=YYYY-MM-DD] [category=...] [status=...]\n"
+                "Formats available here: {formats}")
+EXPORT_FILTERS = {"from": "date_from", "to": "date_to", "category": "category", "status": "status"}
+
+
+def _parse_export_args(args: list) -> dict | None:
+    options = {"fmt": "csv"}
+    for arg in args:
+        key, sep, value = arg.partition("=")
+        if not sep and arg in export.EXPORT_FORMATS:
+            options["fmt"] = arg
+        elif key in EXPORT_FILTERS and value:
+            if key in ("from", "to"):
+                try:
+                    datetime.strptime(value, "%Y-%m-%d")
+                except ValueError:
+                    return None
+            options[EXPORT_FILTERS[key]] = value
+        else:
+            return None
+    return options
+
+
+async def _run_export_and_send(application: Application, chat_id: int, options: dict):
+    path = export.default_export_path(options["fmt"])
+    try:
+        count = await export.export_posts(path, **options)
+        with open(path, "rb") as document:
+            await application.bot.send_document(chat_id, document, caption=f"{count} posts exported.",
+                                                read_timeout=120, write_timeout=120)
+    except Exception as e:
+        logger.error(f"Export failed: {e}", exc_info=True)
+        await application.bot.send_message(chat_id, f"Export failed: {e}\nThe file (if any) is at {path} on the server.")
+
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/export [format] [filters] - streams the posts table to a file and sends it."""
+    if await _reject_non_admin(update):
+        return
+    options = _parse_export_args(context.args or [])
+    if options is None or options["fmt"] not in export.available_formats():
+        await update.message.reply_text(EXPORT_USAGE.format(formats=", ".join(export.available_formats())))
+        return
+    await update.message.reply_text("Exporting...")
+    # In the background: a large export must not hold this handler
+    context.application.create_task(_run_export_and_send(context.application, update.effective_chat.id, options),
+                                    update=update)
@@ -0,0 +1,227 @@
+# selling_bot/handlers/browse_commands.py
+import asyncio
+import logging
+from telegram import (
+    Update, InlineKeyboardButton, InlineKeyboardMarkup,
+    InlineQueryResultArticle, InlineQueryResultCachedPhoto, InlineQueryResultCachedVideo, InputTextMessageContent,
+)
+from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler, InlineQueryHandler
+from telegram.constants import ParseMode
+from telegram.error import BadRequest
+
+import config
+import constants
+from localization import get_text, get_user_lang, get_category_display_name
+from services import search_service
+from services import profiler
+from services.bot_context import PerBot
+from services import message_formatter
+from services.storage import storage as db
+from services.pagination import fetch_keyset_page
+from handlers.conversation_flow import get_common_data
+
+logger = logging.getLogger(__name__)
+
+
+MYADS_PAGE_SIZE = 5
+
+
+def _page_keyboard(page: dict, lang: str, callback_prefix: str) -> InlineKeyboardMarkup | None:
+    """Newer/Older buttons carrying the keyset cursor (first/last post id of the page)."""
+    rows = page["rows"]
+    if not rows:
+        return None
+    buttons = []
+    if page["has_prev"]:
+        buttons.append(InlineKeyboardButton(get_text("btn_newer", lang), callback_data=f"{callback_prefix}p_{rows[0][0]}"))
+    if page["has_next"]:
+        buttons.append(InlineKeyboardButton(get_text("btn_older", lang), callback_data=f"{callback_prefix}n_{rows[-1][0]}"))
+    return InlineKeyboardMarkup([buttons]) if buttons else None
+
+
+def _parse_page_callback(data: str, callback_prefix: str):
+    """'<prefix>n_123' -> ("next", 123)."""
+    direction_code, cursor = data[len(callback_prefix):].split("_", 1)
+    return ("prev" if direction_code == "p" else "next"), int(cursor)
+
+
+# --- /search ---
+def _search_keyboard(page: dict, lang: str) -> InlineKeyboardMarkup | None:
+    return _page_keyboard(page, lang, constants.SEARCH_PAGE_CALLBACK_PREFIX)
+
+
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    get_common_data(update, context)
+    lang = get_user_lang(context)
+    query_text = " ".join(context.args or []).strip()
+    if not search_service.build_fts_query(query_text):
+        await update.message.reply_text(get_text("search_usage", lang))
+        return
+
+    try:
+        page = await search_service.search_page(query_text)
+    except TimeoutError: # Browse reads are saturated (config.READ_TIMEOUT)
+        await update.message.reply_text(get_text("browse_busy", lang))
+        return
+    logger.info(f"User {update.effective_user.id} searched '{query_text[:50]}': {len(page['rows'])} results on first page.")
+    if not page["rows"]:
+        await update.message.reply_text(get_text("search_no_results", lang, query=query_text))
+        return
+    # Only the query text is kept; page cursors travel in the callback data
+    context.user_data[constants.SEARCH_QUERY_KEY] = query_text
+    await update.message.reply_text(
+        message_formatter.format_search_results(page["rows"], query_text, lang),
+        reply_markup=_search_keyboard(page, lang),
+        disable_web_page_preview=True
+    )
+
+
+async def handle_search_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    lang = get_user_lang(context)
+    query_text = context.user_data.get(constants.SEARCH_QUERY_KEY)
+    if not query_text:
+        await query.answer()
+        await query.edit_message_text(get_text("search_session_expired", lang))
+        return
+
+    direction, cursor = _parse_page_callback(query.data, constants.SEARCH_PAGE_CALLBACK_PREFIX)
+    try:
+        page = await search_service.search_page(query_text, cursor_id=cursor, direction=direction)
+    except TimeoutError: # Keep the current page on screen, the user can tap again
+        await query.answer(get_text("browse_busy", lang), show_alert=True)
+        return
+    await query.answer()
+    if not page["rows"]:
+        await query.edit_message_text(get_text("search_no_results", lang, query=query_text))
+        return
+    try:
+        # Edit the same message in place instead of sending a new page
+        await query.edit_message_text(
+            message_formatter.format_search_results(page["rows"], query_text, lang),
+            reply_markup=_search_keyboard(page, lang),
+            disable_web_page_preview=True
+        )
+    except BadRequest as e: # e.g. "message is not modified" on a double tap
+        logger.warning(f"Could not edit search page: {e}")
+
+
+# --- /myads ---
+async def _my_ads_page(user_id: int, cursor_id: int = None, direction: str = "next") -> dict:
+    return await fetch_keyset_page(
+        lambda limit, **keyset: db.get_user_posts(user_id, limit, **keyset), cursor_id, direction, MYADS_PAGE_SIZE
+    )
+
+
+async def my_ads_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    get_common_data(update, context)
+    lang = get_user_lang(context)
+    user_id = update.effective_user.id
+    try:
+        total = await db.get_user_post_count(user_id)
+        page = await _my_ads_page(user_id) if total else None
+    except TimeoutError: # Browse reads are saturated (config.READ_TIMEOUT)
+        await update.message.reply_text(get_text("browse_busy", lang))
+        return
+    if not total:
+        await update.message.reply_text(get_text("myads_empty", lang))
+        return
+    await update.message.reply_text(
+        message_formatter.format_my_ads(page["rows"], total, lang),
+        reply_markup=_page_keyboard(page, lang, constants.MYADS_PAGE_CALLBACK_PREFIX)
+    )
+
+
+async def handle_my_ads_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    lang = get_user_lang(context)
+    user_id = update.effective_user.id # Pages are always scoped to whoever pressed the button
+    direction, cursor = _parse_page_callback(query.data, constants.MYADS_PAGE_CALLBACK_PREFIX)
+    try:
+        page = await _my_ads_page(user_id, cursor, direction)
+        total = await db.get_user_post_count(user_id)
+    except TimeoutError: # Keep the current page on screen, the user can tap again
+        await query.answer(get_text("browse_busy", lang), show_alert=True)
+        return
+    await query.answer()
+    if not page["rows"]:
+        await query.edit_message_text(get_text("myads_empty", lang))
+        return
+    try:
+        await query.edit_message_text(
+            message_formatter.format_my_ads(page["rows"], total, lang),
+            reply_markup=_page_keyboard(page, lang, constants.MYADS_PAGE_CALLBACK_PREFIX)
+        )
+    except BadRequest as e: # e.g. "message is not modified" on a double tap
+        logger.warning(f"Could not edit /myads page: {e}")
+
+
+# --- Inline mode: @bot toyota 2018 ---
+CAPTION_LIMIT = 1024
+INLINE_CACHE_TIME = 30 # Seconds Telegram itself may cache an answer
+
+# user_id -> id of that user's newest inline query (per bot). Older queries still waiting out the debounce are dropped.
+_latest_inline_query = PerBot(lambda bot: {})
+profiler.register_structure("browse_commands.latest_inline_query", lambda: len(_latest_inline_query))
+
+
+def _build_inline_results(rows, lang: str) -> list:
+    results = []
+    for post_id, category, search_fields, price, location, search_text, media_files in rows:
+        title = get_category_display_name(category, lang) + (f" · {search_fields[:50]}" if search_fields else "")
+        description = " · ".join(item for item in (price, location) if item)
+        text = search_text or title
+        # Markdown only when the whole ad fits, a cut could leave an unclosed entity
+        caption, parse_mode = (text, ParseMode.MARKDOWN) if len(text) <= CAPTION_LIMIT else (text[:CAPTION_LIMIT], None)
+        first_media = media_files[0] if media_files else None
+        # The stored file_ids are reused as-is, so Telegram serves the thumbnails from its own cache
+        if first_media and first_media.get('type') == 'photo':
+            results.append(InlineQueryResultCachedPhoto(
+                id=str(post_id), photo_file_id=first_media['file_id'], title=title, description=description,
+                caption=caption, parse_mode=parse_mode))
+        elif first_media and first_media.get('type') == 'video':
+            results.append(InlineQueryResultCachedVideo(
+                id=str(post_id), video_file_id=first_media['file_id'], title=title, description=description,
+                caption=caption, parse_mode=parse_mode))
+        else:
+            results.append(InlineQueryResultArticle(
+                id=str(post_id), title=title, description=description,
+                input_message_content=InputTextMessageContent(text[:4096], parse_mode=ParseMode.MARKDOWN if len(text) <= 4096 else None)))
+    return results
+
+
+async def handle_inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    inline_query = update.inline_query
+    user_id = inline_query.from_user.id
+    lang = get_user_lang(context)
+
+    cached = search_service.get_cached_inline_results(inline_query.query, inline_query.offset)
+    if cached is None:
+        # Debounce: wait for the user to stop typing, then only the newest query hits the DB
+        _latest_inline_query[user_id] = inline_query.id
+        await asyncio.sleep(config.INLINE_DEBOUNCE_SECONDS)
+        if _latest_inline_query.get(user_id) != inline_query.id:
+            return # Superseded by a newer keystroke, Telegram discards unanswered queries on its own
+        _latest_inline_query.pop(user_id, None)
+
+    try:
+        rows, next_offset = cached if cached is not None else await search_service.inline_search(inline_query.query, inline_query.offset)
+    except TimeoutError: # Browse reads are saturated; Telegram drops the unanswered query and the next keystroke retries
+        logger.warning(f"Inline query from {user_id} timed out.")
+        return
+    try:
+        await inline_query.answer(_build_inline_results(rows, lang), cache_time=INLINE_CACHE_TIME,
+                                  next_offset=next_offset, is_personal=False)
+    except BadRequest as e: # Query too old (user kept typing) or a bad file_id
+        logger.warning(f"Could not answer inline query from {user_id}: {e}")
+
+
+def create_browse_handlers() -> list:
+    return [
+        CommandHandler("search", search_command),
+        CallbackQueryHandler(handle_search_page, pattern=f"^{constants.SEARCH_PAGE_CALLBACK_PREFIX}[np]_\\d+$"),
+        CommandHandler("myads", my_ads_command),
+        CallbackQueryHandler(handle_my_ads_page, pattern=f"^{constants.MYADS_PAGE_CALLBACK_PREFIX}[np]_\\d+$"),
+        # block=False: the debounce sleep must not hold up other updates
+        InlineQueryHandler(handle_inline_query, block=False),
+    ]
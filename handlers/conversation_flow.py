@@ -1,6 +1,6 @@
 # selling_bot/handlers/conversation_flow.py
+import functools
 import logging
-import re
 import json
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto, InputMediaVideo
 from telegram.ext import (
@@ -17,12 +17,35 @@ from telegram.error import BadRequest # For handling message edit errors etc.
 import constants
 import config
 from localization import get_text, get_user_lang, SUPPORTED_LANGUAGES, get_category_display_name
-from services import database_service as db
+from services.storage import storage as db
 from services import message_formatter
+from services import funnel_stats
+from services import value_parser
+from services import publishing
+from services import expiry_scheduler
+from services import fingerprint
+from services import spam_limiter
+from services import idempotency
+from services import price_hints
+from services.bot_context import current_bot
+from handlers.admin_commands import is_admin
 
 logger = logging.getLogger(__name__)
 
 # --- Helper Functions for Conversation Flow ---
+# Keyboards that only depend on the language are built once and shared by every user and every hosted
+# bot (PTB markups are immutable)
+@functools.lru_cache(maxsize=None)
+def _language_keyboard(callback_prefix: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[InlineKeyboardButton(text, callback_data=f"{callback_prefix}{code}")]
+                                 for code, text in SUPPORTED_LANGUAGES.items()])
+
+@functools.lru_cache(maxsize=None)
+def _category_keyboard(lang: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[InlineKeyboardButton(get_category_display_name(key, lang),
+                                                       callback_data=f"{constants.CATEGORY_CALLBACK_PREFIX}{key}")]
+                                 for key in config.CATEGORIES_KEYS.values()])
+
 def get_common_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     context.user_data.setdefault('user_id', user.id)
@@ -32,10 +55,14 @@ def get_common_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
         pref_lang = context.user_data.get('db_pref_lang')
         context.user_data['lang'] = pref_lang if pref_lang and pref_lang in SUPPORTED_LANGUAGES else config.DEFAULT_LANGUAGE
     context.user_data.setdefault(constants.CAT_SPECIFIC_DATA_KEY, {})
+    context.user_data.setdefault(constants.PARSED_VALUES_KEY, {})
     context.user_data.setdefault('media_files', [])
 
 
-async def clear_user_data_for_new_post(context: ContextTypes.DEFAULT_TYPE):
+async def clear_user_data_for_new_post(context: ContextTypes.DEFAULT_TYPE, funnel_outcome: str = constants.FUNNEL_RESTARTED):
+    # Close the analytics funnel of a flow that is still open (no-op if it was already closed)
+    funnel_stats.record_outcome(context.user_data, funnel_outcome)
+
     # Keys to keep across a full reset triggered by /start or /cancel
     preserved_keys = ['lang', 'user_id', 'first_name', 'username', 'db_pref_lang']
     
@@ -54,6 +81,7 @@ async def clear_user_data_for_new_post(context: ContextTypes.DEFAULT_TYPE):
     # Re-initialize keys that should always exist for a new post flow
     context.user_data['media_files'] = []
     context.user_data[constants.CAT_SPECIFIC_DATA_KEY] = {}
+    context.user_data[constants.PARSED_VALUES_KEY] = {}
 
 
 async def _ask_question(update: Update, context: ContextTypes.DEFAULT_TYPE, question_key: str, next_state: int,
@@ -61,6 +89,12 @@ async def _ask_question(update: Update, context: ContextTypes.DEFAULT_TYPE, ques
                         reply_markup_override: InlineKeyboardMarkup = None, **kwargs) -> int:
     lang = get_user_lang(context)
     text_to_send = get_text(question_key, lang, **kwargs)
+    if question_key == "ask_price": # Typical range of similar ads, straight from the in-memory sketches
+        hint = price_hints.get_hint(context.user_data.get('category'), context.user_data.get(constants.CAT_SPECIFIC_DATA_KEY))
+        if hint:
+            low, high, currency = hint
+            text_to_send += "\n\n" + get_text("price_hint", lang, low=price_hints.format_amount(low),
+                                               high=price_hints.format_amount(high), currency=f" {currency}" if currency else "")
     
     current_reply_markup = reply_markup_override
     if not current_reply_markup and is_optional and optional_field_key:
@@ -81,6 +115,7 @@ async def _ask_question(update: Update, context: ContextTypes.DEFAULT_TYPE, ques
             await context.bot.send_message(update.effective_chat.id, text_to_send, reply_markup=current_reply_markup, parse_mode=ParseMode.MARKDOWN)
     elif update.message:
         await update.message.reply_text(text_to_send, reply_markup=current_reply_markup, parse_mode=ParseMode.MARKDOWN)
+    funnel_stats.record_state(context.user_data, next_state)
     return next_state
 
 
@@ -90,6 +125,8 @@ async def _handle_skip_field(update: Update, context: ContextTypes.DEFAULT_TYPE,
     field_key_to_skip = query.data.split(constants.SKIP_FIELD_CALLBACK_PREFIX)[1]
     lang = get_user_lang(context)
     context.user_data[constants.CAT_SPECIFIC_DATA_KEY][field_key_to_skip] = None # Or some other indicator like "SKIPPED"
+    if field_key_to_skip in value_parser.FIELD_PARSERS:
+        context.user_data.setdefault(constants.PARSED_VALUES_KEY, {}).pop(value_parser.FIELD_PARSERS[field_key_to_skip][0], None)
     
     field_name_for_message = field_key_to_skip.replace("_", " ").title()
     
@@ -112,6 +149,15 @@ async def _handle_text_input(update: Update, context: ContextTypes.DEFAULT_TYPE,
     if not text:
         await update.message.reply_text(get_text("invalid_input", lang) + " This field cannot be empty.")
         return current_state_for_reask
+
+    # Numeric fields are normalized now, so the typed value can go into an indexed column
+    if field_key in value_parser.FIELD_PARSERS:
+        column, parser = value_parser.FIELD_PARSERS[field_key]
+        parsed_value = parser(text)
+        if parsed_value is None:
+            await update.message.reply_text(get_text(f"{field_key}_invalid", lang))
+            return current_state_for_reask
+        context.user_data.setdefault(constants.PARSED_VALUES_KEY, {})[column] = parsed_value
         
     context.user_data[constants.CAT_SPECIFIC_DATA_KEY][field_key] = text # For specific fields
     logger.info(f"User {update.effective_user.id} entered {field_key}: {text[:50]}")
@@ -179,13 +225,12 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
         return await ask_category(update, context) # Will send its own message
 
     logger.info(f"User {user.id} starting/restarting. Asking for language.")
-    keyboard = [[InlineKeyboardButton(text, callback_data=f"{constants.LANG_CALLBACK_PREFIX}{code}")]
-                for code, text in SUPPORTED_LANGUAGES.items()]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = _language_keyboard(constants.LANG_CALLBACK_PREFIX)
     await update.message.reply_text(
         get_text("welcome", config.DEFAULT_LANGUAGE, name=user.first_name),
         reply_markup=reply_markup
     )
+    funnel_stats.record_state(context.user_data, constants.LANG_SELECT)
     return constants.LANG_SELECT
 
 
@@ -217,9 +262,7 @@ async def language_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     if context.user_data.get('category') or context.user_data.get(constants.CAT_SPECIFIC_DATA_KEY):
         context.user_data['_interrupted_ad_flow'] = True
     
-    keyboard = [[InlineKeyboardButton(text, callback_data=f"{constants.LANG_CALLBACK_PREFIX}change_{code}")]
-                for code, text in SUPPORTED_LANGUAGES.items()]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = _language_keyboard(f"{constants.LANG_CALLBACK_PREFIX}change_")
     await update.message.reply_text(get_text("change_language_prompt", lang), reply_markup=reply_markup)
     return constants.CHANGE_LANG_PROMPT
 
@@ -276,7 +319,7 @@ async def cancel_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE
         except BadRequest: # Message might not be editable (e.g., too old, or no text part)
              await context.bot.send_message(chat_id=update.effective_chat.id, text=reply_text)
     
-    await clear_user_data_for_new_post(context)
+    await clear_user_data_for_new_post(context, funnel_outcome=constants.FUNNEL_CANCELLED)
     return ConversationHandler.END
 
 async def timeout_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -291,17 +334,14 @@ async def timeout_conversation(update: Update, context: ContextTypes.DEFAULT_TYP
     if chat_id:
         await context.bot.send_message(chat_id, get_text("timeout_message", lang))
     
-    await clear_user_data_for_new_post(context)
+    await clear_user_data_for_new_post(context, funnel_outcome=constants.FUNNEL_TIMEOUT)
     return ConversationHandler.END
 
 # --- Category Selection & Branching ---
 async def ask_category(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     get_common_data(update, context)
     lang = get_user_lang(context)
-    keyboard = [[InlineKeyboardButton(get_category_display_name(key, lang), 
-                                      callback_data=f"{constants.CATEGORY_CALLBACK_PREFIX}{key}")]
-                for key in config.CATEGORIES_KEYS.values()]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = _category_keyboard(lang)
     prompt_text = get_text("choose_category", lang)
 
     if update.callback_query: # Typically from initial language selection
@@ -309,6 +349,7 @@ async def ask_category(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
         await update.callback_query.edit_message_text(prompt_text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
     elif update.message: # From /start if lang was pre-loaded
         await update.message.reply_text(prompt_text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
+    funnel_stats.record_state(context.user_data, constants.CATEGORY_SELECT)
     return constants.CATEGORY_SELECT
 
 async def handle_category_selection(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -324,6 +365,7 @@ async def handle_category_selection(update: Update, context: ContextTypes.DEFAUL
     get_common_data(update, context) # Ensure user_data structures are ready
     context.user_data['category'] = category_key
     context.user_data[constants.CAT_SPECIFIC_DATA_KEY] = {} # Initialize/reset specific data for new category
+    context.user_data[constants.PARSED_VALUES_KEY] = {}
     lang = get_user_lang(context)
     
     logger.info(f"User {update.effective_user.id} selected category: {category_key}")
@@ -483,10 +525,12 @@ async def handle_other_item_name(update: Update, context: ContextTypes.DEFAULT_T
 async def handle_ask_price(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     price = update.message.text.strip()
     lang = get_user_lang(context)
-    if not re.search(r'\d', price):
+    price_columns = value_parser.parse_price_columns(price)
+    if not price_columns:
         await update.message.reply_text(get_text("price_invalid", lang))
         return constants.ASK_PRICE
     context.user_data['price'] = price
+    context.user_data.setdefault(constants.PARSED_VALUES_KEY, {}).update(price_columns)
     logger.info(f"User {update.effective_user.id} entered price: {price}")
     if context.user_data.pop('editing_field', None) == 'price': return await show_preview(update, context)
     return await _ask_question(update, context, "ask_location", constants.ASK_LOCATION)
@@ -545,12 +589,13 @@ async def handle_ask_media_files(update: Update, context: ContextTypes.DEFAULT_T
         await message.reply_text(get_text("max_media_reached", lang, max_media=config.MAX_MEDIA_ITEMS))
         return constants.ASK_MEDIA 
 
-    file_id, media_type = (None, None)
-    if message.photo: file_id, media_type = message.photo[-1].file_id, 'photo'
-    elif message.video: file_id, media_type = message.video.file_id, 'video'
+    file_id, file_unique_id, media_type = (None, None, None)
+    if message.photo: file_id, file_unique_id, media_type = message.photo[-1].file_id, message.photo[-1].file_unique_id, 'photo'
+    elif message.video: file_id, file_unique_id, media_type = message.video.file_id, message.video.file_unique_id, 'video'
     
     if file_id and media_type and not any(mf['file_id'] == file_id for mf in media_files):
-        media_files.append({'type': media_type, 'file_id': file_id})
+        # file_unique_id is the same for every re-send of the file, it feeds the duplicate fingerprint
+        media_files.append({'type': media_type, 'file_id': file_id, 'file_unique_id': file_unique_id})
         logger.info(f"User {update.effective_user.id} added {media_type}. Total: {len(media_files)}")
     
     reply_text_key = "media_received" if len(media_files) < config.MAX_MEDIA_ITEMS else "max_media_reached"
@@ -599,17 +644,23 @@ async def handle_clear_all_media(update: Update, context: ContextTypes.DEFAULT_T
     return constants.ASK_MEDIA
 
 # --- Preview, Edit, Post ---
+def _post_callback_data(draft_token: str) -> str:
+    return f"{constants.ACTION_CALLBACK_PREFIX}{constants.ACTION_POST}{constants.CALLBACK_TOKEN_SEPARATOR}{draft_token}"
+
 async def show_preview(update: Update, context: ContextTypes.DEFAULT_TYPE, message_to_edit=None) -> int:
     get_common_data(update, context)
     lang = get_user_lang(context)
     
     # Generate the main ad content text from the formatter
     ad_content_text = message_formatter.format_preview_message(context.user_data)
+    context.user_data[constants.FINGERPRINT_KEY] = fingerprint.compute_fingerprint(context.user_data)
+    # One token per draft (kept across edits, dropped with the draft) so its Post can only go through once
+    draft_token = context.user_data.setdefault(constants.DRAFT_TOKEN_KEY, idempotency.new_token())
     # Get the separate confirmation prompt
     confirm_prompt = get_text("preview_confirm_prompt", lang)
 
     keyboard = [[
-        InlineKeyboardButton(get_text("btn_post", lang), callback_data=f"{constants.ACTION_CALLBACK_PREFIX}{constants.ACTION_POST}"),
+        InlineKeyboardButton(get_text("btn_post", lang), callback_data=_post_callback_data(draft_token)),
         InlineKeyboardButton(get_text("btn_edit", lang), callback_data=f"{constants.ACTION_CALLBACK_PREFIX}{constants.ACTION_EDIT}"),
         InlineKeyboardButton(get_text("btn_cancel", lang), callback_data=f"{constants.ACTION_CALLBACK_PREFIX}{constants.ACTION_CANCEL}"),
     ]]
@@ -656,62 +707,117 @@ async def show_preview(update: Update, context: ContextTypes.DEFAULT_TYPE, messa
         context.user_data['last_preview_message_id'] = sent_button_message.message_id
     
     context.user_data.pop('media_edited_flag', None) # Consume this flag
+    funnel_stats.record_state(context.user_data, constants.PREVIEW)
     return constants.PREVIEW
 
+async def _handle_duplicate_post(update: Update, context: ContextTypes.DEFAULT_TYPE, duplicate_id: int, ad_fingerprint: str) -> int:
+    """The draft is identical to one of the user's live ads: apply config.DUPLICATE_AD_POLICY before anything is saved or sent."""
+    query = update.callback_query
+    lang = get_user_lang(context)
+    duplicate = await db.get_post(duplicate_id)
+    link = message_formatter.build_post_link(current_bot().target_chat_id, duplicate['channel_message_id']) or f"#{duplicate_id}"
+    policy = config.DUPLICATE_AD_POLICY
+    logger.info(f"User {update.effective_user.id} tried to post a duplicate of post {duplicate_id} (policy: {policy}).")
+
+    if policy == "warn":
+        context.user_data[constants.DUPLICATE_CONFIRMED_KEY] = ad_fingerprint # A second tap on Post publishes
+        keyboard = [[
+            InlineKeyboardButton(get_text("btn_post_anyway", lang), callback_data=_post_callback_data(context.user_data.get(constants.DRAFT_TOKEN_KEY))),
+            InlineKeyboardButton(get_text("btn_edit", lang), callback_data=f"{constants.ACTION_CALLBACK_PREFIX}{constants.ACTION_EDIT}"),
+            InlineKeyboardButton(get_text("btn_cancel", lang), callback_data=f"{constants.ACTION_CALLBACK_PREFIX}{constants.ACTION_CANCEL}"),
+        ]]
+        await query.edit_message_text(get_text("duplicate_warning", lang, link=link), reply_markup=InlineKeyboardMarkup(keyboard),
+                                      disable_web_page_preview=True)
+        return constants.PREVIEW
+
+    if policy == "bump":
+        next_allowed = expiry_scheduler.next_bump_allowed(duplicate)
+        if expiry_scheduler.utcnow() < next_allowed:
+            reply_text = get_text("bump_too_soon", lang, time=expiry_scheduler.format_utc(next_allowed)[:16])
+        else:
+            try:
+                sent_messages = await expiry_scheduler.bump_post(context.bot, duplicate)
+            except Exception as e:
+                logger.error(f"Bump of duplicate post {duplicate_id} failed: {e}", exc_info=True)
+                reply_text = get_text("general_error", lang)
+            else:
+                new_link = message_formatter.build_post_link(current_bot().target_chat_id, sent_messages[0].message_id) if sent_messages else None
+                reply_text = get_text("duplicate_bumped", lang, post_id=duplicate_id) + (f"\n{new_link}" if new_link else "")
+    else: # "block"
+        reply_text = get_text("duplicate_blocked", lang, link=link)
+    await query.edit_message_text(reply_text, disable_web_page_preview=True)
+    await clear_user_data_for_new_post(context, funnel_outcome=constants.FUNNEL_DUPLICATE)
+    return ConversationHandler.END
+
 async def handle_preview_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
-    await query.answer()
-    action = query.data.split(constants.ACTION_CALLBACK_PREFIX)[1]
+    action, _, token = query.data[len(constants.ACTION_CALLBACK_PREFIX):].partition(constants.CALLBACK_TOKEN_SEPARATOR)
     lang = get_user_lang(context)
+    if action == constants.ACTION_POST and (idempotency.is_claimed(token) or token != context.user_data.get(constants.DRAFT_TOKEN_KEY)):
+        # Double tap, retried callback or the button of an older preview: nothing is saved, sent or rate-limited
+        logger.info(f"User {update.effective_user.id} repeated Post of draft {token or '(no token)'}, ignored.")
+        await query.answer(get_text("already_submitted" if idempotency.is_claimed(token) else "preview_outdated", lang), show_alert=True)
+        return constants.PREVIEW
     get_common_data(update, context) # Ensure all user_data parts are initialized
 
     if action == constants.ACTION_POST:
+        rate_limited = not is_admin(update.effective_user.id)
+        if rate_limited:
+            # Anti-spam before any DB or API work; the draft stays so the user can post it later
+            wait = spam_limiter.post_limiter.retry_after(update.effective_user.id)
+            if wait:
+                logger.warning(f"User {update.effective_user.id} hit the post rate limit ({wait:.0f}s left).")
+                await query.answer(get_text("post_rate_limited", lang, minutes=int(wait // 60) + 1), show_alert=True)
+                return constants.PREVIEW
+        ad_fingerprint = context.user_data.get(constants.FINGERPRINT_KEY) or fingerprint.compute_fingerprint(context.user_data)
+        if context.user_data.get(constants.DUPLICATE_CONFIRMED_KEY) != ad_fingerprint:
+            duplicate_id = await db.find_duplicate_post(ad_fingerprint, update.effective_user.id)
+            if duplicate_id:
+                await query.answer()
+                return await _handle_duplicate_post(update, context, duplicate_id, ad_fingerprint)
+    await query.answer()
+
+    if action == constants.ACTION_POST:
+        if not idempotency.claim(token): # A concurrent tap got past the check above during the duplicate lookup
+            return constants.PREVIEW
+        if rate_limited:
+            # Counted only now that the post goes ahead, so a refused duplicate doesn't use up the user's quota
+            spam_limiter.post_limiter.record(update.effective_user.id)
         final_post_ad_text = message_formatter.format_final_post(context.user_data)
-        media_files = context.user_data.get('media_files', [])
-        
-        # Save to DB first
-        post_id = await db.save_post(context.user_data)
+
+        # Save to DB first; the unique token index also stops repeats the in-memory set no longer remembers
+        post_id = await db.save_post(context.user_data, rendered_text=final_post_ad_text, fingerprint=ad_fingerprint,
+                                     idempotency_token=token)
+        if post_id is None:
+            await query.edit_message_text(get_text("already_submitted", lang))
+            await clear_user_data_for_new_post(context, funnel_outcome=constants.FUNNEL_DUPLICATE)
+            return ConversationHandler.END
         logger.info(f"Post {post_id} data saved for user {update.effective_user.id}, proceeding to publish.")
 
-        target_chat = config.TARGET_CHAT_ID
-        sent_channel_message = None
+        target_chat = current_bot().target_chat_id
+        if config.MODERATION_ENABLED and not is_admin(update.effective_user.id):
+            # Held for a moderator (/queue); it is published once approved
+            await db.update_post_status(post_id, 'pending_review')
+            funnel_stats.record_outcome(context.user_data, constants.FUNNEL_SUBMITTED)
+            await query.edit_message_text(get_text("post_pending_review", lang))
+            await clear_user_data_for_new_post(context, funnel_outcome=constants.FUNNEL_FAILED)
+            return ConversationHandler.END
         try:
-            if media_files:
-                media_to_send_channel = []
-                for i, item in enumerate(media_files[:config.MAX_MEDIA_ITEMS]):
-                    caption_for_item = final_post_ad_text if i == 0 else None
-                    parse_mode_for_item = ParseMode.MARKDOWN if i == 0 else None
-                    if item['type'] == 'photo':
-                        media_to_send_channel.append(InputMediaPhoto(media=item['file_id'], caption=caption_for_item, parse_mode=parse_mode_for_item))
-                    elif item['type'] == 'video':
-                        media_to_send_channel.append(InputMediaVideo(media=item['file_id'], caption=caption_for_item, parse_mode=parse_mode_for_item))
-                
-                if media_to_send_channel:
-                    sent_channel_messages_list = await context.bot.send_media_group(chat_id=target_chat, media=media_to_send_channel, read_timeout=60, write_timeout=60)
-                    sent_channel_message = sent_channel_messages_list[0] if sent_channel_messages_list else None
-            
-            if not sent_channel_message: # No media, or media_group sending failed, send as text
-                # If media_files existed but media_to_send_channel was empty or send_media_group failed,
-                # this will send the text part.
-                sent_channel_message = await context.bot.send_message(
-                    chat_id=target_chat, text=final_post_ad_text, parse_mode=ParseMode.MARKDOWN
-                )
-            
-            if sent_channel_message:
-                await db.update_post_status(post_id, 'published', sent_channel_message.message_id)
-                success_msg_key = "post_successful_channel" if config.IS_CHANNEL else "post_successful_admin"
-                await query.edit_message_text(get_text(success_msg_key, lang, target_chat_id=str(target_chat)))
+            messages = await publishing.publish_post(context.bot, await db.get_post(post_id))
+            funnel_stats.record_outcome(context.user_data, constants.FUNNEL_PUBLISHED)
+            if not config.IS_CHANNEL:
+                success_msg_key = "post_successful_admin"
+            elif not messages:
+                success_msg_key = "post_queued_for_digest" # A digest category: only queued, the digest goes out later
             else:
-                await db.update_post_status(post_id, 'failed_to_publish_no_message_sent')
-                logger.error(f"Post {post_id} to {target_chat} resulted in no sent_channel_message.")
-                await query.edit_message_text(get_text("general_error", lang) + "\n(Post could not be sent to channel/admin)")
-
+                success_msg_key = "post_successful_channel"
+            await query.edit_message_text(get_text(success_msg_key, lang, target_chat_id=str(target_chat)))
         except Exception as e:
             logger.error(f"Error posting to target {target_chat} for post {post_id}: {e}", exc_info=True)
             await db.update_post_status(post_id, 'failed_to_publish_exception')
             await query.edit_message_text(get_text("general_error", lang) + f"\nDebug Info: {str(e)[:100]}")
         
-        await clear_user_data_for_new_post(context)
+        await clear_user_data_for_new_post(context, funnel_outcome=constants.FUNNEL_FAILED)
         return ConversationHandler.END
 
     elif action == constants.ACTION_EDIT:
@@ -721,7 +827,7 @@ async def handle_preview_action(update: Update, context: ContextTypes.DEFAULT_TY
     elif action == constants.ACTION_CANCEL:
         logger.info(f"User {update.effective_user.id} cancelled post creation.")
         await query.edit_message_text(get_text("post_cancelled", lang))
-        await clear_user_data_for_new_post(context)
+        await clear_user_data_for_new_post(context, funnel_outcome=constants.FUNNEL_CANCELLED)
         return ConversationHandler.END
     
     return constants.PREVIEW
@@ -770,6 +876,7 @@ async def ask_edit_choice(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     reply_markup = InlineKeyboardMarkup(keyboard_rows)
 
     await query.edit_message_text(get_text("edit_choice_prompt", lang), reply_markup=reply_markup)
+    funnel_stats.record_state(context.user_data, constants.EDIT_CHOICE)
     return constants.EDIT_CHOICE
 
 
@@ -897,7 +1004,7 @@ def create_ad_posting_conversation_handler() -> ConversationHandler:
             CallbackQueryHandler(handle_done_media_upload, pattern=f"^{constants.ACTION_CALLBACK_PREFIX}{constants.ACTION_DONE_MEDIA}$"),
             CallbackQueryHandler(handle_clear_all_media, pattern=f"^{constants.ACTION_CALLBACK_PREFIX}{constants.ACTION_CLEAR_MEDIA}$")
         ],
-        constants.PREVIEW: [CallbackQueryHandler(handle_preview_action, pattern=f"^{constants.ACTION_CALLBACK_PREFIX}({constants.ACTION_POST}|{constants.ACTION_EDIT}|{constants.ACTION_CANCEL})$")],
+        constants.PREVIEW: [CallbackQueryHandler(handle_preview_action, pattern=f"^{constants.ACTION_CALLBACK_PREFIX}({constants.ACTION_POST}({constants.CALLBACK_TOKEN_SEPARATOR}[\\w-]*)?|{constants.ACTION_EDIT}|{constants.ACTION_CANCEL})$")],
         constants.EDIT_CHOICE: [
             CallbackQueryHandler(handle_edit_field_selection, pattern=f"^{constants.EDIT_FIELD_CALLBACK_PREFIX}"),
             CallbackQueryHandler(handle_back_to_preview, pattern=f"^{constants.ACTION_CALLBACK_PREFIX}{constants.ACTION_BACK_TO_PREVIEW}$")
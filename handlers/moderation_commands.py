@@ -0,0 +1,133 @@
+# selling_bot/handlers/moderation_commands.py
+import logging
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler
+from telegram.error import BadRequest
+
+import config
+import constants
+from localization import get_text, get_category_display_name
+from services.storage import storage as db
+from services import message_formatter
+from services.moderation import approved_post_publisher
+from services.notification_queue import notification_queue
+from handlers.admin_commands import is_admin
+
+logger = logging.getLogger(__name__)
+
+EXCERPT_LENGTH = 300
+TOGGLES_PER_ROW = 4
+
+
+def _callback(action: str, post_id: int = None) -> str:
+    return f"{constants.MODERATION_CALLBACK_PREFIX}{action}" + (f":{post_id}" if post_id is not None else "")
+
+
+async def _load_page(context: ContextTypes.DEFAULT_TYPE, after_id: int) -> dict:
+    """Reads one page of the queue (keyset after_id) into the moderator's page state; keeps still-listed selections."""
+    rows = await db.get_review_page(after_id, config.MODERATION_PAGE_SIZE)
+    previous = context.user_data.get(constants.MODERATION_PAGE_KEY) or {}
+    page = {
+        "after": after_id,
+        "posts": {post_id: (user_id, user_lang, category, search_text) for post_id, user_id, user_lang, category, search_text in rows},
+    }
+    page["selected"] = [post_id for post_id in previous.get("selected", []) if post_id in page["posts"]]
+    context.user_data[constants.MODERATION_PAGE_KEY] = page
+    return page
+
+
+async def _render_page(page: dict, bot_username: str) -> tuple:
+    total = await db.count_pending_review()
+    if not page["posts"]:
+        return (f"Review queue: {total} pending." + (" Nothing after this page, /queue starts over." if total else ""), None)
+    lang = config.DEFAULT_LANGUAGE
+    parts = [f"Review queue: {total} pending. Tick ads, then approve or reject them."]
+    for post_id, (user_id, _, category, search_text) in page["posts"].items():
+        excerpt = (search_text or "").strip()
+        if len(excerpt) > EXCERPT_LENGTH:
+            excerpt = excerpt[:EXCERPT_LENGTH] + "…"
+        parts.append(f"#{post_id} · {get_category_display_name(category, lang)} · user {user_id}\n{excerpt}\n"
+                     f"{message_formatter.build_ad_deep_link(bot_username, post_id)}")
+
+    selected = set(page["selected"])
+    toggles = [InlineKeyboardButton(f"{'☑' if post_id in selected else '☐'} #{post_id}", callback_data=_callback("toggle", post_id))
+               for post_id in page["posts"]]
+    keyboard = [toggles[i:i + TOGGLES_PER_ROW] for i in range(0, len(toggles), TOGGLES_PER_ROW)]
+    keyboard.append([InlineKeyboardButton(f"✅ Approve ({len(selected)})", callback_data=_callback("approve")),
+                     InlineKeyboardButton(f"❌ Reject ({len(selected)})", callback_data=_callback("reject"))])
+    keyboard.append([InlineKeyboardButton("✅ Approve page", callback_data=_callback("approve_all")),
+                     InlineKeyboardButton("❌ Reject page", callback_data=_callback("reject_all"))])
+    keyboard.append([InlineKeyboardButton("Next ▶", callback_data=_callback("next"))])
+    return "\n\n".join(parts), InlineKeyboardMarkup(keyboard)
+
+
+async def queue_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/queue - first page of ads awaiting review."""
+    if not is_admin(update.effective_user.id):
+        logger.warning(f"User {update.effective_user.id} tried to use an admin command.")
+        return
+    context.user_data.pop(constants.MODERATION_PAGE_KEY, None)
+    page = await _load_page(context, 0)
+    text, reply_markup = await _render_page(page, context.bot.username)
+    await update.message.reply_text(text, reply_markup=reply_markup, disable_web_page_preview=True)
+
+
+async def _apply_decision(post_ids: list, page: dict, approve: bool) -> list:
+    """One guarded primary-key update per post; only posts still pending change, so two moderators can't decide twice."""
+    if approve:
+        changed = await db.set_review_status(post_ids, 'pending_review', 'approved')
+        approved_post_publisher.enqueue(changed) # Published in the background at the channel's pace
+    else:
+        changed = await db.set_review_status(post_ids, 'pending_review', 'rejected')
+        for post_id in changed:
+            user_id, user_lang = page["posts"][post_id][:2]
+            notification_queue.enqueue(user_id, get_text("ad_rejected", user_lang, post_id=post_id))
+    return changed
+
+
+async def handle_moderation_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    if not is_admin(update.effective_user.id):
+        await query.answer()
+        return
+    action, _, value = query.data[len(constants.MODERATION_CALLBACK_PREFIX):].partition(":")
+    page = context.user_data.get(constants.MODERATION_PAGE_KEY)
+    if page is None: # State lost (restart): start over
+        page = await _load_page(context, 0)
+
+    if action == "toggle":
+        post_id = int(value)
+        if post_id in page["selected"]:
+            page["selected"].remove(post_id)
+        elif post_id in page["posts"]:
+            page["selected"].append(post_id)
+        await query.answer()
+    elif action in ("approve", "reject", "approve_all", "reject_all"):
+        post_ids = list(page["posts"]) if action.endswith("_all") else list(page["selected"])
+        if not post_ids:
+            await query.answer("Nothing selected.")
+            return
+        changed = await _apply_decision(post_ids, page, approve=action.startswith("approve"))
+        verb = "Approved" if action.startswith("approve") else "Rejected"
+        logger.info(f"Moderator {update.effective_user.id} {verb.lower()} posts {changed}.")
+        await query.answer(f"{verb} {len(changed)} of {len(post_ids)}.")
+        page = await _load_page(context, page["after"]) # Decided posts drop out, later ones move up
+    elif action == "next":
+        await query.answer()
+        page = await _load_page(context, max(page["posts"], default=page["after"]))
+    else:
+        await query.answer()
+
+    text, reply_markup = await _render_page(page, context.bot.username)
+    try:
+        await query.edit_message_text(text, reply_markup=reply_markup, disable_web_page_preview=True)
+    except BadRequest as e:
+        if "not modified" not in str(e).lower():
+            raise
+
+
+def create_moderation_handlers() -> list:
+    return [
+        CommandHandler("queue", queue_command), # Admin only
+        CallbackQueryHandler(handle_moderation_action, pattern=f"^{constants.MODERATION_CALLBACK_PREFIX}"),
+    ]
@@ -0,0 +1,75 @@
+# selling_bot/handlers/subscription_commands.py
+import logging
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler
+
+import config
+import constants
+from localization import get_text, get_user_lang
+from services import subscriptions
+from services.storage import storage as db
+from handlers.conversation_flow import get_common_data
+
+logger = logging.getLogger(__name__)
+
+MAX_QUERY_LENGTH = 100
+
+
+def _subscriptions_keyboard(subs: list, lang: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(get_text("btn_unsubscribe", lang, query=sub["query_text"][:40]),
+                              callback_data=f"{constants.UNSUBSCRIBE_CALLBACK_PREFIX}{sub['id']}")]
+        for sub in subs
+    ])
+
+
+async def subscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    get_common_data(update, context)
+    lang = get_user_lang(context)
+    user_id = update.effective_user.id
+    query_text = " ".join(context.args or []).strip()[:MAX_QUERY_LENGTH]
+    parsed = subscriptions.parse_subscription_query(query_text) if query_text else None
+    if not parsed:
+        await update.message.reply_text(get_text("subscribe_usage", lang))
+        return
+    if len(await db.get_user_subscriptions(user_id)) >= config.MAX_SUBSCRIPTIONS_PER_USER:
+        await update.message.reply_text(get_text("subscribe_limit", lang, limit=config.MAX_SUBSCRIPTIONS_PER_USER))
+        return
+
+    sub_id = await subscriptions.add_subscription(user_id, lang, query_text, parsed)
+    logger.info(f"User {user_id} subscribed to '{query_text}' as {sub_id}: {parsed}")
+    await update.message.reply_text(get_text("subscribe_saved", lang, query=query_text))
+
+
+async def subscriptions_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    get_common_data(update, context)
+    lang = get_user_lang(context)
+    subs = await db.get_user_subscriptions(update.effective_user.id)
+    if not subs:
+        await update.message.reply_text(get_text("subscriptions_empty", lang))
+        return
+    await update.message.reply_text(get_text("subscriptions_header", lang), reply_markup=_subscriptions_keyboard(subs, lang))
+
+
+async def handle_unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    lang = get_user_lang(context)
+    user_id = update.effective_user.id
+    sub_id = int(query.data[len(constants.UNSUBSCRIBE_CALLBACK_PREFIX):])
+    # Scoped to whoever pressed the button, so nobody can remove someone else's search
+    removed = await subscriptions.remove_subscription(sub_id, user_id)
+    await query.answer(get_text("unsubscribed", lang) if removed else None)
+
+    subs = await db.get_user_subscriptions(user_id)
+    if subs:
+        await query.edit_message_reply_markup(reply_markup=_subscriptions_keyboard(subs, lang))
+    else:
+        await query.edit_message_text(get_text("subscriptions_empty", lang))
+
+
+def create_subscription_handlers() -> list:
+    return [
+        CommandHandler("subscribe", subscribe_command),
+        CommandHandler("subscriptions", subscriptions_command),
+        CallbackQueryHandler(handle_unsubscribe, pattern=f"^{constants.UNSUBSCRIBE_CALLBACK_PREFIX}\\d+$"),
+    ]
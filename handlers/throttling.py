@@ -0,0 +1,41 @@
+# selling_bot/handlers/throttling.py
+import logging
+import time
+from telegram import Update
+from telegram.ext import ContextTypes, ApplicationHandlerStop, TypeHandler
+
+from localization import get_text, get_user_lang
+from services import spam_limiter
+from services.bot_context import PerBot
+from handlers.admin_commands import is_admin
+
+logger = logging.getLogger(__name__)
+
+# user_id -> time until which the user was already told to slow down (one notice per streak), per bot
+_warned_until = PerBot(lambda bot: {})
+
+
+async def throttle_updates(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Runs before every other handler (group -1) and drops updates of users over UPDATE_RATE_LIMITS."""
+    user = update.effective_user
+    if not user or is_admin(user.id):
+        return
+    wait = spam_limiter.update_limiter.hit(user.id)
+    if not wait:
+        _warned_until.pop(user.id, None)
+        return
+
+    now = time.time()
+    if _warned_until.get(user.id, 0) <= now:
+        _warned_until[user.id] = now + wait
+        logger.warning(f"User {user.id} is over the update rate limit, dropping updates for {wait:.0f}s.")
+        text = get_text("rate_limited", get_user_lang(context), seconds=int(wait) + 1)
+        if update.callback_query:
+            await update.callback_query.answer(text, show_alert=True)
+        elif update.message:
+            await update.message.reply_text(text)
+    raise ApplicationHandlerStop # Nothing else runs for this update
+
+
+def create_throttling_handler() -> TypeHandler:
+    return TypeHandler(Update, throttle_updates)
@@ -47,6 +47,13 @@ strings = {
             "Available commands:\n"
             "/start - Create a new ad.\n"
             "/language - Change your preferred language.\n"
+            "/search - Search published ads.\n"
+            "/myads - List the ads you have posted.\n"
+            "/bump <number> - Repost one of your ads at the top of the channel.\n"
+            "/edit <number> - Change the price, location or description of a published ad.\n"
+            "/sold <number> - Mark an ad as sold.\n"
+            "/subscribe - Get a message when a matching ad is posted.\n"
+            "/subscriptions - Manage your saved searches.\n"
             "/help - Show this help message.\n"
             "/cancel - Cancel the current ad creation process."
         ),
@@ -114,6 +121,90 @@ strings = {
         "preview_media_info_photo": "📸 {count} Photo(s)",
         "preview_media_info_video": "📹 {count} Video(s)",
         "preview_media_info_mixed": "🖼️ {count} Media file(s)",
+
+        # --- Search ---
+        "command_desc_search": "Search published ads",
+        "search_usage": "Send /search followed by what you are looking for, e.g. /search toyota 2018",
+        "search_no_results": "Nothing found for \"{query}\".",
+        "search_results_header": "🔎 Results for \"{query}\":",
+        "search_session_expired": "This search has expired. Please run /search again.",
+        "browse_busy": "Too many people are browsing right now. Please try again in a moment.",
+        "btn_newer": "⬅️ Newer",
+        "btn_older": "Older ➡️",
+
+        # --- Numeric input validation ---
+        "car_year_invalid": "Please enter the year as four digits, e.g. 2018.",
+        "car_mileage_invalid": "Please enter the mileage as a number, e.g. 55000 km or 55k km.",
+        "house_rooms_invalid": "Please enter the number of rooms as a whole number, e.g. 3.",
+        "house_area_invalid": "Please enter the area as a number, e.g. 120 m² or 6 sotix.",
+        "house_year_built_invalid": "Please enter the year as four digits, e.g. 2010.",
+
+        # --- My ads ---
+        "command_desc_myads": "My ads",
+        "myads_header": "📋 Your ads ({count} in total):",
+        "myads_empty": "You haven't posted any ads yet. Use /start to create one.",
+        "post_status_published": "✅ Published",
+        "post_status_pending": "⏳ Pending",
+        "post_status_failed": "⚠️ Not published (error)",
+
+        # --- Saved searches ---
+        "command_desc_subscribe": "Get alerts for new ads",
+        "command_desc_subscriptions": "My saved searches",
+        "subscribe_usage": "Tell me what to watch for, e.g.:\n/subscribe cars under $10k in Tashkent",
+        "subscribe_saved": "🔔 Saved! I'll message you when a new ad matches \"{query}\".\nManage your alerts with /subscriptions.",
+        "subscribe_limit": "You already have {limit} saved searches. Remove one in /subscriptions first.",
+        "subscriptions_header": "🔔 Your saved searches:",
+        "subscriptions_empty": "You have no saved searches. Use /subscribe to create one.",
+        "btn_unsubscribe": "❌ {query}",
+        "unsubscribed": "Saved search removed.",
+        "subscription_alert": "🔔 New ad for your search \"{query}\":",
+
+        # --- Ad lifetime ---
+        "post_status_expired": "⌛ Expired",
+        "channel_ad_expired": "⌛ This ad has expired.",
+        "channel_ad_bumped": "⬆️ This ad has been reposted, see the newer post.",
+        "ad_expired_notice": "⌛ Your ad #{post_id} has expired. Send /bump {post_id} to post it again.",
+        "bump_usage": "Send the number of the ad to repost, e.g. /bump 42 (see /myads).",
+        "ad_not_found": "Ad #{post_id} was not found among your published ads.",
+        "bump_too_soon": "This ad was posted recently. You can bump it again after {time} (UTC).",
+        "bump_done": "⬆️ Ad #{post_id} was reposted at the top of the channel.",
+
+        # --- Changing published ads ---
+        "post_status_sold": "🤝 Sold",
+        "channel_ad_sold": "🤝 SOLD",
+        "sold_usage": "Send the number of the sold ad, e.g. /sold 42 (several numbers are fine, see /myads).",
+        "sold_done": "🤝 Marked as sold: {post_ids}. The channel posts were updated.",
+        "edit_published_usage": "Send the number of the ad to change, e.g. /edit 42 (see /myads).",
+        "edit_published_choose": "What do you want to change in ad #{post_id}?",
+        "edit_published_ask": "Send the new value for *{field_name}*.",
+        "edit_published_done": "✏️ Ad #{post_id} was updated in the channel.",
+        "edit_published_cancelled": "Editing cancelled, the ad was not changed.",
+
+        # --- Duplicate ads ---
+        "btn_post_anyway": "✅ Post anyway",
+        "duplicate_warning": "⚠️ This ad is identical to one you already posted: {link}\nPost it again anyway?",
+        "duplicate_blocked": "⚠️ This ad is identical to one you already posted: {link}\nUse /bump to move it to the top instead.",
+        "duplicate_bumped": "⬆️ You already had this ad (#{post_id}), so it was moved to the top of the channel instead of being posted twice.",
+
+        # --- Anti-spam ---
+        "rate_limited": "⏳ Too many requests. Please wait {seconds} s and try again.",
+        "post_rate_limited": "⏳ You have posted too many ads recently. Your draft is kept, try again in {minutes} min.",
+
+        # --- Repeated Post ---
+        "already_submitted": "✅ This ad has already been submitted.",
+        "preview_outdated": "This preview is outdated. Please use the buttons of the latest preview.",
+
+        # --- Digest posts ---
+        "digest_header": "📋 New in {category} ({count}):",
+        "post_queued_for_digest": "✅ Your ad is published and will be listed in the next digest post in {target_chat_id}.",
+
+        # --- Moderation ---
+        "post_pending_review": "📝 Thank you! Your ad was sent for review and will be published once a moderator approves it.",
+        "ad_approved": "✅ Your ad #{post_id} was approved and published.",
+        "ad_rejected": "❌ Your ad #{post_id} was rejected by a moderator.",
+
+        # --- Price Hints ---
+        "price_hint": "💡 Similar ads were listed at *{low}–{high}{currency}*.",
     },
     'ru': {
         # --- General & Existing ---
@@ -157,6 +248,13 @@ strings = {
             "Доступные команды:\n"
             "/start - Создать новое объявление.\n"
             "/language - Изменить предпочитаемый язык.\n"
+            "/search - Поиск опубликованных объявлений.\n"
+            "/myads - Ваши объявления.\n"
+            "/bump <номер> - Поднять ваше объявление наверх канала.\n"
+            "/edit <номер> - Изменить цену, местоположение или описание опубликованного объявления.\n"
+            "/sold <номер> - Отметить объявление как проданное.\n"
+            "/subscribe - Получать уведомления о подходящих объявлениях.\n"
+            "/subscriptions - Управление сохранёнными поисками.\n"
             "/help - Показать это справочное сообщение.\n"
             "/cancel - Отменить текущий процесс создания объявления."
         ),
@@ -225,6 +323,90 @@ strings = {
         "preview_media_info_photo": "📸 Фото: {count}",
         "preview_media_info_video": "📹 Видео: {count}",
         "preview_media_info_mixed": "🖼️ Медиафайлов: {count}",
+
+        # --- Search ---
+        "command_desc_search": "Поиск объявлений",
+        "search_usage": "Отправьте /search и то, что вы ищете, например: /search toyota 2018",
+        "search_no_results": "По запросу \"{query}\" ничего не найдено.",
+        "search_results_header": "🔎 Результаты по запросу \"{query}\":",
+        "search_session_expired": "Этот поиск устарел. Пожалуйста, выполните /search ещё раз.",
+        "browse_busy": "Сейчас слишком много запросов. Пожалуйста, попробуйте ещё раз через минуту.",
+        "btn_newer": "⬅️ Новее",
+        "btn_older": "Старее ➡️",
+
+        # --- Numeric input validation ---
+        "car_year_invalid": "Введите год четырьмя цифрами, например 2018.",
+        "car_mileage_invalid": "Введите пробег числом, например 55000 км или 55k км.",
+        "house_rooms_invalid": "Введите количество комнат целым числом, например 3.",
+        "house_area_invalid": "Введите площадь числом, например 120 м² или 6 соток.",
+        "house_year_built_invalid": "Введите год четырьмя цифрами, например 2010.",
+
+        # --- My ads ---
+        "command_desc_myads": "Мои объявления",
+        "myads_header": "📋 Ваши объявления (всего {count}):",
+        "myads_empty": "Вы ещё не публиковали объявлений. Используйте /start, чтобы создать первое.",
+        "post_status_published": "✅ Опубликовано",
+        "post_status_pending": "⏳ В ожидании",
+        "post_status_failed": "⚠️ Не опубликовано (ошибка)",
+
+        # --- Saved searches ---
+        "command_desc_subscribe": "Уведомления о новых объявлениях",
+        "command_desc_subscriptions": "Мои сохранённые поиски",
+        "subscribe_usage": "Напишите, что отслеживать, например:\n/subscribe машина до $10k Ташкент",
+        "subscribe_saved": "🔔 Сохранено! Я напишу вам, когда появится объявление по запросу \"{query}\".\nУправлять уведомлениями: /subscriptions.",
+        "subscribe_limit": "У вас уже {limit} сохранённых поисков. Сначала удалите один в /subscriptions.",
+        "subscriptions_header": "🔔 Ваши сохранённые поиски:",
+        "subscriptions_empty": "У вас нет сохранённых поисков. Создайте с помощью /subscribe.",
+        "btn_unsubscribe": "❌ {query}",
+        "unsubscribed": "Сохранённый поиск удалён.",
+        "subscription_alert": "🔔 Новое объявление по вашему запросу \"{query}\":",
+
+        # --- Ad lifetime ---
+        "post_status_expired": "⌛ Срок истёк",
+        "channel_ad_expired": "⌛ Срок этого объявления истёк.",
+        "channel_ad_bumped": "⬆️ Объявление опубликовано заново, смотрите более новый пост.",
+        "ad_expired_notice": "⌛ Срок вашего объявления #{post_id} истёк. Отправьте /bump {post_id}, чтобы опубликовать его снова.",
+        "bump_usage": "Укажите номер объявления, например /bump 42 (см. /myads).",
+        "ad_not_found": "Объявление #{post_id} не найдено среди ваших опубликованных объявлений.",
+        "bump_too_soon": "Объявление было опубликовано недавно. Поднять его снова можно после {time} (UTC).",
+        "bump_done": "⬆️ Объявление #{post_id} снова опубликовано вверху канала.",
+
+        # --- Changing published ads ---
+        "post_status_sold": "🤝 Продано",
+        "channel_ad_sold": "🤝 ПРОДАНО",
+        "sold_usage": "Укажите номер проданного объявления, например /sold 42 (можно несколько, см. /myads).",
+        "sold_done": "🤝 Отмечено как проданное: {post_ids}. Посты в канале обновлены.",
+        "edit_published_usage": "Укажите номер объявления, например /edit 42 (см. /myads).",
+        "edit_published_choose": "Что изменить в объявлении #{post_id}?",
+        "edit_published_ask": "Отправьте новое значение для поля *{field_name}*.",
+        "edit_published_done": "✏️ Объявление #{post_id} обновлено в канале.",
+        "edit_published_cancelled": "Редактирование отменено, объявление не изменено.",
+
+        # --- Duplicate ads ---
+        "btn_post_anyway": "✅ Всё равно опубликовать",
+        "duplicate_warning": "⚠️ Это объявление совпадает с уже опубликованным вами: {link}\nОпубликовать его ещё раз?",
+        "duplicate_blocked": "⚠️ Это объявление совпадает с уже опубликованным вами: {link}\nЧтобы поднять его наверх, используйте /bump.",
+        "duplicate_bumped": "⬆️ Такое объявление у вас уже есть (#{post_id}), поэтому оно поднято наверх канала вместо повторной публикации.",
+
+        # --- Anti-spam ---
+        "rate_limited": "⏳ Слишком много запросов. Подождите {seconds} с и попробуйте снова.",
+        "post_rate_limited": "⏳ Вы недавно опубликовали слишком много объявлений. Черновик сохранён, попробуйте через {minutes} мин.",
+
+        # --- Repeated Post ---
+        "already_submitted": "✅ Это объявление уже отправлено.",
+        "preview_outdated": "Этот предпросмотр устарел. Используйте кнопки последнего предпросмотра.",
+
+        # --- Digest posts ---
+        "digest_header": "📋 Новое в разделе {category} ({count}):",
+        "post_queued_for_digest": "✅ Объявление опубликовано и попадёт в ближайшую подборку в {target_chat_id}.",
+
+        # --- Moderation ---
+        "post_pending_review": "📝 Спасибо! Объявление отправлено на проверку и будет опубликовано после одобрения модератором.",
+        "ad_approved": "✅ Ваше объявление #{post_id} одобрено и опубликовано.",
+        "ad_rejected": "❌ Ваше объявление #{post_id} отклонено модератором.",
+
+        # --- Price Hints ---
+        "price_hint": "💡 Похожие объявления выставлялись за *{low}–{high}{currency}*.",
     },
     'uz': {
         # --- General & Existing ---
@@ -273,6 +455,13 @@ strings = {
             "Mavjud buyruqlar:\n"
             "/start - Yangi e'lon yaratish.\n"
             "/language - Tilni o'zgartirish.\n"
+            "/search - E'lonlarni qidirish.\n"
+            "/myads - Siz joylagan e'lonlar.\n"
+            "/bump <raqam> - E'loningizni kanal tepasiga ko'tarish.\n"
+            "/edit <raqam> - Joylangan e'lonning narxi, joylashuvi yoki tavsifini o'zgartirish.\n"
+            "/sold <raqam> - E'lonni sotilgan deb belgilash.\n"
+            "/subscribe - Mos e'lon chiqqanda xabar olish.\n"
+            "/subscriptions - Saqlangan qidiruvlarni boshqarish.\n"
             "/help - Ushbu yordam xabarini ko'rsatish.\n"
             "/cancel - Joriy e'lon yaratish jarayonini bekor qilish."
         ),
@@ -341,6 +530,90 @@ strings = {
         "preview_media_info_photo": "📸 {count} ta Rasm",
         "preview_media_info_video": "📹 {count} ta Video",
         "preview_media_info_mixed": "🖼️ {count} ta Media fayl",
+
+        # --- Search ---
+        "command_desc_search": "E'lonlarni qidirish",
+        "search_usage": "/search buyrug'idan keyin nimani qidirayotganingizni yozing, masalan: /search toyota 2018",
+        "search_no_results": "\"{query}\" bo'yicha hech narsa topilmadi.",
+        "search_results_header": "🔎 \"{query}\" bo'yicha natijalar:",
+        "search_session_expired": "Bu qidiruv eskirgan. Iltimos, /search ni qaytadan yuboring.",
+        "browse_busy": "Hozir so'rovlar juda ko'p. Iltimos, birozdan so'ng qayta urinib ko'ring.",
+        "btn_newer": "⬅️ Yangiroq",
+        "btn_older": "Eskiroq ➡️",
+
+        # --- Numeric input validation ---
+        "car_year_invalid": "Yilni to'rt raqam bilan kiriting, masalan 2018.",
+        "car_mileage_invalid": "Probegni raqam bilan kiriting, masalan 55000 km yoki 55k km.",
+        "house_rooms_invalid": "Xonalar sonini butun son bilan kiriting, masalan 3.",
+        "house_area_invalid": "Maydonni raqam bilan kiriting, masalan 120 m² yoki 6 sotix.",
+        "house_year_built_invalid": "Yilni to'rt raqam bilan kiriting, masalan 2010.",
+
+        # --- My ads ---
+        "command_desc_myads": "Mening e'lonlarim",
+        "myads_header": "📋 Sizning e'lonlaringiz (jami {count}):",
+        "myads_empty": "Siz hali e'lon joylamagansiz. Yangi e'lon uchun /start ni bosing.",
+        "post_status_published": "✅ Joylangan",
+        "post_status_pending": "⏳ Kutilmoqda",
+        "post_status_failed": "⚠️ Joylanmadi (xatolik)",
+
+        # --- Saved searches ---
+        "command_desc_subscribe": "Yangi e'lonlar haqida xabarnoma",
+        "command_desc_subscriptions": "Saqlangan qidiruvlarim",
+        "subscribe_usage": "Nimani kuzatish kerakligini yozing, masalan:\n/subscribe mashina 10000$ gacha Toshkent",
+        "subscribe_saved": "🔔 Saqlandi! \"{query}\" bo'yicha yangi e'lon chiqsa, sizga xabar beraman.\nXabarnomalarni boshqarish: /subscriptions.",
+        "subscribe_limit": "Sizda allaqachon {limit} ta saqlangan qidiruv bor. Avval /subscriptions orqali bittasini o'chiring.",
+        "subscriptions_header": "🔔 Saqlangan qidiruvlaringiz:",
+        "subscriptions_empty": "Saqlangan qidiruvlaringiz yo'q. /subscribe orqali yarating.",
+        "btn_unsubscribe": "❌ {query}",
+        "unsubscribed": "Saqlangan qidiruv o'chirildi.",
+        "subscription_alert": "🔔 \"{query}\" qidiruvingiz bo'yicha yangi e'lon:",
+
+        # --- Ad lifetime ---
+        "post_status_expired": "⌛ Muddati tugagan",
+        "channel_ad_expired": "⌛ Bu e'lonning muddati tugagan.",
+        "channel_ad_bumped": "⬆️ E'lon qayta joylandi, yangi postni ko'ring.",
+        "ad_expired_notice": "⌛ #{post_id} e'loningiz muddati tugadi. Qayta joylash uchun /bump {post_id} yuboring.",
+        "bump_usage": "E'lon raqamini yuboring, masalan /bump 42 (/myads ga qarang).",
+        "ad_not_found": "#{post_id} e'lon joylangan e'lonlaringiz orasida topilmadi.",
+        "bump_too_soon": "E'lon yaqinda joylangan. Uni {time} (UTC) dan keyin yana ko'tarishingiz mumkin.",
+        "bump_done": "⬆️ #{post_id} e'lon kanal tepasiga qayta joylandi.",
+
+        # --- Changing published ads ---
+        "post_status_sold": "🤝 Sotildi",
+        "channel_ad_sold": "🤝 SOTILDI",
+        "sold_usage": "Sotilgan e'lon raqamini yuboring, masalan /sold 42 (bir nechta bo'lishi mumkin, /myads ga qarang).",
+        "sold_done": "🤝 Sotilgan deb belgilandi: {post_ids}. Kanaldagi postlar yangilandi.",
+        "edit_published_usage": "E'lon raqamini yuboring, masalan /edit 42 (/myads ga qarang).",
+        "edit_published_choose": "#{post_id} e'londa nimani o'zgartirmoqchisiz?",
+        "edit_published_ask": "*{field_name}* uchun yangi qiymatni yuboring.",
+        "edit_published_done": "✏️ #{post_id} e'lon kanalda yangilandi.",
+        "edit_published_cancelled": "Tahrirlash bekor qilindi, e'lon o'zgarmadi.",
+
+        # --- Duplicate ads ---
+        "btn_post_anyway": "✅ Baribir joylash",
+        "duplicate_warning": "⚠️ Bu e'lon siz avval joylagan e'lon bilan bir xil: {link}\nBaribir yana joylaysizmi?",
+        "duplicate_blocked": "⚠️ Bu e'lon siz avval joylagan e'lon bilan bir xil: {link}\nUni tepaga ko'tarish uchun /bump dan foydalaning.",
+        "duplicate_bumped": "⬆️ Sizda bu e'lon allaqachon bor (#{post_id}), shuning uchun u ikkinchi marta joylanmasdan kanal tepasiga ko'tarildi.",
+
+        # --- Anti-spam ---
+        "rate_limited": "⏳ So'rovlar juda ko'p. {seconds} soniya kutib, qayta urinib ko'ring.",
+        "post_rate_limited": "⏳ Yaqinda juda ko'p e'lon joyladingiz. Qoralama saqlandi, {minutes} daqiqadan keyin urinib ko'ring.",
+
+        # --- Repeated Post ---
+        "already_submitted": "✅ Bu e'lon allaqachon yuborilgan.",
+        "preview_outdated": "Bu oldindan ko'rish eskirgan. Iltimos, oxirgi oldindan ko'rish tugmalaridan foydalaning.",
+
+        # --- Digest posts ---
+        "digest_header": "📋 {category} bo'limida yangi ({count}):",
+        "post_queued_for_digest": "✅ E'loningiz joylandi va {target_chat_id} dagi navbatdagi jamlanmaga kiritiladi.",
+
+        # --- Moderation ---
+        "post_pending_review": "📝 Rahmat! E'loningiz tekshiruvga yuborildi va moderator tasdiqlagach joylanadi.",
+        "ad_approved": "✅ #{post_id} e'loningiz tasdiqlandi va joylandi.",
+        "ad_rejected": "❌ #{post_id} e'loningiz moderator tomonidan rad etildi.",
+
+        # --- Price Hints ---
+        "price_hint": "💡 O'xshash e'lonlar narxi: *{low}–{high}{currency}*.",
     }
 }
 
@@ -1,16 +1,40 @@
 # selling_bot/main.py
+import asyncio
 import logging
+import signal
 from telegram.ext import Application, CommandHandler
 from telegram import BotCommand # For setting command list
 
 import config # Ensure this import works (absolute from project root)
-from services import database_service as db
+from services.storage import storage as db
+from services import bot_context
 from handlers.conversation_flow import (
     create_ad_posting_conversation_handler,
     create_language_change_conversation_handler,
     # cancel_conversation, # Individual convs have cancel in fallbacks
     help_command
 )
+from handlers.browse_commands import create_browse_handlers
+from handlers.subscription_commands import create_subscription_handlers
+from handlers.ad_commands import create_ad_handlers, create_ad_link_handler
+from handlers.throttling import create_throttling_handler
+from handlers.moderation_commands import create_moderation_handlers
+from handlers.admin_commands import (profile_command, install_profile_signal, stats_command,
+                                     dashboard_command, dashboard_rebuild_command,
+                                     broadcast_command, broadcast_cancel_command, export_command)
+from services import funnel_stats
+from services import subscriptions
+from services import price_hints
+from services import archive
+from services.notification_queue import notification_queue
+from services.channel_publisher import channel_edit_queue
+from services.channel_router import channel_router
+from services.digest import digest_publisher
+from services.moderation import approved_post_publisher
+from services.broadcast import broadcast_engine
+from services.expiry_scheduler import expiry_scheduler
+from services import image_hashing
+from services import spam_limiter
 from localization import get_text # For command descriptions
 
 # Enable logging
@@ -22,13 +46,56 @@ logger = logging.getLogger(__name__)
 
 async def post_init(application: Application):
     await db.init_db()
+    if hasattr(db, "claim_worker"): # PostgreSQL: refuses to start next to another worker on the same schema
+        await db.claim_worker()
     logger.info("Bot application initialized and database checked/created.")
+
+    # `kill -USR1 <pid>` starts a profiling window without touching the bot (the process-wide sampler, installed once)
+    if hasattr(signal, "SIGUSR1") and bot_context.current_bot() is bot_context.bots[0]:
+        install_profile_signal(application, signal.SIGUSR1)
+
+    # Funnel counters live in memory and are written as rollups once a minute
+    application.job_queue.run_repeating(funnel_stats.flush_funnel_stats, interval=config.FUNNEL_FLUSH_INTERVAL,
+                                        first=config.FUNNEL_FLUSH_INTERVAL, name="funnel_flush")
+
+    # Anti-spam windows: restored from the DB, saved back periodically
+    await spam_limiter.load_limits()
+    application.job_queue.run_repeating(spam_limiter.flush_limits, interval=config.RATE_LIMIT_FLUSH_INTERVAL,
+                                        first=config.RATE_LIMIT_FLUSH_INTERVAL, name="rate_limit_flush")
+
+    # Price hints for the price step: sketches restored from the DB, changed ones saved back periodically
+    await price_hints.load_price_hints()
+    application.job_queue.run_repeating(price_hints.flush_price_hints, interval=config.PRICE_HINT_FLUSH_INTERVAL,
+                                        first=config.PRICE_HINT_FLUSH_INTERVAL, name="price_hints_flush")
+
+    # Old finished posts move to monthly archive files once a day, then the hot file is vacuumed (SQLite files only)
+    if config.STORAGE_BACKEND == "sqlite":
+        application.job_queue.run_repeating(archive.archive_old_posts, interval=config.ARCHIVE_INTERVAL,
+                                            first=config.ARCHIVE_INTERVAL, name="archive")
+
+    # Saved searches are matched in memory; alerts go out through a rate-limited queue
+    await subscriptions.load_subscriptions()
+    notification_queue.start(application.bot)
+
+    # One scheduler task for all ad deadlines; channel relabels go through their own rate-limited queue
+    channel_edit_queue.start(application.bot)
+    expiry_scheduler.start()
+    await digest_publisher.start(application.bot)
+    await approved_post_publisher.start(application.bot) # Approved ads left over from before a restart
+    await broadcast_engine.start(application.bot) # Resumes an interrupted broadcast from its checkpoint
+
+    # Photo hashing runs in worker processes, fed by a background download queue
+    await image_hashing.pipeline.start(application.bot)
     
     # Define bot commands for the '/' menu (optional but good UX)
     # Ensure you have localization keys for these descriptions
     commands_to_set = [
         BotCommand("start", get_text("command_desc_start", config.DEFAULT_LANGUAGE) if "command_desc_start" in strings[config.DEFAULT_LANGUAGE] else "Create a new ad"),
         BotCommand("language", get_text("command_desc_language", config.DEFAULT_LANGUAGE) if "command_desc_language" in strings[config.DEFAULT_LANGUAGE] else "Change language"),
+        BotCommand("search", get_text("command_desc_search", config.DEFAULT_LANGUAGE) if "command_desc_search" in strings[config.DEFAULT_LANGUAGE] else "Search ads"),
+        BotCommand("myads", get_text("command_desc_myads", config.DEFAULT_LANGUAGE) if "command_desc_myads" in strings[config.DEFAULT_LANGUAGE] else "My ads"),
+        BotCommand("subscribe", get_text("command_desc_subscribe", config.DEFAULT_LANGUAGE) if "command_desc_subscribe" in strings[config.DEFAULT_LANGUAGE] else "Get alerts for new ads"),
+        BotCommand("subscriptions", get_text("command_desc_subscriptions", config.DEFAULT_LANGUAGE) if "command_desc_subscriptions" in strings[config.DEFAULT_LANGUAGE] else "My saved searches"),
         BotCommand("help", get_text("command_desc_help", config.DEFAULT_LANGUAGE) if "command_desc_help" in strings[config.DEFAULT_LANGUAGE] else "Get help"),
         BotCommand("cancel", get_text("command_desc_cancel", config.DEFAULT_LANGUAGE) if "command_desc_cancel" in strings[config.DEFAULT_LANGUAGE] else "Cancel current operation")
     ]
@@ -42,28 +109,113 @@ async def post_init(application: Application):
         logger.error(f"Failed to set bot commands: {e}")
 
 
-def main() -> None:
-    if not config.BOT_TOKEN or config.BOT_TOKEN == "YOUR_TELEGRAM_BOT_TOKEN":
-        logger.error("BOT_TOKEN is not set correctly in config.py.")
-        return
-    if not config.TARGET_CHAT_ID or config.TARGET_CHAT_ID == "YOUR_TARGET_CHAT_ID":
-        logger.error("TARGET_CHAT_ID is not set correctly in config.py.")
-        return
+async def post_shutdown(application: Application):
+    await funnel_stats.flush_funnel_stats() # Don't lose the last partial minute
+    await spam_limiter.flush_limits()
+    await price_hints.flush_price_hints()
+    logger.info("Pending stats flushed on shutdown.")
+    await expiry_scheduler.stop()
+    await image_hashing.pipeline.stop()
+    await broadcast_engine.stop()
+    await approved_post_publisher.stop()
+    await digest_publisher.stop()
+    await channel_router.stop()
+    await channel_edit_queue.stop()
+    await notification_queue.stop()
+
 
-    application = Application.builder().token(config.BOT_TOKEN).post_init(post_init).build()
+def build_application(bot: bot_context.BotConfig) -> Application:
+    builder = Application.builder().token(bot.token)
+    if config.BOT_API_BASE_URL: # Self-hosted/local Bot API server
+        builder = builder.base_url(config.BOT_API_BASE_URL)
+        if config.BOT_API_BASE_FILE_URL:
+            builder = builder.base_file_url(config.BOT_API_BASE_FILE_URL)
+    application = builder.build()
+
+    # Group -1 runs before every other handler: updates over the per-user limits stop here
+    application.add_handler(create_throttling_handler(), group=-1)
 
     ad_posting_conv_handler = create_ad_posting_conversation_handler()
     language_change_conv_handler = create_language_change_conversation_handler()
 
+    application.add_handler(create_ad_link_handler()) # /start ad_<id>, before the conversation's /start
     application.add_handler(ad_posting_conv_handler)
     application.add_handler(language_change_conv_handler)
     application.add_handler(CommandHandler("help", help_command))
+    application.add_handlers(create_browse_handlers())
+    application.add_handlers(create_subscription_handlers())
+    application.add_handlers(create_ad_handlers())
+    application.add_handler(CommandHandler("profile", profile_command)) # Admin only
+    application.add_handler(CommandHandler("stats", stats_command)) # Admin only
+    application.add_handler(CommandHandler("dashboard", dashboard_command)) # Admin only
+    application.add_handler(CommandHandler("dashboard_rebuild", dashboard_rebuild_command)) # Admin only
+    application.add_handlers(create_moderation_handlers()) # Admin only
+    application.add_handler(CommandHandler("broadcast", broadcast_command)) # Admin only
+    application.add_handler(CommandHandler("broadcast_cancel", broadcast_cancel_command)) # Admin only
+    application.add_handler(CommandHandler("export", export_command)) # Admin only
     # A top-level cancel might be useful if a user gets stuck outside a known conversation
     # but ConversationHandler's fallbacks should usually catch it.
     # application.add_handler(CommandHandler("cancel", top_level_cancel_function)) # If needed
+    return application
+
+
+async def run_bot(bot: bot_context.BotConfig, stop: asyncio.Event):
+    """
+    One bot's whole life: start, poll until `stop` is set, shut down. Runs as its own task, so the
+    use_bot() below carries over to every handler, job and service task started for this bot.
+    As with run_polling(), post_shutdown runs however the bot ends: stopped, failed or cancelled.
+    """
+    bot_context.use_bot(bot)
+    application = build_application(bot)
+    async with application: # initialize() ... shutdown()
+        try:
+            await post_init(application)
+            await application.updater.start_polling()
+            await application.start()
+            logger.info(f"Bot '{bot.name}' (@{application.bot.username}) polling...")
+            await stop.wait()
+        finally:
+            if application.updater.running:
+                await application.updater.stop()
+            if application.running:
+                await application.stop()
+            await post_shutdown(application)
+
+
+async def run_bots(bots: list):
+    """All bots as separate Applications on this event loop, sharing the process (imports, catalog, DB pool)."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except (NotImplementedError, AttributeError, ValueError): # Windows: Ctrl+C raises KeyboardInterrupt instead
+            pass
+    try:
+        # A bot that fails (e.g. a revoked token) is logged and the others keep running
+        results = await asyncio.gather(*(run_bot(bot, stop) for bot in bots), return_exceptions=True)
+        for bot, result in zip(bots, results):
+            if isinstance(result, Exception):
+                logger.error(f"Bot '{bot.name}' stopped with an error: {result!r}", exc_info=result)
+    finally:
+        # Only once every bot is down: the SQLite reader pool is shared by all of them (on PostgreSQL
+        # each bot's own pools are closed in its context)
+        for bot in bots:
+            bot_context.use_bot(bot)
+            await db.close_db()
+
+
+def main() -> None:
+    for bot in bot_context.bots:
+        if not bot.token or bot.token == "YOUR_TELEGRAM_BOT_TOKEN":
+            logger.error(f"Bot '{bot.name}': BOT_TOKEN (or its \"token\" in BOTS) is not set correctly.")
+            return
+        if not bot.target_chat_id or bot.target_chat_id == "YOUR_TARGET_CHAT_ID":
+            logger.error(f"Bot '{bot.name}': TARGET_CHAT_ID (or its \"target_chat_id\" in BOTS) is not set correctly.")
+            return
 
-    logger.info("Bot starting to poll...")
-    application.run_polling()
+    logger.info(f"Starting {len(bot_context.bots)} bot(s): {', '.join(bot.name for bot in bot_context.bots)}")
+    asyncio.run(run_bots(bot_context.bots))
 
 # Need to import strings from localization for set_my_commands
 from localization import strings 
@@ -0,0 +1,116 @@
+# selling_bot/services/archive.py
+"""
+Keeps the hot database small: finished posts older than config.ARCHIVE_RETENTION_DAYS are moved into
+one SQLite file per month of creation (ARCHIVE_DIR/posts_YYYY_MM.db), then freed pages are returned
+with an incremental vacuum. Archive files are only ever attached read-only by readers.
+
+    python -m services.archive                                  # one archiving pass now
+    python -m services.archive --enable-incremental-vacuum      # one-off conversion of an older file (bot stopped)
+    python -m services.archive --query "SELECT category, COUNT(*) FROM all_posts GROUP BY 1" --from 2024-01 --to 2024-06
+"""
+import argparse
+import asyncio
+import csv
+import logging
+import os
+import re
+import sys
+from datetime import datetime, timedelta, timezone
+
+import config
+from services import database_service as db
+from services import bot_context
+
+logger = logging.getLogger(__name__)
+
+# Statuses after which a post never changes again (plus every failed_to_publish_* variant); live and
+# in-review posts always stay hot
+ARCHIVABLE_STATUSES = ("pending", "expired", "sold", "rejected")
+ARCHIVABLE_STATUS_PREFIX = "failed_to_publish_"
+ARCHIVE_FILE_PATTERN = re.compile(r"^posts_(\d{4}_\d{2})\.db$")
+
+
+def archive_dir() -> str:
+    """ARCHIVE_DIR, or ARCHIVE_DIR_<data> for a bot with data of its own (services/bot_context.py)."""
+    data = bot_context.current_bot().data
+    return config.ARCHIVE_DIR if data is None else f"{config.ARCHIVE_DIR}_{data}"
+
+
+def archive_path(month: str) -> str:
+    return os.path.join(archive_dir(), f"posts_{month}.db")
+
+
+def archive_paths(date_from: str = None, date_to: str = None) -> list:
+    """Existing archive files, oldest first, limited to the months overlapping [date_from, date_to) (YYYY-MM[-DD])."""
+    if not os.path.isdir(archive_dir()):
+        return []
+    months = sorted(match.group(1) for match in map(ARCHIVE_FILE_PATTERN.match, os.listdir(archive_dir())) if match)
+    if date_from:
+        months = [month for month in months if month >= date_from[:7].replace("-", "_")]
+    if date_to:
+        months = [month for month in months if month < date_to.replace("-", "_")]
+    return [archive_path(month) for month in months]
+
+
+async def archive_old_posts(context=None) -> int:
+    """Moves every archivable post older than the retention window, then vacuums. Usable as a JobQueue callback."""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=config.ARCHIVE_RETENTION_DAYS)).strftime("%Y-%m-%d %H:%M:%S")
+    moved = 0
+    for path in db.shard_paths():
+        after_id = 0
+        while True:
+            rows = await db.get_archive_candidates(path, after_id, config.ARCHIVE_BATCH_SIZE)
+            by_month, reached_cutoff = {}, False
+            for post_id, created_at, status in rows:
+                if created_at >= cutoff:
+                    reached_cutoff = True
+                    break
+                if status in ARCHIVABLE_STATUSES or (status or "").startswith(ARCHIVABLE_STATUS_PREFIX):
+                    by_month.setdefault(created_at[:7].replace("-", "_"), []).append(post_id)
+            if by_month:
+                os.makedirs(archive_dir(), exist_ok=True)
+            for month, post_ids in by_month.items():
+                moved += await db.move_posts_to_archive(path, post_ids, month, archive_path(month))
+            if reached_cutoff or len(rows) < config.ARCHIVE_BATCH_SIZE:
+                break
+            after_id = rows[-1][0]
+
+    freed_pages = await db.incremental_vacuum()
+    if freed_pages is None:
+        logger.warning("A database file isn't in incremental auto-vacuum mode, so archiving doesn't shrink the file. "
+                       "Stop the bot and run `python -m services.archive --enable-incremental-vacuum` once.")
+    logger.info(f"Archiving done: {moved} posts moved, {freed_pages or 0} pages freed.")
+    return moved
+
+
+async def _run_query(sql: str, date_from: str = None, date_to: str = None):
+    writer = csv.writer(sys.stdout)
+    async with db.connect_all_posts(archive_paths(date_from, date_to)) as connection:
+        async with connection.execute(sql) as cursor:
+            writer.writerow(column[0] for column in cursor.description)
+            async for row in cursor:
+                writer.writerow(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old posts, or query hot and archived posts together.")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="Convert the database to incremental auto-vacuum (full VACUUM; stop the bot first)")
+    parser.add_argument("--query", help="SQL to run against the all_posts view (hot + archived posts); prints CSV")
+    parser.add_argument("--from", dest="date_from", help="First archive month to attach (YYYY-MM)")
+    parser.add_argument("--to", dest="date_to", help="Attach archive months before this one (YYYY-MM)")
+    bot_context.add_bot_argument(parser)
+    args = parser.parse_args()
+    bot_context.select_bot(args)
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    if args.enable_incremental_vacuum:
+        asyncio.run(db.enable_incremental_vacuum())
+        print("Incremental auto-vacuum enabled.")
+    elif args.query:
+        asyncio.run(_run_query(args.query, args.date_from, args.date_to))
+    else:
+        print(f"{asyncio.run(archive_old_posts())} posts archived.")
+
+
+if __name__ == "__main__":
+    main()
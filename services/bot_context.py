@@ -0,0 +1,131 @@
+# selling_bot/services/bot_context.py
+"""
+Several bots in one process (config.BOTS). main.py runs each bot as its own Application on the shared
+event loop, inside a task that first calls use_bot(); every task started from there (update handlers,
+jobs, the background tasks of the services) inherits that context, so current_bot() always answers
+"which bot is this for".
+
+Services keep their module-level singletons but wrap the stateful ones in PerBot: one instance per bot,
+built on first use, and attribute access goes to the current bot's. Code outside any bot (the CLI tools)
+works for the first configured bot, or the one given with --bot.
+
+Data stays apart per bot: a bot with a `data` name keeps its posts, users and everything else in its
+own files (ads_bot_<data>.db, ARCHIVE_DIR_<data>/) or PostgreSQL schema; the bot without one uses the
+original ads_bot.db. Localization, keyboards, the read-only connection pool and the photo hashing
+processes are shared by all of them.
+"""
+import contextvars
+import re
+
+import config
+
+DATA_NAME_PATTERN = re.compile(r"^[a-z0-9_]+$") # Goes into file and schema names
+
+
+def normalize_chat_id(value):
+    """'-100123' (as stored in post_targets or given in CHANNEL_ROUTES) -> -100123; '@name' stays a string."""
+    text = str(value).strip()
+    return int(text) if text.lstrip("-").isdigit() else text
+
+
+class BotConfig:
+    def __init__(self, name: str, token: str, target_chat_id, channel_routes: dict, data: str = None):
+        self.name = name
+        self.token = token
+        self.target_chat_id = target_chat_id
+        self.channel_routes = channel_routes
+        self.data = data # None: the original single-bot files
+
+    def __repr__(self) -> str:
+        return f"BotConfig({self.name!r})"
+
+
+def _load_bots() -> list:
+    if not config.BOTS:
+        return [BotConfig("main", config.BOT_TOKEN, config.TARGET_CHAT_ID, config.CHANNEL_ROUTES)]
+    bots = [
+        BotConfig(entry["name"], entry["token"], normalize_chat_id(entry["target_chat_id"]),
+                  entry.get("channel_routes", config.CHANNEL_ROUTES), entry.get("data", entry["name"]))
+        for entry in config.BOTS
+    ]
+    for attribute in ("name", "token", "data"):
+        values = [getattr(bot, attribute) for bot in bots]
+        if len(set(values)) != len(values):
+            raise ValueError(f"BOTS: every bot needs its own {attribute} (at most one without 'data').")
+    for bot in bots:
+        if bot.data is not None and not DATA_NAME_PATTERN.match(bot.data):
+            raise ValueError(f"BOTS: data name '{bot.data}' of bot '{bot.name}' may only use a-z, 0-9 and _.")
+        if not config.IS_CHANNEL and isinstance(bot.target_chat_id, int):
+            config.ADMIN_USER_IDS.add(bot.target_chat_id) # As for the single bot: whoever receives the ads
+    return bots
+
+
+bots = _load_bots()
+_current = contextvars.ContextVar("current_bot", default=bots[0])
+
+
+def current_bot() -> BotConfig:
+    return _current.get()
+
+
+def use_bot(bot: BotConfig):
+    """Makes `bot` current for the calling task and every task it starts from now on."""
+    _current.set(bot)
+
+
+def get_bot(name: str) -> BotConfig:
+    for bot in bots:
+        if bot.name == name:
+            return bot
+    raise ValueError(f"Unknown bot '{name}' (configured: {', '.join(bot.name for bot in bots)}).")
+
+
+def add_bot_argument(parser):
+    """--bot NAME for the CLI tools; call select_bot(args) after parsing."""
+    if len(bots) > 1:
+        parser.add_argument("--bot", choices=[bot.name for bot in bots], default=bots[0].name,
+                            help="Which bot's data to work on")
+
+
+def select_bot(args):
+    if getattr(args, "bot", None):
+        use_bot(get_bot(args.bot))
+
+
+class PerBot:
+    """
+    Stands in for a module-level singleton that must not be shared between bots: factory(bot) builds
+    each bot's instance on first use, and attributes, item access and len() go to the current bot's.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._instances = {}
+
+    def instance(self, bot: BotConfig = None):
+        bot = bot or current_bot()
+        instance = self._instances.get(bot.name)
+        if instance is None:
+            instance = self._instances[bot.name] = self._factory(bot)
+        return instance
+
+    def __getattr__(self, name):
+        return getattr(self.instance(), name)
+
+    def __len__(self) -> int:
+        return len(self.instance())
+
+    def __iter__(self):
+        return iter(self.instance())
+
+    def __contains__(self, key) -> bool:
+        return key in self.instance()
+
+    def __getitem__(self, key):
+        return self.instance()[key]
+
+    def __setitem__(self, key, value):
+        self.instance()[key] = value
+
+    def __delitem__(self, key):
+        del self.instance()[key]
@@ -0,0 +1,137 @@
+# selling_bot/services/broadcast.py
+import asyncio
+import logging
+from typing import Optional
+
+from telegram.error import BadRequest, Forbidden, RetryAfter
+
+import config
+from services.storage import storage as db
+from services import profiler
+from services.bot_context import PerBot
+from services.rate_limiter import AsyncTokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastEngine:
+    """
+    Sends an announcement to every reachable user, one broadcast at a time. Recipients are streamed
+    from the users table in user_id-ordered chunks (never all rows at once). Each chunk is sent
+    concurrently under one global token bucket and then checkpointed, so a broadcast interrupted by
+    a restart resumes after the last finished chunk. Users who blocked the bot are marked and skipped
+    by later broadcasts. At worst one chunk is sent twice after a crash mid-chunk.
+    """
+
+    def __init__(self, rate_per_second: float, chunk_size: int):
+        self.chunk_size = chunk_size
+        self._bucket = AsyncTokenBucket(rate_per_second)
+        self._task: Optional[asyncio.Task] = None
+        self._broadcast_id: Optional[int] = None
+        self._in_flight = 0
+        self._bot = None
+
+    def __len__(self) -> int:
+        return self._in_flight
+
+    @property
+    def running_id(self) -> Optional[int]:
+        return self._broadcast_id if self._task else None
+
+    async def start(self, bot):
+        """Resumes a broadcast that was still running when the bot stopped."""
+        self._bot = bot
+        broadcast_id = await db.get_running_broadcast_id()
+        if broadcast_id:
+            logger.info(f"Resuming broadcast {broadcast_id}.")
+            self._launch(broadcast_id)
+
+    async def stop(self):
+        """Stops sending; the broadcast stays 'running' in the DB and resumes at the next start."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def begin(self, text: str, created_by: int) -> int | None:
+        """Starts a new broadcast. None if one is already running."""
+        if self._task:
+            return None
+        broadcast_id = await db.create_broadcast(text, created_by)
+        self._launch(broadcast_id)
+        return broadcast_id
+
+    async def cancel(self) -> int | None:
+        broadcast_id = self.running_id
+        if broadcast_id:
+            await self.stop()
+            await db.finish_broadcast(broadcast_id, 'cancelled')
+        return broadcast_id
+
+    def _launch(self, broadcast_id: int):
+        self._broadcast_id = broadcast_id
+        self._task = asyncio.create_task(self._run(broadcast_id), name=f"broadcast_{broadcast_id}")
+        self._task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: asyncio.Task):
+        if self._task is task:
+            self._task = None
+
+    async def _run(self, broadcast_id: int):
+        try:
+            await self._send_all(broadcast_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e: # Left 'running': the next start resumes it from the checkpoint
+            logger.error(f"Broadcast {broadcast_id} stopped: {e}", exc_info=True)
+
+    async def _send_all(self, broadcast_id: int):
+        broadcast = await db.get_broadcast(broadcast_id)
+        text, after_user_id = broadcast['text'], broadcast['last_user_id']
+        while True:
+            recipients = await db.get_broadcast_recipients(after_user_id, self.chunk_size)
+            if not recipients:
+                break
+            self._in_flight = len(recipients)
+            results = await asyncio.gather(*(self._send(user_id, text) for user_id, _ in recipients))
+            self._in_flight = 0
+            after_user_id = recipients[-1][0]
+            blocked = [user_id for (user_id, _), result in zip(recipients, results) if result == 'blocked']
+            await db.checkpoint_broadcast(broadcast_id, after_user_id, results.count('sent'), results.count('failed'), blocked)
+        await db.finish_broadcast(broadcast_id, 'done')
+        broadcast = await db.get_broadcast(broadcast_id)
+        logger.info(f"Broadcast {broadcast_id} done: {broadcast['sent']} sent, {broadcast['failed']} failed, "
+                    f"{broadcast['blocked']} blocked.")
+        if broadcast['created_by']:
+            await self._bot.send_message(broadcast['created_by'], format_progress(broadcast))
+
+    async def _send(self, user_id: int, text: str, attempts: int = 3) -> str:
+        for _ in range(attempts):
+            await self._bucket.acquire()
+            try:
+                await self._bot.send_message(user_id, text, disable_web_page_preview=True)
+                return 'sent'
+            except RetryAfter as e: # Applies to the whole bot: every concurrent send waits
+                logger.warning(f"Flood limit hit, pausing broadcast for {e.retry_after}s.")
+                self._bucket.pause(float(e.retry_after))
+            except Forbidden: # Blocked the bot or deactivated
+                return 'blocked'
+            except BadRequest as e: # Chat not found, ...
+                logger.info(f"Broadcast to {user_id} failed: {e}")
+                return 'failed'
+            except Exception as e:
+                logger.error(f"Broadcast to {user_id} failed: {e}")
+                return 'failed'
+        return 'failed'
+
+
+def format_progress(broadcast: dict) -> str:
+    return (f"Broadcast #{broadcast['id']} ({broadcast['status']}): {broadcast['sent']} sent, "
+            f"{broadcast['failed']} failed, {broadcast['blocked']} blocked the bot.")
+
+
+broadcast_engine = PerBot(lambda bot: BroadcastEngine(config.BROADCAST_RATE_PER_SECOND, config.BROADCAST_CHUNK_SIZE))
+profiler.register_structure("broadcast.in_flight", lambda: len(broadcast_engine))
@@ -0,0 +1,136 @@
+# selling_bot/services/channel_publisher.py
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict
+
+from telegram import InputMediaPhoto, InputMediaVideo
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, RetryAfter
+
+from config import MAX_MEDIA_ITEMS, TARGET_SENDS_PER_MINUTE
+from services import profiler
+from services.bot_context import PerBot
+from services.rate_limiter import ChatBuckets
+
+logger = logging.getLogger(__name__)
+
+CAPTION_LIMIT = 1024
+TEXT_LIMIT = 4096
+
+
+async def send_ad(bot, chat_id, text: str, media_files: list) -> list:
+    """
+    Sends an ad to the target chat: an album with the text as the first caption, or a text message
+    if there is no media. Returns the sent messages (album items in order).
+    """
+    media = []
+    for i, item in enumerate(media_files[:MAX_MEDIA_ITEMS]):
+        caption = text if i == 0 else None
+        parse_mode = ParseMode.MARKDOWN if i == 0 else None
+        if item['type'] == 'photo':
+            media.append(InputMediaPhoto(media=item['file_id'], caption=caption, parse_mode=parse_mode))
+        elif item['type'] == 'video':
+            media.append(InputMediaVideo(media=item['file_id'], caption=caption, parse_mode=parse_mode))
+    if media:
+        sent = await bot.send_media_group(chat_id=chat_id, media=media, read_timeout=60, write_timeout=60)
+        if sent:
+            return list(sent)
+    # No media, or the album came back empty: send the text alone
+    return [await bot.send_message(chat_id=chat_id, text=text, parse_mode=ParseMode.MARKDOWN)]
+
+
+class ChannelEditQueue:
+    """
+    Edits of already published channel posts (expiry labels, ...). Edits are coalesced per message,
+    so a message edited several times before its turn is only edited once with the latest text.
+    Every chat is drained by its own task under that chat's budget (shared with the sends to it, see
+    ChatBuckets), so a flood wait in one channel never holds up edits in the others.
+    """
+
+    def __init__(self, buckets: ChatBuckets):
+        self._pending: Dict[object, "OrderedDict[int, tuple]"] = {} # chat_id -> message_id -> (text, has_media)
+        self._workers: Dict[object, asyncio.Task] = {}
+        self._buckets = buckets
+        self._bot = None
+
+    def __len__(self) -> int:
+        return sum(len(edits) for edits in self._pending.values())
+
+    def start(self, bot):
+        if self._bot is None:
+            self._bot = bot
+            for chat_id in list(self._pending): # Queued before the bot was up
+                self._start_worker(chat_id)
+            logger.info("Channel edit queue started.")
+
+    async def stop(self):
+        self._bot = None
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._workers.clear()
+        if len(self):
+            logger.warning(f"Channel edit queue stopped with {len(self)} pending edits.")
+
+    def enqueue_edit(self, chat_id, message_id: int, text: str, has_media: bool):
+        """Queues (or replaces the queued) new text/caption for a published message."""
+        edits = self._pending.setdefault(chat_id, OrderedDict())
+        edits.pop(message_id, None)
+        edits[message_id] = (text, has_media)
+        if self._bot is not None:
+            self._start_worker(chat_id)
+
+    def _start_worker(self, chat_id):
+        if chat_id not in self._workers:
+            self._workers[chat_id] = asyncio.create_task(self._run(chat_id), name=f"channel_edits_{chat_id}")
+
+    async def _run(self, chat_id):
+        """Drains one chat's edits, then exits; the next edit for the chat starts a new task."""
+        edits = self._pending[chat_id]
+        try:
+            while edits:
+                message_id, (text, has_media) = edits.popitem(last=False)
+                try:
+                    await self._edit(chat_id, message_id, text, has_media)
+                except RetryAfter as e:
+                    logger.warning(f"Flood limit in {chat_id}, pausing edits there for {e.retry_after}s.")
+                    self._buckets.get(chat_id).pause(float(e.retry_after))
+                    if message_id not in edits: # Retry unless a newer edit replaced it
+                        edits[message_id] = (text, has_media)
+                        edits.move_to_end(message_id, last=False)
+                except Exception as e:
+                    logger.error(f"Edit of message {message_id} in {chat_id} failed: {e}", exc_info=True)
+        finally:
+            self._workers.pop(chat_id, None)
+            if not edits:
+                self._pending.pop(chat_id, None)
+
+    async def _edit(self, chat_id, message_id: int, text: str, has_media: bool):
+        limit = CAPTION_LIMIT if has_media else TEXT_LIMIT
+        # Markdown only when the whole text fits, a cut could leave an unclosed entity
+        parse_mode = ParseMode.MARKDOWN if len(text) <= limit else None
+        for attempt_parse_mode in (parse_mode, None) if parse_mode else (None,):
+            await self._buckets.get(chat_id).acquire()
+            try:
+                if has_media:
+                    await self._bot.edit_message_caption(chat_id=chat_id, message_id=message_id,
+                                                         caption=text[:limit], parse_mode=attempt_parse_mode)
+                else:
+                    await self._bot.edit_message_text(text[:limit], chat_id=chat_id, message_id=message_id,
+                                                      parse_mode=attempt_parse_mode)
+                return
+            except BadRequest as e:
+                error = str(e).lower()
+                if "not modified" in error:
+                    return
+                if "parse" in error and attempt_parse_mode: # Broken Markdown: retry as plain text
+                    continue
+                raise
+
+
+# Per-chat budgets of each bot, shared by new posts (channel_router) and edits of published ones
+chat_buckets = PerBot(lambda bot: ChatBuckets(TARGET_SENDS_PER_MINUTE))
+channel_edit_queue = PerBot(lambda bot: ChannelEditQueue(chat_buckets.instance(bot)))
+profiler.register_structure("channel_edit_queue.pending", lambda: len(channel_edit_queue))
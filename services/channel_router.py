@@ -0,0 +1,124 @@
+# selling_bot/services/channel_router.py
+import asyncio
+import logging
+from typing import Dict, List, Set, Tuple
+
+from telegram.error import RetryAfter
+
+from services.storage import storage as db
+from services import profiler
+from services.bot_context import PerBot, normalize_chat_id
+from services.channel_publisher import send_ad, channel_edit_queue, chat_buckets
+from services.rate_limiter import AsyncTokenBucket, ChatBuckets
+
+logger = logging.getLogger(__name__)
+
+WILDCARD = "*"
+
+
+class ChannelRouter:
+    """
+    Sends each ad to TARGET_CHAT_ID (the main listing, which links, search and /bump point at) and to
+    the extra chats routed for its (category, language). Every chat has its own token bucket (shared with
+    the edit queue) and the extra sends run as independent tasks, so a slow or flood-limited channel only
+    holds up itself.
+    """
+
+    def __init__(self, main_chat, routes: dict, buckets: ChatBuckets):
+        self.main_chat = main_chat
+        self._routes: Dict[Tuple[str, str], List] = {}
+        for key, chat_ids in routes.items():
+            category, _, lang = key.partition(":")
+            self._routes[(category or WILDCARD, lang or WILDCARD)] = [
+                chat_id for chat_id in map(normalize_chat_id, chat_ids) if chat_id != main_chat
+            ]
+        self._buckets = buckets
+        self._tasks: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def extra_targets(self, category: str, lang: str) -> list:
+        """Chats besides the main one for an ad; the most specific route wins."""
+        for key in ((category, lang), (category, WILDCARD), (WILDCARD, lang), (WILDCARD, WILDCARD)):
+            if key in self._routes:
+                return list(self._routes[key])
+        return []
+
+    def _bucket(self, chat_id) -> AsyncTokenBucket:
+        return self._buckets.get(chat_id)
+
+    async def _paced(self, chat_id, send):
+        """Runs send() under the chat's own bucket; a flood wait pauses that chat only and is retried once."""
+        bucket = self._bucket(chat_id)
+        await bucket.acquire()
+        try:
+            return await send()
+        except RetryAfter as e:
+            logger.warning(f"Flood limit in {chat_id}, pausing sends there for {e.retry_after}s.")
+            bucket.pause(float(e.retry_after))
+            await bucket.acquire()
+            return await send()
+
+    async def send(self, bot, chat_id, text: str, media_files: list) -> list:
+        return await self._paced(chat_id, lambda: send_ad(bot, chat_id, text, media_files))
+
+    async def send_text(self, bot, chat_id, text: str):
+        """A plain-text message (no Markdown) under the same per-chat pacing as ads."""
+        return await self._paced(chat_id, lambda: bot.send_message(chat_id=chat_id, text=text,
+                                                                   disable_web_page_preview=True))
+
+    async def publish(self, bot, post_id: int, text: str, media_files: list, category: str, lang: str) -> list:
+        """
+        Sends the ad to the main chat and returns its messages; once that succeeded the routed chats
+        are sent to in the background. Raises if the main send fails (nothing is fanned out then).
+        """
+        extra = self.extra_targets(category, lang)
+        await db.reset_post_targets(post_id, [self.main_chat, *extra])
+        try:
+            messages = await self.send(bot, self.main_chat, text, media_files)
+        except Exception as e:
+            await db.update_post_target(post_id, self.main_chat, 'failed', error=str(e)[:200])
+            raise
+        await db.update_post_target(post_id, self.main_chat, 'published', [message.message_id for message in messages])
+        for chat_id in extra:
+            task = asyncio.create_task(self._send_to_target(bot, post_id, chat_id, text, media_files),
+                                       name=f"fan_out_{post_id}_{chat_id}")
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return messages
+
+    async def _send_to_target(self, bot, post_id: int, chat_id, text: str, media_files: list):
+        try:
+            messages = await self.send(bot, chat_id, text, media_files)
+        except Exception as e:
+            logger.error(f"Sending post {post_id} to {chat_id} failed: {e}")
+            await db.update_post_target(post_id, chat_id, 'failed', error=str(e)[:200])
+            return
+        await db.update_post_target(post_id, chat_id, 'published', [message.message_id for message in messages])
+
+    async def extra_messages(self, post_id: int) -> list:
+        """(chat_id, message_ids) of a post's published copies outside the main chat."""
+        return [(chat_id, target['message_ids'])
+                for target in await db.get_post_targets(post_id)
+                if target['status'] == 'published' and target['message_ids']
+                and (chat_id := normalize_chat_id(target['chat_id'])) != self.main_chat]
+
+    async def enqueue_edit_everywhere(self, post: dict, text: str):
+        """Queues the same new text for every published copy of a post (status labels, owner edits)."""
+        has_media = bool(post['media_files'])
+        if post['channel_message_id']:
+            channel_edit_queue.enqueue_edit(self.main_chat, post['channel_message_id'], text, has_media)
+        for chat_id, message_ids in await self.extra_messages(post['id']):
+            channel_edit_queue.enqueue_edit(chat_id, message_ids[0], text, has_media)
+
+    async def stop(self):
+        """Fan-out sends still waiting for their chat's budget are dropped (their rows stay 'pending')."""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+
+channel_router = PerBot(lambda bot: ChannelRouter(bot.target_chat_id, bot.channel_routes, chat_buckets.instance(bot)))
+profiler.register_structure("channel_router.fan_out_tasks", lambda: len(channel_router))
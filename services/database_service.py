@@ -1,64 +1,760 @@
 # selling_bot/services/database_service.py
 import aiosqlite
+import asyncio
 import json # Import json
 import logging
+import os
+import time
+import zlib
+from contextlib import asynccontextmanager
 from datetime import datetime
-from config import DATABASE_NAME, DEFAULT_LANGUAGE
-from constants import CAT_SPECIFIC_DATA_KEY # Import the key
+from config import (DATABASE_NAME, DEFAULT_LANGUAGE, AD_LIFETIME_DAYS, ARCHIVE_MAX_ATTACHED, SHARD_COUNT, SHARD_BUCKETS,
+                    READ_POOL_SIZE, READ_TIMEOUT, READ_WRITE_YIELD)
+from constants import CAT_SPECIFIC_DATA_KEY, PARSED_VALUES_KEY # Import the key
+from services import message_formatter, profiler
+from services.bot_context import PerBot, current_bot
+from services.value_parser import parse_all_columns
 
 logger = logging.getLogger(__name__)
 
-async def init_db():
-    """Initializes the database and creates/alters tables if they don't exist."""
-    async with aiosqlite.connect(DATABASE_NAME) as db:
-        # Check if 'category_specific_data' column exists in posts table
-        cursor = await db.execute("PRAGMA table_info(posts)")
-        columns = [row[1] for row in await cursor.fetchall()]
-        
-        if 'category_specific_data' not in columns:
+# Columns added after the first release. init_db adds whichever are missing on older databases.
+POSTS_EXTRA_COLUMNS = {
+    "search_text": "TEXT",   # Rendered ad text, indexed by posts_fts
+    "search_fields": "TEXT", # Category-specific values joined with spaces, indexed by posts_fts
+    # Typed values parsed from the free-text answers at input time (services/value_parser.py)
+    "price_amount": "REAL",
+    "price_currency": "TEXT",
+    "car_year": "INTEGER",
+    "car_mileage_km": "INTEGER",
+    "house_rooms": "INTEGER",
+    "house_area_m2": "REAL",
+    "house_year_built": "INTEGER",
+    # Lifetime of published ads (UTC, same text format as created_at)
+    "expires_at": "DATETIME",
+    "bumped_at": "DATETIME",
+    # JSON list of every message id of the published post (all album items); channel_message_id is the first
+    "channel_message_ids": "TEXT",
+    "fingerprint": "TEXT", # Content hash of the ad (services/fingerprint.py) for duplicate detection
+    "idempotency_token": "TEXT", # Draft token from the Post button; unique, so one draft saves at most once
+}
+USERS_EXTRA_COLUMNS = {
+    "blocked_at": "DATETIME", # Set when a broadcast found the user had blocked the bot; cleared when they come back
+}
+NUMERIC_COLUMNS = ("price_amount", "price_currency", "car_year", "car_mileage_km",
+                   "house_rooms", "house_area_m2", "house_year_built")
+
+def _connect_readonly(path: str = None):
+    """
+    One-off read-only connection for long reads (export, archive queries, seeding). With the database in
+    WAL mode it works on a snapshot and never blocks, or gets blocked by, the posting writes.
+    """
+    return aiosqlite.connect(f"file:{path or database_path()}?mode=ro", uri=True)
+
+# Reader pool: browse reads (search, inline queries, /myads, /dashboard) run on long-lived read-only
+# connections (mode=ro plus PRAGMA query_only, WAL snapshots) instead of opening a file per call. At most
+# READ_POOL_SIZE of them run at once over all shards, each gets READ_TIMEOUT seconds from asking for a
+# connection to its last row (then TimeoutError; a running query is interrupted), and a new read holds back
+# up to READ_WRITE_YIELD while read-write connections are open, so browsing bursts queue behind posting.
+class _ReaderPool:
+    def __init__(self, size: int):
+        self.size = size
+        self._idle = {} # path -> [(connection, deadline holder)]
+        self._open_writes = 0
+        self._loop = None # The semaphore and event belong to one event loop (tools may run several)
+        self._slots = None
+        self._no_writes = None
+
+    def __len__(self) -> int:
+        return sum(len(idle) for idle in self._idle.values())
+
+    def _bind(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop, self._slots, self._no_writes = loop, asyncio.Semaphore(self.size), asyncio.Event()
+            if not self._open_writes:
+                self._no_writes.set()
+
+    def write_started(self):
+        self._bind()
+        self._open_writes += 1
+        self._no_writes.clear()
+
+    def write_finished(self):
+        self._open_writes -= 1
+        if not self._open_writes:
+            self._no_writes.set()
+
+    async def _open(self, path: str) -> tuple:
+        connection = aiosqlite.connect(f"file:{path}?mode=ro", uri=True)
+        connection.daemon = True # An idle reader left open (a tool that never calls close_db) mustn't block exit
+        await connection
+        await connection.execute("PRAGMA query_only = ON")
+        deadline = [float("inf")]
+        # Runs on the connection's thread every 1000 VM steps; a true result aborts the statement
+        await connection.set_progress_handler(lambda: time.monotonic() > deadline[0], 1000)
+        return connection, deadline
+
+    @asynccontextmanager
+    async def connection(self, path: str):
+        self._bind()
+        deadline = time.monotonic() + READ_TIMEOUT
+        await asyncio.wait_for(self._slots.acquire(), READ_TIMEOUT)
+        try:
+            if self._open_writes:
+                try:
+                    await asyncio.wait_for(self._no_writes.wait(), READ_WRITE_YIELD)
+                except asyncio.TimeoutError:
+                    pass # Writes keep coming: read anyway rather than starve
+            idle = self._idle.setdefault(path, [])
+            connection, connection_deadline = idle.pop() if idle else await self._open(path)
+            connection_deadline[0] = deadline
             try:
-                await db.execute("ALTER TABLE posts ADD COLUMN category_specific_data TEXT")
-                logger.info("Column 'category_specific_data' added to 'posts' table.")
+                yield connection
             except aiosqlite.OperationalError as e:
-                # This might happen if the table needs to be recreated, or other schema issues.
-                # For a simple setup, we might log and continue, assuming it might be created next.
-                logger.warning(f"Could not add 'category_specific_data' column, might already exist or other issue: {e}")
+                connection_deadline[0] = float("inf")
+                idle.append((connection, connection_deadline))
+                if time.monotonic() > deadline: # Interrupted by the progress handler
+                    raise TimeoutError(f"Read on {path} took longer than {READ_TIMEOUT}s") from e
+                raise
+            except BaseException:
+                await connection.close() # Unknown state (e.g. cancelled mid-query): don't reuse it
+                raise
+            else:
+                connection_deadline[0] = float("inf")
+                idle.append((connection, connection_deadline))
+        finally:
+            self._slots.release()
+
+    async def close(self):
+        idle, self._idle = self._idle, {}
+        for connection, _ in (item for items in idle.values() for item in items):
+            await connection.close()
+
+reader_pool = _ReaderPool(READ_POOL_SIZE)
+profiler.register_structure("database_service.reader_pool", lambda: len(reader_pool))
+
+def _read(path: str = None):
+    """Pooled read-only connection for browse reads; see _ReaderPool."""
+    return reader_pool.connection(path or database_path())
+
+@asynccontextmanager
+async def _connect(path: str = None):
+    """Read-write connection; while any is open, new browse reads hold back (READ_WRITE_YIELD)."""
+    reader_pool.write_started()
+    try:
+        async with aiosqlite.connect(path or database_path()) as db:
+            yield db
+    finally:
+        reader_pool.write_finished()
+
+# Sharding (config.SHARD_COUNT): posts and users, with everything kept per post (search index, counters,
+# stats, targets, photo hashes), are split over SHARD_COUNT files by a hash bucket of user_id, so saves of
+# different users don't queue on one writer. Shard 0 is the bot's main file (database_path()) and also
+# holds every other table. New post ids are congruent to their user's bucket modulo SHARD_BUCKETS, so a post id alone finds
+# its file; posts saved before sharding are listed in post_buckets (services/sharding.py, loaded at init).
+# Each shard has its own id sequence, so new ids are also drawn above the highest id handed out in any shard
+# (_id_high_water, loaded at init; only this process saves posts): ids stay in creation order across shards,
+# which the merged, newest-first search and review pages rely on.
+_post_buckets = PerBot(lambda bot: {})
+_id_high_water = PerBot(lambda bot: {"posts": 0})
+
+def database_path() -> str:
+    """The current bot's main file (services/bot_context.py): DATABASE_NAME, or ads_bot_<data>.db for a bot with its own data."""
+    data = current_bot().data
+    if data is None:
+        return DATABASE_NAME
+    base, extension = os.path.splitext(DATABASE_NAME)
+    return f"{base}_{data}{extension}"
+
+def shard_path(index: int) -> str:
+    path = database_path()
+    if index == 0:
+        return path
+    base, extension = os.path.splitext(path)
+    return f"{base}_shard{index}{extension}"
+
+def shard_paths(count: int = None) -> list:
+    return [shard_path(index) for index in range(count or SHARD_COUNT)]
+
+def user_bucket(user_id: int) -> int:
+    return zlib.crc32(str(user_id).encode()) % SHARD_BUCKETS
+
+def _user_shard(user_id: int) -> str:
+    return shard_path(user_bucket(user_id) % SHARD_COUNT)
+
+def _post_shard(post_id: int) -> str:
+    return shard_path(_post_buckets.get(post_id, post_id % SHARD_BUCKETS) % SHARD_COUNT)
+
+def _posts_by_shard(post_ids: list) -> dict:
+    """shard path -> the given post ids stored there, in their original order."""
+    by_shard = {}
+    for post_id in post_ids:
+        by_shard.setdefault(_post_shard(post_id), []).append(post_id)
+    return by_shard
+
+async def _scatter(query) -> list:
+    """Runs query(shard_path) on every shard concurrently and returns the results in shard order."""
+    return await asyncio.gather(*(query(path) for path in shard_paths()))
+
+async def _ensure_columns(db, table: str, columns: dict) -> list:
+    """Adds missing columns and returns the names of the ones that were added."""
+    cursor = await db.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in await cursor.fetchall()}
+    added = []
+    for name, column_type in columns.items():
+        if name not in existing:
+            await db.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+            logger.info(f"Column '{name}' added to '{table}' table.")
+            added.append(name)
+    return added
+
+async def _init_numeric_columns(db, newly_added: list):
+    """Indexes for range filters/sorting on the typed columns, plus a one-off backfill of older rows."""
+    # Partial indexes: most rows only have some of these values
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_posts_price ON posts (category, price_currency, price_amount) WHERE price_amount IS NOT NULL")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_posts_car_year ON posts (car_year) WHERE car_year IS NOT NULL")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_posts_car_mileage ON posts (car_mileage_km) WHERE car_mileage_km IS NOT NULL")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_posts_house_rooms ON posts (house_rooms) WHERE house_rooms IS NOT NULL")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_posts_house_area ON posts (house_area_m2) WHERE house_area_m2 IS NOT NULL")
+    if "price_amount" not in newly_added:
+        return
+    # Rows saved before the columns existed: parse their stored text once, here, instead of at query time
+    updated = 0
+    async with db.execute("SELECT id, price, category_specific_data FROM posts") as cursor:
+        rows = await cursor.fetchall()
+    for post_id, price, specific_json in rows:
+        columns = parse_all_columns(price, json.loads(specific_json) if specific_json else {})
+        if columns:
+            assignments = ", ".join(f"{name} = ?" for name in columns)
+            await db.execute(f"UPDATE posts SET {assignments} WHERE id = ?", (*columns.values(), post_id))
+            updated += 1
+    logger.info(f"Backfilled typed price/size columns for {updated} existing posts.")
+
+async def _backfill_search_columns(db):
+    """
+    Posts saved before search_text/search_fields existed: fills both the way save_post does (the rendered ad
+    text and the category-specific values), so they are searchable and can be edited, bumped or marked sold.
+    """
+    async with db.execute("""
+        SELECT id, user_lang, category, price, location, description, media_files, category_specific_data
+        FROM posts WHERE search_text IS NULL
+    """) as cursor:
+        rows = await cursor.fetchall()
+    for post_id, user_lang, category, price, location, description, media_json, specific_json in rows:
+        specific_data = json.loads(specific_json) if specific_json else {}
+        search_text = message_formatter.format_published_post({
+            'user_lang': user_lang, 'category': category, 'category_specific_data': specific_data, 'price': price,
+            'location': location, 'description': description, 'media_files': json.loads(media_json) if media_json else [],
+        })
+        search_fields = " ".join(str(value) for value in specific_data.values() if value)
+        await db.execute("UPDATE posts SET search_text = ?, search_fields = ? WHERE id = ?",
+                         (search_text, search_fields, post_id))
+    if rows:
+        logger.info(f"Backfilled search text for {len(rows)} existing posts.")
+
+async def _init_search_index(db):
+    """
+    FTS5 index over published posts only. It is an external-content table (text lives in `posts`),
+    kept in sync by triggers on status/content changes, so no write path has to remember it.
+    """
+    await _backfill_search_columns(db) # Before the index is built; on an existing index the content trigger follows
+    cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'posts_fts'")
+    is_new = await cursor.fetchone() is None
+    await db.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+            search_text, search_fields, location, description,
+            content = 'posts', content_rowid = 'id',
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )
+    """)
+    fts_columns = "search_text, search_fields, location, description"
+    new_values = "new.search_text, new.search_fields, new.location, new.description"
+    old_values = "old.search_text, old.search_fields, old.location, old.description"
+    await db.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS posts_fts_publish AFTER UPDATE OF status ON posts
+        WHEN new.status = 'published' AND old.status IS NOT 'published' BEGIN
+            INSERT INTO posts_fts (rowid, {fts_columns}) VALUES (new.id, {new_values});
+        END
+    """)
+    await db.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts
+        WHEN new.status = 'published' BEGIN
+            INSERT INTO posts_fts (rowid, {fts_columns}) VALUES (new.id, {new_values});
+        END
+    """)
+    await db.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS posts_fts_unpublish AFTER UPDATE OF status ON posts
+        WHEN old.status = 'published' AND new.status IS NOT 'published' BEGIN
+            INSERT INTO posts_fts (posts_fts, rowid, {fts_columns}) VALUES ('delete', old.id, {old_values});
+        END
+    """)
+    await db.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS posts_fts_content AFTER UPDATE OF search_text, search_fields, location, description ON posts
+        WHEN old.status = 'published' AND new.status = 'published' BEGIN
+            INSERT INTO posts_fts (posts_fts, rowid, {fts_columns}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO posts_fts (rowid, {fts_columns}) VALUES (new.id, {new_values});
+        END
+    """)
+    await db.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts
+        WHEN old.status = 'published' BEGIN
+            INSERT INTO posts_fts (posts_fts, rowid, {fts_columns}) VALUES ('delete', old.id, {old_values});
+        END
+    """)
+    if is_new:
+        # Backfill posts published before the index existed
+        await db.execute(f"""
+            INSERT INTO posts_fts (rowid, {fts_columns})
+            SELECT id, {fts_columns} FROM posts WHERE status = 'published'
+        """)
+        logger.info("Search index created and backfilled.")
+
+async def init_db():
+    """
+    Initializes the database files and creates/alters tables if they don't exist: the global tables in
+    the main file, then the posts/users tables in every shard. Refuses to start if SHARD_COUNT doesn't
+    match how the data is split (changing it goes through `python -m services.sharding`).
+    """
+    async with _connect() as db:
+        await _init_global_tables(db)
+        stored_count = await _get_stored_shard_count(db)
+        await db.commit()
+        if stored_count != SHARD_COUNT:
+            raise RuntimeError(f"The data is split into {stored_count} shard(s) but SHARD_COUNT is {SHARD_COUNT}. "
+                               f"Run `python -m services.sharding --reshard {SHARD_COUNT}` first.")
+        _post_buckets.clear()
+        if SHARD_COUNT > 1:
+            async with db.execute("SELECT post_id, bucket FROM post_buckets") as cursor:
+                _post_buckets.update(await cursor.fetchall())
+    await init_shard_files(shard_paths())
+    if SHARD_COUNT > 1:
+        _id_high_water["posts"] = max(await _scatter(_get_post_sequence))
+    logger.info("Database initialized/checked successfully.")
+
+async def close_db():
+    """Closes the pooled read-only connections; everything else opens its own connection per call."""
+    await reader_pool.close()
 
+async def _get_post_sequence(path: str) -> int:
+    """The highest post id ever handed out in a shard (deleted or archived posts included)."""
+    async with _connect(path) as db:
+        async with db.execute("SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'posts'") as cursor:
+            return (await cursor.fetchone())[0]
+
+async def _get_stored_shard_count(db) -> int:
+    """How the data is split now; a database from before sharding (no row yet) is one shard."""
+    async with db.execute("SELECT shard_count FROM shard_config WHERE id = 1") as cursor:
+        row = await cursor.fetchone()
+    if row:
+        return row[0]
+    async with db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'posts'") as cursor:
+        has_data = await cursor.fetchone() is not None
+    count = 1 if has_data else SHARD_COUNT
+    await _set_stored_shard_count(db, count)
+    return count
+
+async def _set_stored_shard_count(db, count: int):
+    await db.execute("INSERT OR REPLACE INTO shard_config (id, shard_count) VALUES (1, ?)", (count,))
+
+async def init_shard_files(paths: list):
+    for path in paths:
+        async with _connect(path) as db:
+            await _init_shard_tables(db)
+            await db.commit()
+
+async def _init_shard_tables(db):
+    """posts, users and the tables kept per post; one set per shard file."""
+    await _init_file_settings(db)
+    # Check if 'category_specific_data' column exists in posts table
+    cursor = await db.execute("PRAGMA table_info(posts)")
+    columns = [row[1] for row in await cursor.fetchall()]
+    
+    if 'category_specific_data' not in columns:
+        try:
+            await db.execute("ALTER TABLE posts ADD COLUMN category_specific_data TEXT")
+            logger.info("Column 'category_specific_data' added to 'posts' table.")
+        except aiosqlite.OperationalError as e:
+            # This might happen if the table needs to be recreated, or other schema issues.
+            # For a simple setup, we might log and continue, assuming it might be created next.
+            logger.warning(f"Could not add 'category_specific_data' column, might already exist or other issue: {e}")
+
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS posts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            user_lang TEXT NOT NULL,
+            category TEXT NOT NULL,
+            title TEXT,  -- <--- This is the problem part if it's NOT NULL implicitly or explicitly by some DBs/modes
+            price TEXT,
+            location TEXT,
+            description TEXT,
+            media_files TEXT,
+            category_specific_data TEXT,
+            status TEXT DEFAULT 'pending',
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            channel_message_id INTEGER
+        )
+    """)
+    # Users table remains the same
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            lang_code TEXT,
+            first_name TEXT,
+            username TEXT,
+            last_seen DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    await _ensure_columns(db, "users", USERS_EXTRA_COLUMNS)
+    # Broadcast recipients are read in user_id order, skipping users who blocked the bot
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_users_reachable ON users (user_id) WHERE blocked_at IS NULL")
+    # Posts moved to a monthly archive file (services/archive.py) and which month holds them
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS archived_posts (
+            id INTEGER PRIMARY KEY,
+            month TEXT NOT NULL -- YYYY_MM
+        )
+    """)
+    added_columns = await _ensure_columns(db, "posts", POSTS_EXTRA_COLUMNS)
+    await _init_numeric_columns(db, added_columns)
+    await _init_search_index(db)
+    await _init_user_history(db)
+    await _init_post_stats(db)
+    await _init_expiry(db, added_columns)
+    # A draft's token may be saved once: a repeated Post (double tap, retried callback) fails the insert
+    await db.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_posts_idempotency ON posts (idempotency_token)
+        WHERE idempotency_token IS NOT NULL
+    """)
+    # Moderation: the review queue is paged straight off this index; approved posts awaiting publish are resumed from the other
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_posts_pending_review ON posts (id) WHERE status = 'pending_review'")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_posts_approved ON posts (id) WHERE status = 'approved'")
+    # Duplicate check before publishing is one probe of this index (live ads only)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_posts_fingerprint ON posts (fingerprint) WHERE status = 'published'")
+    if "channel_message_ids" in added_columns:
         await db.execute("""
-            CREATE TABLE IF NOT EXISTS posts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                user_lang TEXT NOT NULL,
-                category TEXT NOT NULL,
-                title TEXT,  -- <--- This is the problem part if it's NOT NULL implicitly or explicitly by some DBs/modes
-                price TEXT,
-                location TEXT,
-                description TEXT,
-                media_files TEXT,
-                category_specific_data TEXT,
-                status TEXT DEFAULT 'pending',
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                channel_message_id INTEGER
-            )
+            UPDATE posts SET channel_message_ids = json_array(channel_message_id)
+            WHERE channel_message_id IS NOT NULL
+        """) # Only the first album message was recorded before
+    # Perceptual hashes of published photos and the near-duplicate matches found for them
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS image_hashes (
+            post_id INTEGER NOT NULL,
+            file_unique_id TEXT NOT NULL,
+            phash INTEGER NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (post_id, file_unique_id)
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS image_matches (
+            post_id INTEGER NOT NULL,
+            matched_post_id INTEGER NOT NULL,
+            distance INTEGER NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (post_id, matched_post_id)
+        )
+    """)
+    # Every chat a post was sent to (main target and fan-out routes), with its own messages and status
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS post_targets (
+            post_id INTEGER NOT NULL,
+            chat_id TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending', -- pending, published, failed
+            message_ids TEXT, -- JSON list, album items in order
+            error TEXT,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (post_id, chat_id)
+        )
+    """)
+
+async def _init_file_settings(db):
+    # Only takes effect on a new file (before any table exists); older files are converted with
+    # `python -m services.archive --enable-incremental-vacuum`
+    await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    # WAL lets read-only browse connections run alongside writers (persistent, set once per file)
+    await db.execute("PRAGMA journal_mode=WAL")
+
+async def _init_global_tables(db):
+    """Tables that aren't sharded; they live in the main file only."""
+    await _init_file_settings(db)
+    # Announcements to all users; last_user_id is the checkpoint a resumed broadcast continues after
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            text TEXT NOT NULL,
+            created_by INTEGER,
+            status TEXT NOT NULL DEFAULT 'running', -- running, done, cancelled
+            last_user_id INTEGER NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            blocked INTEGER NOT NULL DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            finished_at DATETIME
+        )
+    """)
+    # Per-minute funnel rollups (one row per category/transition per flush), never raw events
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS funnel_rollups (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            bucket_start DATETIME NOT NULL,
+            category TEXT NOT NULL,
+            from_state TEXT NOT NULL,
+            to_state TEXT NOT NULL,
+            transitions INTEGER NOT NULL,
+            total_ms REAL NOT NULL,
+            max_ms REAL,
+            duration_sketch TEXT
+        )
+    """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_funnel_rollups_bucket ON funnel_rollups (bucket_start)")
+    # Saved searches; active ones are loaded into the in-memory matcher at startup
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS subscriptions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            lang TEXT,
+            query_text TEXT NOT NULL,
+            category TEXT,
+            tokens TEXT,
+            price_min REAL,
+            price_max REAL,
+            currency TEXT,
+            active INTEGER NOT NULL DEFAULT 1,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_subscriptions_user ON subscriptions (user_id, active)")
+    # Recent per-user events of the anti-spam limiters, so their windows survive a restart
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS rate_limits (
+            scope TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            event_times TEXT NOT NULL,
+            PRIMARY KEY (scope, user_id)
+        )
+    """)
+    # Published ads of digest categories waiting for their category's next digest post
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS digest_queue (
+            post_id INTEGER PRIMARY KEY,
+            category TEXT NOT NULL,
+            queued_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_digest_queue_category ON digest_queue (category, post_id)")
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS price_sketches (
+            category TEXT NOT NULL,
+            group_key TEXT NOT NULL, -- '*' (whole category), make/model or property type
+            currency TEXT NOT NULL, -- '' when the price had no recognizable currency
+            sketch TEXT NOT NULL, -- QuantileSketch.to_dict() JSON
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (category, group_key, currency)
+        )
+    """)
+    # How posts and users are split over files (services/sharding.py); post ids from before sharding
+    # don't carry their bucket, so it's recorded here
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS shard_config (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            shard_count INTEGER NOT NULL
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS post_buckets (
+            post_id INTEGER PRIMARY KEY,
+            bucket INTEGER NOT NULL
+        )
+    """)
+
+async def _init_expiry(db, newly_added: list):
+    """Partial index the expiry scheduler walks in deadline order; only live ads are in it."""
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_posts_expires ON posts (expires_at) WHERE status = 'published'")
+    if "expires_at" in newly_added:
+        # Ads published before expiry existed get the normal lifetime, but at least a day of notice
+        cursor = await db.execute(f"""
+            UPDATE posts SET expires_at = MAX(datetime(created_at, '+{AD_LIFETIME_DAYS} days'), datetime('now', '+1 day'))
+            WHERE status = 'published'
         """)
-        # Users table remains the same
+        logger.info(f"Expiry dates set for {cursor.rowcount} already published posts.")
+
+async def _init_user_history(db):
+    """Covering index for /myads and a per-user post counter maintained by triggers (no COUNT(*) per request)."""
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_posts_user_history
+        ON posts (user_id, created_at, id, status, category, price)
+    """)
+    cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_post_counts'")
+    is_new = await cursor.fetchone() is None
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS user_post_counts (
+            user_id INTEGER PRIMARY KEY,
+            post_count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_post_counts_insert AFTER INSERT ON posts BEGIN
+            INSERT INTO user_post_counts (user_id, post_count) VALUES (new.user_id, 1)
+            ON CONFLICT(user_id) DO UPDATE SET post_count = post_count + 1;
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_post_counts_delete AFTER DELETE ON posts BEGIN
+            UPDATE user_post_counts SET post_count = post_count - 1 WHERE user_id = old.user_id;
+        END
+    """)
+    if is_new:
         await db.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                lang_code TEXT,
-                first_name TEXT,
-                username TEXT,
-                last_seen DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
+            INSERT INTO user_post_counts (user_id, post_count)
+            SELECT user_id, COUNT(*) FROM posts GROUP BY user_id
         """)
-        await db.commit()
-    logger.info("Database initialized/checked successfully.")
+        logger.info("Per-user post counters created and backfilled.")
+
+POST_STATS_TABLES = ("post_stats_daily", "post_stats_totals")
+
+def _post_stats_delta(row: str, delta: int) -> str:
+    """Trigger statements adding delta to the summary rows of the `new` or `old` post."""
+    return f"""
+        INSERT INTO post_stats_daily (day, category, status, post_count)
+        VALUES (date({row}.created_at), {row}.category, {row}.status, {delta})
+        ON CONFLICT(day, category, status) DO UPDATE SET post_count = post_count + excluded.post_count;
+        INSERT INTO post_stats_totals (category, status, post_count)
+        VALUES ({row}.category, {row}.status, {delta})
+        ON CONFLICT(category, status) DO UPDATE SET post_count = post_count + excluded.post_count;
+    """
+
+POST_STATS_DAILY_SELECT = "SELECT date(created_at), category, status, COUNT(*) FROM posts GROUP BY 1, 2, 3"
+
+async def _fill_post_stats(db, archived_counts: list = ()):
+    """Recounts the summaries from posts, plus (day, category, status, count) rows counted in the archive files."""
+    for table in POST_STATS_TABLES:
+        await db.execute(f"DELETE FROM {table}")
+    await db.execute(f"INSERT INTO post_stats_daily (day, category, status, post_count) {POST_STATS_DAILY_SELECT}")
+    await db.executemany(
+        """
+        INSERT INTO post_stats_daily (day, category, status, post_count) VALUES (?, ?, ?, ?)
+        ON CONFLICT(day, category, status) DO UPDATE SET post_count = post_count + excluded.post_count
+        """,
+        archived_counts
+    )
+    await db.execute("""
+        INSERT INTO post_stats_totals (category, status, post_count)
+        SELECT category, status, SUM(post_count) FROM post_stats_daily GROUP BY 1, 2
+    """)
+
+async def _init_post_stats(db):
+    """
+    Summary tables for /dashboard: post counts per (created day, category, status) and per (category, status).
+    Kept current by triggers, so every write path (saving, publishing, moderation, expiry, sold) is counted
+    and the dashboard never scans posts.
+    """
+    cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'post_stats_totals'")
+    is_new = await cursor.fetchone() is None
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS post_stats_daily (
+            day TEXT NOT NULL, -- UTC date of created_at
+            category TEXT NOT NULL,
+            status TEXT NOT NULL,
+            post_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, category, status)
+        ) WITHOUT ROWID
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS post_stats_totals (
+            category TEXT NOT NULL,
+            status TEXT NOT NULL,
+            post_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (category, status)
+        ) WITHOUT ROWID
+    """)
+    await db.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS post_stats_insert AFTER INSERT ON posts BEGIN
+            {_post_stats_delta("new", 1)}
+        END
+    """)
+    await db.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS post_stats_update AFTER UPDATE OF status, category, created_at ON posts
+        WHEN old.status IS NOT new.status OR old.category IS NOT new.category OR old.created_at IS NOT new.created_at BEGIN
+            {_post_stats_delta("old", -1)}
+            {_post_stats_delta("new", 1)}
+        END
+    """)
+    # Archived posts still count: only real deletes come off the summaries
+    await db.execute("DROP TRIGGER IF EXISTS post_stats_delete")
+    await db.execute(f"""
+        CREATE TRIGGER post_stats_delete AFTER DELETE ON posts
+        WHEN NOT EXISTS (SELECT 1 FROM archived_posts WHERE id = old.id) BEGIN
+            {_post_stats_delta("old", -1)}
+        END
+    """)
+    if is_new:
+        await _fill_post_stats(db)
+        logger.info("Post stats tables created and backfilled.")
+
+async def rebuild_post_stats(archive_paths: list = ()) -> int:
+    """
+    Recomputes the summary tables from posts and the given archive files. The archives are counted first
+    (into shard 0's summaries), then each shard's hot table in one transaction (writers wait for it).
+    Returns the number of posts.
+    """
+    archived_counts = []
+    for path in archive_paths:
+        async with aiosqlite.connect(f"file:{path}?mode=ro", uri=True) as archive:
+            async with archive.execute(POST_STATS_DAILY_SELECT) as cursor:
+                archived_counts.extend(await cursor.fetchall())
+    total = 0
+    for path in shard_paths():
+        async with _connect(path) as db:
+            await _fill_post_stats(db, archived_counts if path == database_path() else ())
+            await db.commit()
+            async with db.execute("SELECT COALESCE(SUM(post_count), 0) FROM post_stats_totals") as cursor:
+                total += (await cursor.fetchone())[0]
+    logger.info(f"Post stats rebuilt from {total} posts.")
+    return total
 
-async def save_post(user_data: dict) -> int:
-    """Saves the post data to the database, including category-specific data."""
-    async with aiosqlite.connect(DATABASE_NAME) as db:
+async def get_post_stats(since_day: str) -> tuple:
+    """
+    Reads only the summary tables: ([(category, status, count)] all time, [(day, category, status, count)]
+    for days >= since_day, newest first).
+    """
+    async def query(path):
+        async with _read(path) as db:
+            async with db.execute("SELECT category, status, post_count FROM post_stats_totals WHERE post_count > 0") as cursor:
+                totals = await cursor.fetchall()
+            async with db.execute(
+                "SELECT day, category, status, post_count FROM post_stats_daily WHERE day >= ? AND post_count > 0",
+                (since_day,)
+            ) as cursor:
+                return totals, await cursor.fetchall()
+
+    totals, daily = {}, {}
+    for shard_totals, shard_daily in await _scatter(query): # Shards hold the same keys for different users: add up
+        for *key, count in shard_totals:
+            totals[tuple(key)] = totals.get(tuple(key), 0) + count
+        for *key, count in shard_daily:
+            daily[tuple(key)] = daily.get(tuple(key), 0) + count
+    return ([(*key, count) for key, count in totals.items()],
+            sorted(((*key, count) for key, count in daily.items()), key=lambda row: row[0], reverse=True))
+
+async def save_post(user_data: dict, rendered_text: str = None, fingerprint: str = None,
+                    idempotency_token: str = None) -> int | None:
+    """
+    Saves the post data to the database, including category-specific data and its search text.
+    Returns None if a post with the same idempotency token was already saved.
+    """
+    # Sharded: the next id above both the shard's sequence and the highest id of all shards that is congruent
+    # to the user's bucket, picked inside the INSERT (under the write lock). One shard: plain AUTOINCREMENT.
+    new_id = (f"(SELECT seq + 1 + ((? - seq - 1) % {SHARD_BUCKETS} + {SHARD_BUCKETS}) % {SHARD_BUCKETS} "
+              "FROM (SELECT MAX(COALESCE(MAX(seq), 0), ?) AS seq FROM sqlite_sequence WHERE name = 'posts'))")
+    id_value, id_params = ((new_id, (user_bucket(user_data['user_id']), _id_high_water["posts"])) if SHARD_COUNT > 1
+                           else ("NULL", ()))
+    async with _connect(_user_shard(user_data['user_id'])) as db:
         # Serialize category_specific_data to JSON string
-        category_specific_json = json.dumps(user_data.get(CAT_SPECIFIC_DATA_KEY, {}))
+        category_specific_data = user_data.get(CAT_SPECIFIC_DATA_KEY, {})
+        category_specific_json = json.dumps(category_specific_data)
+        search_fields = " ".join(str(value) for value in category_specific_data.values() if value)
+        parsed_values = user_data.get(PARSED_VALUES_KEY, {})
         
         # Determine 'title'. If a specific primary field exists (e.g., car_make_model),
         # that might be used as a de facto title, or keep a generic one.
@@ -66,51 +762,241 @@ async def save_post(user_data: dict) -> int:
         # and the preview formatter handles displaying the primary identifier.
         # Let's ensure 'title', 'price', 'location', 'description' are fetched with .get() for safety.
 
-        cursor = await db.execute(
-            """
-            INSERT INTO posts (user_id, user_lang, category, 
-                               price, location, description, media_files, 
-                               category_specific_data, status, title) 
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                user_data['user_id'],
-                user_data.get('lang', DEFAULT_LANGUAGE), # Ensure lang is present
-                user_data['category'],
-                user_data.get('price'), # Common field
-                user_data.get('location'), # Common field
-                user_data.get('description'), # Common field
-                json.dumps(user_data.get('media_files', [])),
-                category_specific_json, # New field
-                'pending',
-                user_data.get('title') # Generic title, might be null or derived from specific data
+        try:
+            cursor = await db.execute(
+                f"""
+                INSERT INTO posts (id, user_id, user_lang, category, 
+                                   price, location, description, media_files, 
+                                   category_specific_data, status, title,
+                                   search_text, search_fields, 
+                                   price_amount, price_currency, car_year, car_mileage_km,
+                                   house_rooms, house_area_m2, house_year_built, fingerprint,
+                                   idempotency_token) 
+                VALUES ({id_value}, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    *id_params,
+                    user_data['user_id'],
+                    user_data.get('lang', DEFAULT_LANGUAGE), # Ensure lang is present
+                    user_data['category'],
+                    user_data.get('price'), # Common field
+                    user_data.get('location'), # Common field
+                    user_data.get('description'), # Common field
+                    json.dumps(user_data.get('media_files', [])),
+                    category_specific_json, # New field
+                    'pending',
+                    user_data.get('title'), # Generic title, might be null or derived from specific data
+                    rendered_text,
+                    search_fields,
+                    *(parsed_values.get(column) for column in NUMERIC_COLUMNS),
+                    fingerprint,
+                    idempotency_token
+                )
             )
-        )
+        except aiosqlite.IntegrityError: # idx_posts_idempotency: this draft was already saved
+            logger.warning(f"Post with idempotency token {idempotency_token} already saved, not saving again.")
+            return None
         await db.commit()
         post_id = cursor.lastrowid
+        _id_high_water["posts"] = max(_id_high_water["posts"], post_id)
         logger.info(f"Post {post_id} saved for user {user_data['user_id']}. Specific data: {category_specific_json}")
         return post_id
 
-async def update_post_status(post_id: int, status: str, channel_message_id: int = None):
-    """Updates the status of a post and optionally its channel_message_id."""
-    async with aiosqlite.connect(DATABASE_NAME) as db:
+async def update_post_status(post_id: int, status: str, channel_message_id: int = None, channel_message_ids: list = None):
+    """Updates the status of a post and optionally its channel_message_id (and all album message ids)."""
+    async with _connect(_post_shard(post_id)) as db:
         if channel_message_id:
-            await db.execute("UPDATE posts SET status = ?, channel_message_id = ? WHERE id = ?", (status, channel_message_id, post_id))
+            await db.execute(
+                "UPDATE posts SET status = ?, channel_message_id = ?, channel_message_ids = ? WHERE id = ?",
+                (status, channel_message_id, json.dumps(channel_message_ids or [channel_message_id]), post_id)
+            )
         else:
             await db.execute("UPDATE posts SET status = ? WHERE id = ?", (status, post_id))
         await db.commit()
         logger.info(f"Post {post_id} status updated to {status}.")
 
+async def get_post(post_id: int) -> dict | None:
+    """The fields needed to act on an already published post (bump, expiry, edits)."""
+    async with _connect(_post_shard(post_id)) as db:
+        db.row_factory = aiosqlite.Row
+        async with db.execute(
+            """
+            SELECT id, user_id, user_lang, category, status, search_text, media_files,
+                   channel_message_id, channel_message_ids, created_at, expires_at, bumped_at,
+                   price, location, description, category_specific_data,
+                   price_amount, price_currency, search_fields
+            FROM posts WHERE id = ?
+            """,
+            (post_id,)
+        ) as cursor:
+            row = await cursor.fetchone()
+    if row is None:
+        return None
+    post = dict(row)
+    post['media_files'] = json.loads(post['media_files']) if post['media_files'] else []
+    post['category_specific_data'] = json.loads(post['category_specific_data']) if post['category_specific_data'] else {}
+    if post['channel_message_ids']:
+        post['channel_message_ids'] = json.loads(post['channel_message_ids'])
+    else:
+        post['channel_message_ids'] = [post['channel_message_id']] if post['channel_message_id'] else []
+    return post
+
+async def set_post_expiry(post_id: int, expires_at: str, channel_message_ids: list = None, bumped_at: str = None):
+    """Starts (publish) or restarts (bump) a post's lifetime. A bump also replaces the channel messages."""
+    async with _connect(_post_shard(post_id)) as db:
+        if bumped_at:
+            await db.execute(
+                """
+                UPDATE posts SET status = 'published', channel_message_id = ?, channel_message_ids = ?,
+                                 bumped_at = ?, expires_at = ?
+                WHERE id = ?
+                """,
+                (channel_message_ids[0] if channel_message_ids else None, json.dumps(channel_message_ids or []),
+                 bumped_at, expires_at, post_id)
+            )
+        else:
+            await db.execute("UPDATE posts SET expires_at = ? WHERE id = ?", (expires_at, post_id))
+        await db.commit()
+
+async def get_expiring_posts(until: str, after: tuple, limit: int) -> list:
+    """
+    (id, expires_at) of published posts expiring up to `until`, in deadline order, continuing after
+    the (expires_at, id) keyset `after`. Served by idx_posts_expires.
+    """
+    async def query(path):
+        async with _connect(path) as db:
+            async with db.execute(
+                """
+                SELECT id, expires_at FROM posts
+                WHERE status = 'published' AND expires_at <= ? AND (expires_at, id) > (?, ?)
+                ORDER BY expires_at, id LIMIT ?
+                """,
+                (until, after[0], after[1], limit)
+            ) as cursor:
+                return await cursor.fetchall()
+
+    rows = [row for shard_rows in await _scatter(query) for row in shard_rows]
+    return sorted(rows, key=lambda row: (row[1], row[0]))[:limit]
+
+async def expire_posts(due: list) -> list:
+    """
+    Marks posts expired. `due` holds (id, expires_at) pairs; a post bumped since it was scheduled no
+    longer has that expires_at and is left alone. Returns the ids that were actually expired.
+    """
+    expired = []
+    deadlines = dict(due)
+    for path, post_ids in _posts_by_shard(list(deadlines)).items():
+        async with _connect(path) as db:
+            for post_id in post_ids:
+                cursor = await db.execute(
+                    "UPDATE posts SET status = 'expired' WHERE id = ? AND status = 'published' AND expires_at = ?",
+                    (post_id, deadlines[post_id])
+                )
+                if cursor.rowcount:
+                    expired.append(post_id)
+            await db.commit() # One transaction per batch and shard
+    if expired:
+        logger.info(f"{len(expired)} posts expired.")
+    return expired
+
+async def find_duplicate_post(fingerprint: str, user_id: int) -> int | None:
+    """Id of the user's live (published) ad with the same content fingerprint, if any."""
+    async with _connect(_user_shard(user_id)) as db:
+        async with db.execute(
+            "SELECT id FROM posts WHERE fingerprint = ? AND status = 'published' AND user_id = ? ORDER BY id DESC LIMIT 1",
+            (fingerprint, user_id)
+        ) as cursor:
+            row = await cursor.fetchone()
+            return row[0] if row else None
+
+async def update_published_post(post_id: int, user_id: int, fields: dict, rendered_text: str) -> bool:
+    """
+    Applies an owner's edit (common columns and their parsed values) plus the re-rendered text to
+    a published post. The search index follows through the posts_fts_content trigger.
+    """
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    async with _connect(_post_shard(post_id)) as db:
+        cursor = await db.execute(
+            f"UPDATE posts SET {assignments}, search_text = ? WHERE id = ? AND user_id = ? AND status = 'published'",
+            (*fields.values(), rendered_text, post_id, user_id)
+        )
+        await db.commit()
+        return cursor.rowcount > 0
+
+async def mark_posts_sold(post_ids: list, user_id: int) -> list:
+    """Marks the user's published/expired posts as sold in one transaction. Returns the ids that changed."""
+    sold = []
+    async with _connect(_user_shard(user_id)) as db: # A user's posts all live in their shard
+        for post_id in post_ids:
+            cursor = await db.execute(
+                "UPDATE posts SET status = 'sold' WHERE id = ? AND user_id = ? AND status IN ('published', 'expired')",
+                (post_id, user_id)
+            )
+            if cursor.rowcount:
+                sold.append(post_id)
+        await db.commit()
+    if sold:
+        logger.info(f"User {user_id} marked posts {sold} as sold.")
+    return sold
+
+async def get_review_page(after_id: int, limit: int) -> list:
+    """
+    (id, user_id, user_lang, category, search_text) of posts awaiting review, oldest first, after the keyset
+    after_id. Served by idx_posts_pending_review, so a page costs the same however long the queue is.
+    """
+    async def query(path):
+        async with _connect(path) as db:
+            async with db.execute(
+                """
+                SELECT id, user_id, user_lang, category, search_text FROM posts
+                WHERE status = 'pending_review' AND id > ? ORDER BY id LIMIT ?
+                """,
+                (after_id, limit)
+            ) as cursor:
+                return await cursor.fetchall()
+
+    return sorted(row for shard_rows in await _scatter(query) for row in shard_rows)[:limit]
+
+async def count_pending_review() -> int:
+    async def query(path):
+        async with _connect(path) as db:
+            async with db.execute("SELECT COUNT(*) FROM posts WHERE status = 'pending_review'") as cursor:
+                return (await cursor.fetchone())[0]
+
+    return sum(await _scatter(query))
+
+async def set_review_status(post_ids: list, from_status: str, to_status: str) -> list:
+    """Moves posts between moderation states, one primary-key update each, in one transaction. Returns the ids that changed."""
+    changed = []
+    for path, shard_post_ids in _posts_by_shard(post_ids).items():
+        async with _connect(path) as db:
+            for post_id in shard_post_ids:
+                cursor = await db.execute("UPDATE posts SET status = ? WHERE id = ? AND status = ?",
+                                          (to_status, post_id, from_status))
+                if cursor.rowcount:
+                    changed.append(post_id)
+            await db.commit()
+    return sorted(changed, key=post_ids.index)
+
+async def get_approved_post_ids() -> list:
+    """Approved posts not yet published (e.g. the bot stopped mid-batch)."""
+    async def query(path):
+        async with _connect(path) as db:
+            async with db.execute("SELECT id FROM posts WHERE status = 'approved'") as cursor:
+                return [row[0] for row in await cursor.fetchall()]
+
+    return sorted(post_id for shard_ids in await _scatter(query) for post_id in shard_ids)
+
 async def get_user_pref_lang(user_id: int) -> str | None:
     """Retrieves the user's preferred language from the users table."""
-    async with aiosqlite.connect(DATABASE_NAME) as db:
+    async with _connect(_user_shard(user_id)) as db:
         async with db.execute("SELECT lang_code FROM users WHERE user_id = ?", (user_id,)) as cursor:
             row = await cursor.fetchone()
             return row[0] if row else None
 
 async def set_user_pref_lang(user_id: int, lang_code: str, first_name: str, username: str | None):
     """Sets or updates the user's preferred language and info in the users table."""
-    async with aiosqlite.connect(DATABASE_NAME) as db:
+    async with _connect(_user_shard(user_id)) as db:
         await db.execute(
             """
             INSERT INTO users (user_id, lang_code, first_name, username, last_seen)
@@ -119,9 +1005,612 @@ async def set_user_pref_lang(user_id: int, lang_code: str, first_name: str, user
             lang_code = excluded.lang_code,
             first_name = excluded.first_name,
             username = excluded.username,
-            last_seen = excluded.last_seen
+            last_seen = excluded.last_seen,
+            blocked_at = NULL
             """,
             (user_id, lang_code, first_name, username, datetime.now())
         )
         await db.commit()
-        logger.info(f"User {user_id} language preference set to {lang_code}.")
\ No newline at end of file
+        logger.info(f"User {user_id} language preference set to {lang_code}.")
+
+async def save_funnel_rollups(rows: list):
+    """Inserts funnel rollup rows: (bucket_start, category, from_state, to_state, transitions, total_ms, max_ms, sketch_dict)."""
+    async with _connect() as db:
+        await db.executemany(
+            """
+            INSERT INTO funnel_rollups (bucket_start, category, from_state, to_state,
+                                        transitions, total_ms, max_ms, duration_sketch)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [(*row[:7], json.dumps(row[7])) for row in rows]
+        )
+        await db.commit()
+        logger.info(f"Flushed {len(rows)} funnel rollup rows.")
+
+async def get_funnel_rollups(since: str) -> list:
+    """Returns (category, from_state, to_state, sketch_dict) for every rollup row since `since`."""
+    async with _connect() as db:
+        async with db.execute(
+            "SELECT category, from_state, to_state, duration_sketch FROM funnel_rollups WHERE bucket_start >= ?",
+            (since,)
+        ) as cursor:
+            return [(row[0], row[1], row[2], json.loads(row[3] or "{}")) async for row in cursor]
+
+
+async def search_posts(fts_query: str, limit: int, before_id: int = None, after_id: int = None) -> list:
+    """
+    Full-text search over published posts, newest first, with keyset pagination on the post id.
+    `before_id` pages forward (older posts), `after_id` pages back (newer posts).
+    Returns up to `limit` rows of (id, category, search_fields, price, location, channel_message_id).
+    """
+    if after_id is not None:
+        keyset, params, order = "AND f.rowid > ?", (fts_query, after_id, limit), "ASC"
+    elif before_id is not None:
+        keyset, params, order = "AND f.rowid < ?", (fts_query, before_id, limit), "DESC"
+    else:
+        keyset, params, order = "", (fts_query, limit), "DESC"
+    async def query(path):
+        async with _read(path) as db:
+            async with db.execute(
+                f"""
+                SELECT p.id, p.category, p.search_fields, p.price, p.location, p.channel_message_id
+                FROM posts_fts f JOIN posts p ON p.id = f.rowid
+                WHERE posts_fts MATCH ? {keyset}
+                ORDER BY f.rowid {order}
+                LIMIT ?
+                """,
+                params
+            ) as cursor:
+                return await cursor.fetchall()
+
+    # Each shard returns its best `limit` rows in the page's direction; the merged page is the best of those
+    rows = sorted((row for shard_rows in await _scatter(query) for row in shard_rows),
+                  key=lambda row: row[0], reverse=order == "DESC")[:limit]
+    return rows if order == "DESC" else rows[::-1] # Always newest first for display
+
+
+async def get_user_posts(user_id: int, limit: int, before_id: int = None, after_id: int = None) -> list:
+    """
+    A user's posts newest first, keyset-paginated on (created_at, id) and served from idx_posts_user_history.
+    Returns rows of (id, category, status, created_at, price).
+    """
+    if after_id is not None:
+        keyset, order = "AND (created_at, id) > (SELECT created_at, id FROM posts WHERE id = ?)", "ASC"
+    elif before_id is not None:
+        keyset, order = "AND (created_at, id) < (SELECT created_at, id FROM posts WHERE id = ?)", "DESC"
+    else:
+        keyset, order = "", "DESC"
+    cursor_params = (after_id if after_id is not None else before_id,) if keyset else ()
+    async with _read(_user_shard(user_id)) as db:
+        async with db.execute(
+            f"""
+            SELECT id, category, status, created_at, price FROM posts
+            WHERE user_id = ? {keyset}
+            ORDER BY created_at {order}, id {order}
+            LIMIT ?
+            """,
+            (user_id, *cursor_params, limit)
+        ) as cursor:
+            rows = await cursor.fetchall()
+    return rows if order == "DESC" else rows[::-1]
+
+async def get_user_post_count(user_id: int) -> int:
+    """Total posts of a user, from the trigger-maintained counter."""
+    async with _read(_user_shard(user_id)) as db:
+        async with db.execute("SELECT post_count FROM user_post_counts WHERE user_id = ?", (user_id,)) as cursor:
+            row = await cursor.fetchone()
+            return row[0] if row else 0
+
+
+async def search_posts_with_media(fts_query: str, limit: int, before_id: int = None) -> list:
+    """
+    Inline-mode search on the read-only path, newest first.
+    Returns rows of (id, category, search_fields, price, location, search_text, media_files_list).
+    """
+    keyset, params = ("AND f.rowid < ?", (fts_query, before_id, limit)) if before_id else ("", (fts_query, limit))
+    async def query(path):
+        async with _read(path) as db:
+            async with db.execute(
+                f"""
+                SELECT p.id, p.category, p.search_fields, p.price, p.location, p.search_text, p.media_files
+                FROM posts_fts f JOIN posts p ON p.id = f.rowid
+                WHERE posts_fts MATCH ? {keyset}
+                ORDER BY f.rowid DESC
+                LIMIT ?
+                """,
+                params
+            ) as cursor:
+                return await cursor.fetchall()
+
+    rows = sorted((row for shard_rows in await _scatter(query) for row in shard_rows), key=lambda row: row[0], reverse=True)
+    return [(*row[:6], json.loads(row[6]) if row[6] else []) for row in rows[:limit]]
+
+
+def _subscription_from_row(row) -> dict:
+    return {
+        "id": row[0], "user_id": row[1], "lang": row[2], "query_text": row[3], "category": row[4],
+        "tokens": row[5].split() if row[5] else [], "price_min": row[6], "price_max": row[7], "currency": row[8],
+    }
+
+_SUBSCRIPTION_COLUMNS = "id, user_id, lang, query_text, category, tokens, price_min, price_max, currency"
+
+async def add_subscription(sub: dict) -> int:
+    async with _connect() as db:
+        cursor = await db.execute(
+            """
+            INSERT INTO subscriptions (user_id, lang, query_text, category, tokens, price_min, price_max, currency)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (sub["user_id"], sub["lang"], sub["query_text"], sub["category"], " ".join(sub["tokens"]),
+             sub["price_min"], sub["price_max"], sub["currency"])
+        )
+        await db.commit()
+        logger.info(f"Subscription {cursor.lastrowid} saved for user {sub['user_id']}: {sub['query_text']}")
+        return cursor.lastrowid
+
+async def iter_active_subscriptions():
+    """Streams all active subscriptions (used once at startup to build the matcher)."""
+    async with _connect() as db:
+        async with db.execute(f"SELECT {_SUBSCRIPTION_COLUMNS} FROM subscriptions WHERE active = 1") as cursor:
+            async for row in cursor:
+                yield _subscription_from_row(row)
+
+async def get_user_subscriptions(user_id: int) -> list:
+    async with _connect() as db:
+        async with db.execute(
+            f"SELECT {_SUBSCRIPTION_COLUMNS} FROM subscriptions WHERE user_id = ? AND active = 1 ORDER BY id",
+            (user_id,)
+        ) as cursor:
+            return [_subscription_from_row(row) async for row in cursor]
+
+async def deactivate_subscription(sub_id: int, user_id: int) -> bool:
+    """Deactivates one of the user's subscriptions. False if it wasn't theirs or already inactive."""
+    async with _connect() as db:
+        cursor = await db.execute(
+            "UPDATE subscriptions SET active = 0 WHERE id = ? AND user_id = ? AND active = 1", (sub_id, user_id)
+        )
+        await db.commit()
+        return cursor.rowcount > 0
+
+async def deactivate_user_subscriptions(user_id: int) -> list:
+    """Deactivates all of a user's subscriptions and returns their ids."""
+    async with _connect() as db:
+        async with db.execute("SELECT id FROM subscriptions WHERE user_id = ? AND active = 1", (user_id,)) as cursor:
+            ids = [row[0] async for row in cursor]
+        await db.execute("UPDATE subscriptions SET active = 0 WHERE user_id = ? AND active = 1", (user_id,))
+        await db.commit()
+        return ids
+
+async def save_image_hash(post_id: int, file_unique_id: str, phash: int, matches: list):
+    """Stores a photo's hash and its near-duplicate matches as (matched_post_id, distance)."""
+    async with _connect(_post_shard(post_id)) as db:
+        await db.execute(
+            "INSERT OR REPLACE INTO image_hashes (post_id, file_unique_id, phash) VALUES (?, ?, ?)",
+            (post_id, file_unique_id, phash)
+        )
+        if matches:
+            await db.executemany(
+                """
+                INSERT INTO image_matches (post_id, matched_post_id, distance) VALUES (?, ?, ?)
+                ON CONFLICT(post_id, matched_post_id) DO UPDATE SET distance = MIN(distance, excluded.distance)
+                """,
+                [(post_id, matched_post_id, distance) for matched_post_id, distance in matches]
+            )
+        await db.commit()
+
+async def iter_image_hashes():
+    """Streams (post_id, user_id, phash) of every stored photo hash (used once at startup to build the index)."""
+    for path in shard_paths():
+        async with _connect(path) as db:
+            async with db.execute(
+                "SELECT h.post_id, p.user_id, h.phash FROM image_hashes h JOIN posts p ON p.id = h.post_id"
+            ) as cursor:
+                async for row in cursor:
+                    yield row
+
+async def save_rate_limit_state(rows: list):
+    """Upserts (scope, user_id, event_times_json) rows; users with no recent events are removed."""
+    async with _connect() as db:
+        await db.executemany(
+            "INSERT OR REPLACE INTO rate_limits (scope, user_id, event_times) VALUES (?, ?, ?)",
+            [row for row in rows if row[2] != "[]"]
+        )
+        await db.executemany(
+            "DELETE FROM rate_limits WHERE scope = ? AND user_id = ?",
+            [row[:2] for row in rows if row[2] == "[]"]
+        )
+        await db.commit()
+
+async def iter_rate_limit_state():
+    """Streams (scope, user_id, event_times_json) saved by the anti-spam limiters."""
+    async with _connect() as db:
+        async with db.execute("SELECT scope, user_id, event_times FROM rate_limits") as cursor:
+            async for row in cursor:
+                yield row
+
+async def save_price_sketches(rows: list):
+    """Upserts (category, group_key, currency, sketch_dict) rows."""
+    async with _connect() as db:
+        await db.executemany(
+            """
+            INSERT INTO price_sketches (category, group_key, currency, sketch) VALUES (?, ?, ?, ?)
+            ON CONFLICT(category, group_key, currency) DO UPDATE SET sketch = excluded.sketch, updated_at = CURRENT_TIMESTAMP
+            """,
+            [(*row[:3], json.dumps(row[3])) for row in rows]
+        )
+        await db.commit()
+
+async def iter_price_sketches():
+    """Streams (category, group_key, currency, sketch_dict) saved by the price hints."""
+    async with _connect() as db:
+        async with db.execute("SELECT category, group_key, currency, sketch FROM price_sketches") as cursor:
+            async for row in cursor:
+                yield row[0], row[1], row[2], json.loads(row[3])
+
+async def iter_listed_prices():
+    """
+    Streams (category, category_specific_data, price_amount, price_currency) of every post that reached
+    the channel (used once, to seed the price sketches when none are saved yet).
+    """
+    for path in shard_paths():
+        async with _connect_readonly(path) as db:
+            async with db.execute(
+                """
+                SELECT category, category_specific_data, price_amount, price_currency FROM posts
+                WHERE price_amount IS NOT NULL AND status IN ('published', 'expired', 'sold')
+                """
+            ) as cursor:
+                async for row in cursor:
+                    yield row[0], json.loads(row[1]) if row[1] else {}, row[2], row[3]
+
+async def reset_post_targets(post_id: int, chat_ids: list):
+    """Replaces a post's targets with fresh 'pending' rows (publish, bump)."""
+    async with _connect(_post_shard(post_id)) as db:
+        await db.execute("DELETE FROM post_targets WHERE post_id = ?", (post_id,))
+        await db.executemany(
+            "INSERT OR IGNORE INTO post_targets (post_id, chat_id) VALUES (?, ?)",
+            [(post_id, str(chat_id)) for chat_id in chat_ids]
+        )
+        await db.commit()
+
+async def update_post_target(post_id: int, chat_id, status: str, message_ids: list = None, error: str = None):
+    async with _connect(_post_shard(post_id)) as db:
+        await db.execute(
+            """
+            UPDATE post_targets SET status = ?, message_ids = ?, error = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE post_id = ? AND chat_id = ?
+            """,
+            (status, json.dumps(message_ids) if message_ids else None, error, post_id, str(chat_id))
+        )
+        await db.commit()
+
+async def get_post_targets(post_id: int) -> list:
+    """[{'chat_id', 'status', 'message_ids', 'error'}] of a post; chat_id as stored (text)."""
+    async with _connect(_post_shard(post_id)) as db:
+        async with db.execute(
+            "SELECT chat_id, status, message_ids, error FROM post_targets WHERE post_id = ?", (post_id,)
+        ) as cursor:
+            rows = await cursor.fetchall()
+    return [{"chat_id": chat_id, "status": status, "message_ids": json.loads(message_ids) if message_ids else [],
+             "error": error} for chat_id, status, message_ids, error in rows]
+
+async def enqueue_digest(post_id: int, category: str):
+    async with _connect() as db:
+        await db.execute("INSERT OR IGNORE INTO digest_queue (post_id, category) VALUES (?, ?)", (post_id, category))
+        await db.commit()
+
+async def get_digest_batch(category: str, limit: int) -> list:
+    """
+    The oldest queued ads of a category as (post_id, status, search_fields, price, location); status is
+    None if the post no longer exists. Ads sold or expired while queued come back too, so they can be dropped.
+    """
+    async with _connect() as db:
+        async with db.execute(
+            "SELECT post_id FROM digest_queue WHERE category = ? ORDER BY post_id LIMIT ?", (category, limit)
+        ) as cursor:
+            post_ids = [row[0] for row in await cursor.fetchall()]
+    found = {}
+    for path, shard_post_ids in _posts_by_shard(post_ids).items(): # The queue is global, the posts are in their shards
+        async with _connect(path) as db:
+            async with db.execute(
+                f"SELECT id, status, search_fields, price, location FROM posts WHERE id IN ({', '.join('?' * len(shard_post_ids))})",
+                shard_post_ids
+            ) as cursor:
+                found.update((row[0], row[1:]) for row in await cursor.fetchall())
+    return [(post_id, *found.get(post_id, (None,) * 4)) for post_id in post_ids]
+
+async def remove_from_digest(post_ids: list):
+    async with _connect() as db:
+        await db.executemany("DELETE FROM digest_queue WHERE post_id = ?", [(post_id,) for post_id in post_ids])
+        await db.commit()
+
+async def record_digest_targets(post_ids: list, chat_id, message_ids: list):
+    """The digest message(s) listing these posts become their only target (status 'digest')."""
+    for path, shard_post_ids in _posts_by_shard(post_ids).items():
+        async with _connect(path) as db:
+            await db.executemany("DELETE FROM post_targets WHERE post_id = ?", [(post_id,) for post_id in shard_post_ids])
+            await db.executemany(
+                "INSERT INTO post_targets (post_id, chat_id, status, message_ids) VALUES (?, ?, 'digest', ?)",
+                [(post_id, str(chat_id), json.dumps(message_ids)) for post_id in shard_post_ids]
+            )
+            await db.commit()
+
+async def count_digest_queue() -> dict:
+    """category -> number of queued ads."""
+    async with _connect() as db:
+        async with db.execute("SELECT category, COUNT(*) FROM digest_queue GROUP BY category") as cursor:
+            return dict(await cursor.fetchall())
+
+async def create_broadcast(text: str, created_by: int) -> int:
+    async with _connect() as db:
+        cursor = await db.execute("INSERT INTO broadcasts (text, created_by) VALUES (?, ?)", (text, created_by))
+        await db.commit()
+        return cursor.lastrowid
+
+async def get_broadcast(broadcast_id: int = None) -> dict | None:
+    """A broadcast by id, or the latest one."""
+    async with _connect() as db:
+        db.row_factory = aiosqlite.Row
+        query = "SELECT * FROM broadcasts " + ("WHERE id = ?" if broadcast_id else "ORDER BY id DESC LIMIT 1")
+        async with db.execute(query, (broadcast_id,) if broadcast_id else ()) as cursor:
+            row = await cursor.fetchone()
+    return dict(row) if row else None
+
+async def get_running_broadcast_id() -> int | None:
+    async with _connect() as db:
+        async with db.execute("SELECT id FROM broadcasts WHERE status = 'running' ORDER BY id LIMIT 1") as cursor:
+            row = await cursor.fetchone()
+    return row[0] if row else None
+
+async def get_broadcast_recipients(after_user_id: int, limit: int) -> list:
+    """The next chunk of (user_id, lang_code) after the checkpoint, skipping blocked users (idx_users_reachable)."""
+    async def query(path):
+        async with _connect(path) as db:
+            async with db.execute(
+                "SELECT user_id, lang_code FROM users WHERE blocked_at IS NULL AND user_id > ? ORDER BY user_id LIMIT ?",
+                (after_user_id, limit)
+            ) as cursor:
+                return await cursor.fetchall()
+
+    return sorted(row for shard_rows in await _scatter(query) for row in shard_rows)[:limit]
+
+async def checkpoint_broadcast(broadcast_id: int, last_user_id: int, sent: int, failed: int, blocked_user_ids: list):
+    """Records a finished chunk: counters and the resume point in one transaction, then the users who blocked the bot."""
+    async with _connect() as db:
+        await db.execute(
+            """
+            UPDATE broadcasts SET last_user_id = ?, sent = sent + ?, failed = failed + ?, blocked = blocked + ?
+            WHERE id = ?
+            """,
+            (last_user_id, sent, failed, len(blocked_user_ids), broadcast_id)
+        )
+        await db.commit()
+    by_shard = {}
+    for user_id in blocked_user_ids:
+        by_shard.setdefault(_user_shard(user_id), []).append((user_id,))
+    for path, rows in by_shard.items():
+        async with _connect(path) as db:
+            await db.executemany("UPDATE users SET blocked_at = CURRENT_TIMESTAMP WHERE user_id = ?", rows)
+            await db.commit()
+
+async def finish_broadcast(broadcast_id: int, status: str):
+    async with _connect() as db:
+        await db.execute("UPDATE broadcasts SET status = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'running'",
+                         (status, broadcast_id))
+        await db.commit()
+
+EXPORT_SELECT_COLUMNS = ("id", "user_id", "user_lang", "category", "status", "created_at", "expires_at", "bumped_at",
+                         "title", "price", "price_amount", "price_currency", "location", "description",
+                         "channel_message_id", "media_files", "category_specific_data")
+
+async def iter_posts_for_export(chunk_size: int, date_from: str = None, date_to: str = None,
+                                category: str = None, status: str = None, archive_paths: list = ()):
+    """
+    Streams posts matching the filters as chunks of dicts (EXPORT_SELECT_COLUMNS): the given archive
+    files (oldest first), then the hot table of every shard, each in id order. Every chunk is its own keyset query
+    on a read-only connection, so no more than one chunk is in memory and long exports don't hold a
+    read transaction open. Dates compare against created_at (date_to is exclusive).
+    """
+    conditions, params = ["id > ?"], []
+    for clause, value in (("created_at >= ?", date_from), ("created_at < ?", date_to),
+                          ("category = ?", category), ("status = ?", status)):
+        if value:
+            conditions.append(clause)
+            params.append(value)
+    # Paged one source at a time: keyset pages over the all_posts union would sort every source per page
+    async with _connect_readonly() as db:
+        db.row_factory = aiosqlite.Row
+        for path in [*archive_paths, *shard_paths()[1:], None]:
+            schema = "main"
+            if path:
+                schema = "source"
+                await db.execute("ATTACH DATABASE ? AS source", (f"file:{path}?mode=ro",))
+            columns = await _posts_columns(db, schema)
+            selected = ", ".join(column if column in columns else f"NULL AS {column}" for column in EXPORT_SELECT_COLUMNS)
+            query = f"SELECT {selected} FROM {schema}.posts WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?"
+            last_id = 0
+            while True:
+                async with db.execute(query, (last_id, *params, chunk_size)) as cursor:
+                    rows = [dict(row) for row in await cursor.fetchall()]
+                if rows:
+                    yield rows
+                if len(rows) < chunk_size:
+                    break
+                last_id = rows[-1]["id"]
+            if path:
+                await db.execute("DETACH DATABASE source")
+
+async def _posts_columns(db, schema: str = "main") -> dict:
+    """Column name -> declared type of schema.posts."""
+    async with db.execute(f"PRAGMA {schema}.table_info(posts)") as cursor:
+        return {row[1]: row[2] for row in await cursor.fetchall()}
+
+async def get_archive_candidates(path: str, after_id: int, limit: int) -> list:
+    """(id, created_at, status) of a shard's posts in id order after the keyset after_id; ids grow with created_at."""
+    async with _connect_readonly(path) as db:
+        async with db.execute("SELECT id, created_at, status FROM posts WHERE id > ? ORDER BY id LIMIT ?",
+                              (after_id, limit)) as cursor:
+            return await cursor.fetchall()
+
+async def move_posts_to_archive(path: str, post_ids: list, month: str, archive_path: str) -> int:
+    """
+    Moves posts of one shard into the archive file of their month. The copy is committed to the archive
+    first (INSERT OR IGNORE on the id, so a retry after a crash is harmless), then the hot rows and their
+    per-post side rows are deleted and the posts recorded in archived_posts. Returns how many moved.
+    """
+    placeholders = ", ".join("?" * len(post_ids))
+    async with _connect(path) as db:
+        await db.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+        await db.execute("CREATE TABLE IF NOT EXISTS archive.posts AS SELECT * FROM main.posts WHERE 0")
+        columns = await _posts_columns(db)
+        archived_columns = await _posts_columns(db, "archive")
+        for name, column_type in columns.items(): # Columns added to posts since the archive was created
+            if name not in archived_columns:
+                await db.execute(f"ALTER TABLE archive.posts ADD COLUMN {name} {column_type}")
+        await db.execute("CREATE UNIQUE INDEX IF NOT EXISTS archive.idx_posts_id ON posts (id)")
+        await db.execute("CREATE INDEX IF NOT EXISTS archive.idx_posts_created ON posts (created_at)")
+        column_list = ", ".join(columns)
+        await db.execute(
+            f"INSERT OR IGNORE INTO archive.posts ({column_list}) SELECT {column_list} FROM main.posts WHERE id IN ({placeholders})",
+            post_ids
+        )
+        await db.commit()
+
+        await db.executemany("INSERT OR IGNORE INTO archived_posts (id, month) VALUES (?, ?)",
+                             [(post_id, month) for post_id in post_ids])
+        for table, column in (("post_targets", "post_id"), ("image_hashes", "post_id"), ("image_matches", "post_id"),
+                              ("image_matches", "matched_post_id")):
+            await db.execute(f"DELETE FROM {table} WHERE {column} IN ({placeholders})", post_ids)
+        cursor = await db.execute(f"DELETE FROM posts WHERE id IN ({placeholders})", post_ids)
+        moved = cursor.rowcount
+        await db.commit()
+        await db.execute("DETACH DATABASE archive")
+    await remove_from_digest(post_ids)
+    logger.info(f"Moved {moved} posts to the {month} archive.")
+    return moved
+
+async def incremental_vacuum() -> int | None:
+    """
+    Returns the free pages given back to the file system by all shards, or None if a shard file isn't
+    in incremental auto-vacuum mode (the others are still vacuumed).
+    """
+    total = 0
+    for path in shard_paths():
+        async with _connect(path) as db:
+            async with db.execute("PRAGMA auto_vacuum") as cursor:
+                if (await cursor.fetchone())[0] != 2: # 2 = INCREMENTAL
+                    total = None
+                    continue
+            async with db.execute("PRAGMA freelist_count") as cursor:
+                free_pages = (await cursor.fetchone())[0]
+            # Frees one page per step and returns no rows: executescript runs it to completion
+            await db.executescript("PRAGMA incremental_vacuum")
+        if total is not None:
+            total += free_pages
+    return total
+
+async def enable_incremental_vacuum():
+    """One-off conversion of the existing files: a full VACUUM each, which locks the database while it runs."""
+    for path in shard_paths():
+        async with _connect(path) as db:
+            await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            await db.execute("VACUUM")
+
+@asynccontextmanager
+async def connect_all_posts(archive_paths: list):
+    """
+    Read-only connection with the other shards and the archive files attached and a TEMP view all_posts
+    over them and the hot posts table (columns missing from older archives read as NULL). The shards take
+    attach slots too: at most ARCHIVE_MAX_ATTACHED - (SHARD_COUNT - 1) archives.
+    """
+    max_archives = ARCHIVE_MAX_ATTACHED - (SHARD_COUNT - 1)
+    if len(archive_paths) > max_archives:
+        raise ValueError(f"At most {max_archives} archives can be attached at once, got {len(archive_paths)}.")
+    async with _connect_readonly() as db:
+        columns = await _posts_columns(db)
+        selects = [f"SELECT {', '.join(columns)} FROM main.posts"]
+        for i, path in enumerate([*shard_paths()[1:], *archive_paths]):
+            await db.execute(f"ATTACH DATABASE ? AS source_{i}", (f"file:{path}?mode=ro",))
+            source_columns = await _posts_columns(db, f"source_{i}")
+            selects.append(f"SELECT {', '.join(c if c in source_columns else f'NULL AS {c}' for c in columns)} "
+                           f"FROM source_{i}.posts")
+        await db.execute(f"CREATE TEMP VIEW all_posts AS {' UNION ALL '.join(selects)}")
+        yield db
+
+# --- Resharding (services/sharding.py, bot stopped) ---
+
+SHARD_MOVED_TABLES = (("posts", "user_id"), ("users", "user_id"))
+SHARD_POST_SIDE_TABLES = ("post_targets", "image_hashes", "image_matches")
+
+async def get_stored_shard_count() -> int:
+    async with _connect() as db:
+        await _init_global_tables(db)
+        count = await _get_stored_shard_count(db)
+        await db.commit()
+    return count
+
+async def store_shard_count(count: int):
+    async with _connect() as db:
+        await _set_stored_shard_count(db, count)
+        await db.commit()
+
+async def record_post_buckets(path: str) -> int:
+    """
+    Lists the shard's posts whose id doesn't encode their user's bucket (saved before sharding) in
+    post_buckets, so they can still be found by id. Returns how many were added.
+    """
+    async with _connect(path) as db:
+        await db.create_function("user_bucket", 1, user_bucket, deterministic=True)
+        async with db.execute(f"SELECT id, user_bucket(user_id) FROM posts WHERE id % {SHARD_BUCKETS} != user_bucket(user_id)") as cursor:
+            rows = await cursor.fetchall()
+    async with _connect() as db:
+        cursor = await db.executemany("INSERT OR IGNORE INTO post_buckets (post_id, bucket) VALUES (?, ?)", rows)
+        await db.commit()
+    return len(rows)
+
+async def move_shard_rows(source: str, target: str, belongs) -> int:
+    """
+    Moves the users and posts (with their per-post rows) of `source` for which belongs(user_id) is true
+    into `target`, in one transaction: copied with INSERT OR IGNORE, so a rerun after an interruption is
+    harmless, then deleted. The triggers on both sides keep the search index and counters right.
+    Returns how many posts moved.
+    """
+    async with _connect(source) as db:
+        await db.create_function("belongs", 1, belongs, deterministic=True)
+        await db.execute("ATTACH DATABASE ? AS target", (target,))
+        await db.execute("CREATE TEMP TABLE moved_posts AS SELECT id FROM main.posts WHERE belongs(user_id)")
+        for table in SHARD_POST_SIDE_TABLES:
+            column_list = ", ".join(await _table_columns(db, table))
+            await db.execute(f"INSERT OR IGNORE INTO target.{table} ({column_list}) SELECT {column_list} FROM main.{table} "
+                             "WHERE post_id IN (SELECT id FROM moved_posts)")
+            await db.execute(f"DELETE FROM main.{table} WHERE post_id IN (SELECT id FROM moved_posts)")
+        moved = 0
+        for table, column in SHARD_MOVED_TABLES:
+            column_list = ", ".join(await _table_columns(db, table))
+            await db.execute(f"INSERT OR IGNORE INTO target.{table} ({column_list}) SELECT {column_list} FROM main.{table} "
+                             f"WHERE belongs({column})")
+            cursor = await db.execute(f"DELETE FROM main.{table} WHERE belongs({column})")
+            if table == "posts":
+                moved = cursor.rowcount
+        await db.commit()
+        await db.execute("DROP TABLE temp.moved_posts")
+        await db.execute("DETACH DATABASE target")
+    return moved
+
+async def _table_columns(db, table: str) -> list:
+    async with db.execute(f"PRAGMA main.table_info({table})") as cursor:
+        return [row[1] for row in await cursor.fetchall()]
+
+async def get_posts_sequence(path: str) -> int:
+    """The highest post id the shard ever handed out."""
+    async with _connect(path) as db:
+        async with db.execute("SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'posts'") as cursor:
+            return (await cursor.fetchone())[0]
+
+async def set_posts_sequence(path: str, seq: int):
+    """Raises the shard's AUTOINCREMENT counter, so its new ids stay above every id used in any shard."""
+    async with _connect(path) as db:
+        cursor = await db.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'posts'", (seq,))
+        if not cursor.rowcount:
+            await db.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('posts', ?)", (seq,))
+        await db.commit()
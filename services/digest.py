@@ -0,0 +1,120 @@
+# selling_bot/services/digest.py
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+import config
+from services.storage import storage as db
+from services import message_formatter
+from services import profiler
+from services.bot_context import PerBot
+from services.channel_router import channel_router
+
+logger = logging.getLogger(__name__)
+
+
+class DigestPublisher:
+    """
+    Digest mode for high-volume categories (config.DIGEST_CATEGORIES): their published ads go into
+    digest_queue instead of the channel, and one task posts them as a single list with links at most
+    N minutes after the first of them was queued, or as soon as K are waiting. The queue lives in the
+    DB, so a restart loses nothing.
+    """
+
+    def __init__(self, categories: Dict[str, tuple]):
+        self.categories = categories # category -> (minutes, max ads)
+        self._counts: Dict[str, int] = {}
+        self._window_start: Dict[str, float] = {} # category -> when its oldest waiting ad was queued
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._bot = None
+
+    def __len__(self) -> int:
+        return sum(self._counts.values())
+
+    def handles(self, category: str) -> bool:
+        return category in self.categories
+
+    async def start(self, bot):
+        if not self.categories or self._task is not None:
+            return
+        self._bot = bot
+        self._counts = await db.count_digest_queue()
+        now = time.monotonic()
+        self._window_start = {category: now for category in self._counts}
+        self._task = asyncio.create_task(self._run(), name="digest_publisher")
+        logger.info(f"Digest publisher started for {', '.join(self.categories)} ({len(self)} ads queued).")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def enqueue(self, post_id: int, category: str):
+        """Queues a just-published (or bumped) ad for its category's next digest."""
+        await db.enqueue_digest(post_id, category)
+        if not self._counts.get(category):
+            self._window_start[category] = time.monotonic()
+        self._counts[category] = self._counts.get(category, 0) + 1
+        self._wakeup.set() # Its window may end before whatever the loop is sleeping towards
+
+    def _deadlines(self) -> Dict[str, float]:
+        return {category: self._window_start[category] + minutes * 60
+                for category, (minutes, _) in self.categories.items() if self._counts.get(category)}
+
+    def _due(self, now: float) -> list:
+        return [category for category, deadline in self._deadlines().items()
+                if deadline <= now or self._counts[category] >= self.categories[category][1]]
+
+    async def _run(self):
+        while True:
+            try:
+                self._wakeup.clear()
+                for category in self._due(time.monotonic()):
+                    await self._flush(category)
+                next_wake = min(self._deadlines().values(), default=time.monotonic() + 3600)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=max(1.0, next_wake - time.monotonic()))
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Digest publisher iteration failed: {e}", exc_info=True)
+                await asyncio.sleep(30)
+
+    async def _flush(self, category: str):
+        max_ads = self.categories[category][1]
+        while True:
+            rows = await db.get_digest_batch(category, max_ads)
+            if not rows:
+                break
+            # Ads sold, expired or deleted while waiting are dropped from the queue without being listed
+            entries = [(post_id, search_fields, price, location)
+                       for post_id, status, search_fields, price, location in rows if status == 'published']
+            if entries:
+                messages = message_formatter.format_digest(entries, category, config.DEFAULT_LANGUAGE, self._bot.username)
+                for text, post_ids in messages:
+                    message = await channel_router.send_text(self._bot, channel_router.main_chat, text)
+                    # Dequeued message by message: if a later one fails, the next flush doesn't list these again
+                    await db.record_digest_targets(post_ids, channel_router.main_chat, [message.message_id])
+                    await self._dequeue(category, post_ids)
+                logger.info(f"Posted a digest of {len(entries)} {category} ads in {len(messages)} message(s).")
+            await self._dequeue(category, [row[0] for row in rows if row[1] != 'published'])
+            if len(rows) < max_ads:
+                break
+        self._window_start[category] = time.monotonic() # Ads queued during the flush start a new window
+
+    async def _dequeue(self, category: str, post_ids: list):
+        if post_ids:
+            await db.remove_from_digest(post_ids)
+            self._counts[category] = max(0, self._counts.get(category, 0) - len(post_ids))
+
+
+digest_publisher = PerBot(lambda bot: DigestPublisher(config.DIGEST_CATEGORIES))
+profiler.register_structure("digest.queued_ads", lambda: len(digest_publisher))
@@ -0,0 +1,192 @@
+# selling_bot/services/expiry_scheduler.py
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from telegram.error import BadRequest
+
+import config
+from localization import get_text
+from services.storage import storage as db
+from services import message_formatter
+from services import profiler
+from services.bot_context import PerBot
+from services.channel_publisher import channel_edit_queue
+from services.channel_router import channel_router
+from services.digest import digest_publisher
+from services.notification_queue import notification_queue
+
+logger = logging.getLogger(__name__)
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S" # Same as SQLite's CURRENT_TIMESTAMP (UTC)
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def format_utc(moment: datetime) -> str:
+    return moment.strftime(TIME_FORMAT)
+
+
+def parse_utc(text: str) -> datetime:
+    return datetime.strptime(str(text)[:19], TIME_FORMAT).replace(tzinfo=timezone.utc)
+
+
+class ExpiryScheduler:
+    """
+    One task for all ad deadlines instead of one JobQueue job per ad. Only the deadlines of the
+    next EXPIRY_LOOKAHEAD_SECONDS are held in a heap; they are read from the DB in deadline order
+    through the idx_posts_expires partial index, so memory does not grow with the number of live
+    ads and a restart simply re-reads the window. Bumped ads leave stale heap entries behind,
+    which are skipped when popped.
+    """
+
+    def __init__(self, lookahead_seconds: float, batch_size: int):
+        self.lookahead = timedelta(seconds=lookahead_seconds)
+        self.batch_size = batch_size
+        self._heap: list = [] # (expires_at, post_id); the text format sorts chronologically
+        self._current: Dict[int, str] = {} # post_id -> expires_at of its live heap entry
+        self._loaded_until: Optional[str] = None # Every deadline up to here is in the heap
+        self._cursor = ("", 0) # (expires_at, id) keyset of the last row read
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._current)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="expiry_scheduler")
+            logger.info("Expiry scheduler started.")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def push(self, post_id: int, expires_at: str):
+        """Tracks a new deadline (publish/bump). Deadlines past the loaded window are picked up by the next refill."""
+        if self._loaded_until is None or expires_at > self._loaded_until:
+            self._current.pop(post_id, None) # A bump moved it out of the window
+            return
+        self._current[post_id] = expires_at
+        heapq.heappush(self._heap, (expires_at, post_id))
+        self._wakeup.set() # It may be due before whatever the loop is sleeping towards
+
+    async def _refill(self, now: datetime):
+        until = format_utc(now + self.lookahead)
+        while True:
+            rows = await db.get_expiring_posts(until, self._cursor, self.batch_size)
+            for post_id, expires_at in rows:
+                if self._current.get(post_id) != expires_at:
+                    self._current[post_id] = expires_at
+                    heapq.heappush(self._heap, (expires_at, post_id))
+            if rows:
+                self._cursor = (rows[-1][1], rows[-1][0])
+            if len(rows) < self.batch_size:
+                break
+        self._loaded_until = until
+
+    def _pop_due(self, now_text: str) -> list:
+        due = []
+        while self._heap and self._heap[0][0] <= now_text and len(due) < self.batch_size:
+            expires_at, post_id = heapq.heappop(self._heap)
+            if self._current.get(post_id) == expires_at: # Otherwise bumped/rescheduled since
+                del self._current[post_id]
+                due.append((post_id, expires_at))
+        return due
+
+    async def _run(self):
+        while True:
+            try:
+                now = utcnow()
+                if self._loaded_until is None or format_utc(now) >= self._loaded_until:
+                    await self._refill(now)
+                due = self._pop_due(format_utc(now))
+                if due:
+                    await self._expire(due)
+                    continue # There may be more due than one batch
+                next_wake = parse_utc(self._loaded_until)
+                if self._heap:
+                    next_wake = min(next_wake, parse_utc(self._heap[0][0]))
+                self._wakeup.clear()
+                timeout = max(1.0, (next_wake - utcnow()).total_seconds())
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Expiry scheduler iteration failed: {e}", exc_info=True)
+                await asyncio.sleep(30)
+
+    async def _expire(self, due: list):
+        for post_id in await db.expire_posts(due):
+            post = await db.get_post(post_id)
+            if not post:
+                continue
+            lang = post['user_lang'] or config.DEFAULT_LANGUAGE
+            # Telegram only lets bots delete channel messages for 48 hours, so the post is relabelled instead
+            await channel_router.enqueue_edit_everywhere(
+                post, message_formatter.format_status_label(get_text("channel_ad_expired", lang), post['search_text'])
+            )
+            notification_queue.enqueue(post['user_id'], get_text("ad_expired_notice", lang, post_id=post_id))
+
+
+expiry_scheduler = PerBot(lambda bot: ExpiryScheduler(config.EXPIRY_LOOKAHEAD_SECONDS, config.EXPIRY_BATCH_SIZE))
+profiler.register_structure("expiry_scheduler.deadlines", lambda: len(expiry_scheduler))
+
+
+def new_expiry(start: datetime = None) -> str:
+    return format_utc((start or utcnow()) + timedelta(days=config.AD_LIFETIME_DAYS))
+
+
+async def schedule_post(post_id: int) -> str:
+    """Starts the lifetime of a just-published post."""
+    expires_at = new_expiry()
+    await db.set_post_expiry(post_id, expires_at)
+    expiry_scheduler.push(post_id, expires_at)
+    return expires_at
+
+
+def next_bump_allowed(post: dict) -> datetime:
+    return parse_utc(post['bumped_at'] or post['created_at']) + timedelta(hours=config.BUMP_COOLDOWN_HOURS)
+
+
+async def bump_post(bot, post: dict) -> list:
+    """
+    Reposts a stored post (database_service.get_post) at the top of the channel (and of its routed
+    channels), restarts its lifetime and removes the old copies. Returns the new main channel messages;
+    none for digest categories, whose ads go back into the next digest instead.
+    """
+    now = utcnow()
+    old_copies = [(channel_router.main_chat, post['channel_message_ids']), *await channel_router.extra_messages(post['id'])]
+    if digest_publisher.handles(post['category']):
+        await digest_publisher.enqueue(post['id'], post['category'])
+        sent_messages = []
+    else:
+        sent_messages = await channel_router.publish(bot, post['id'], post['search_text'], post['media_files'],
+                                                     post['category'], post['user_lang'])
+    expires_at = new_expiry(now)
+    await db.set_post_expiry(post['id'], expires_at, [message.message_id for message in sent_messages], bumped_at=format_utc(now))
+    expiry_scheduler.push(post['id'], expires_at)
+    logger.info(f"Post {post['id']} bumped, now expires at {expires_at}.")
+
+    for chat_id, old_message_ids in old_copies:
+        if not old_message_ids:
+            continue
+        try: # The whole old album in one call
+            await bot.delete_messages(chat_id=chat_id, message_ids=old_message_ids)
+        except BadRequest as e: # Older than 48 hours: bots can no longer delete it, relabel it instead
+            logger.info(f"Could not delete old messages of bumped post {post['id']} in {chat_id} ({e}), relabelling them.")
+            channel_edit_queue.enqueue_edit(chat_id, old_message_ids[0], get_text("channel_ad_bumped", post['user_lang']),
+                                            bool(post['media_files']))
+    return sent_messages
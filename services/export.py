@@ -0,0 +1,150 @@
+# selling_bot/services/export.py
+"""
+Streaming export of the posts table to CSV or Parquet, for reporting.
+
+    python -m services.export --format csv --out posts.csv --from 2024-01-01 --to 2024-02-01 --category cars --status published
+
+Rows are read and written one chunk at a time (config.EXPORT_CHUNK_SIZE), so memory stays flat
+whatever the size of the table; archived posts (services/archive.py) of the requested months are
+included. The JSON columns are expanded: media_files into media_count and
+media_<n>_type/media_<n>_file_id, category_specific_data into one column per known field.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # pyarrow is optional: without it only CSV is available
+    pa = pq = None
+
+import config
+from constants import EDITABLE_FIELDS_CATEGORY
+from services.storage import storage as db
+from services import archive
+from services import bot_context
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("csv", "parquet")
+SPECIFIC_FIELDS = list(dict.fromkeys(field for fields in EDITABLE_FIELDS_CATEGORY.values() for field in fields))
+BASE_COLUMNS = [column for column in db.EXPORT_SELECT_COLUMNS if column not in ("media_files", "category_specific_data")]
+MEDIA_ITEM_COLUMNS = [(f"media_{i}_type", f"media_{i}_file_id") for i in range(1, config.MAX_MEDIA_ITEMS + 1)]
+MEDIA_COLUMNS = ["media_count"] + [column for pair in MEDIA_ITEM_COLUMNS for column in pair]
+# Fields of category_specific_data not in SPECIFIC_FIELDS (older or future flows) are kept as JSON
+COLUMNS = BASE_COLUMNS + MEDIA_COLUMNS + SPECIFIC_FIELDS + ["specific_other"]
+INTEGER_COLUMNS = {"id", "user_id", "channel_message_id", "media_count"}
+FLOAT_COLUMNS = {"price_amount"}
+
+
+def available_formats() -> list:
+    return [fmt for fmt in EXPORT_FORMATS if fmt != "parquet" or pa is not None]
+
+
+def flatten_post(row: dict) -> dict:
+    """One exported record: the plain columns plus the expanded JSON columns."""
+    record = {column: row[column] for column in BASE_COLUMNS}
+    media = json.loads(row["media_files"]) if row["media_files"] else []
+    record["media_count"] = len(media)
+    for i, (type_column, file_id_column) in enumerate(MEDIA_ITEM_COLUMNS):
+        item = media[i] if i < len(media) else {}
+        record[type_column] = item.get("type")
+        record[file_id_column] = item.get("file_id")
+    specific = json.loads(row["category_specific_data"]) if row["category_specific_data"] else {}
+    for field in SPECIFIC_FIELDS:
+        value = specific.pop(field, None)
+        record[field] = str(value) if value is not None else None
+    record["specific_other"] = json.dumps(specific, ensure_ascii=False) if specific else None
+    return record
+
+
+class _CsvSink:
+    def __init__(self, path: str):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        # Records are built by flatten_post with exactly COLUMNS, so the per-row extra-key check is skipped
+        self._writer = csv.DictWriter(self._file, fieldnames=COLUMNS, extrasaction="ignore")
+        self._writer.writeheader()
+
+    def write(self, records: list):
+        self._writer.writerows(records)
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetSink:
+    """One row group per chunk."""
+
+    def __init__(self, path: str):
+        self._schema = pa.schema([
+            (column, pa.int64() if column in INTEGER_COLUMNS else pa.float64() if column in FLOAT_COLUMNS else pa.string())
+            for column in COLUMNS
+        ])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, records: list):
+        self._writer.write_table(pa.Table.from_pylist(records, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def _write_chunk(sink, rows: list):
+    sink.write([flatten_post(row) for row in rows])
+
+
+async def export_posts(path: str, fmt: str = "csv", date_from: str = None, date_to: str = None,
+                       category: str = None, status: str = None) -> int:
+    """Writes the matching posts to path and returns how many were exported."""
+    if fmt not in available_formats():
+        raise ValueError(f"Unsupported export format '{fmt}' (available: {', '.join(available_formats())}).")
+    sink = _ParquetSink(path) if fmt == "parquet" else _CsvSink(path)
+    count = 0
+    try:
+        async for rows in db.iter_posts_for_export(config.EXPORT_CHUNK_SIZE, date_from, date_to, category, status,
+                                                   archive.archive_paths(date_from, date_to)):
+            # Flattening and file writes run in a thread so a big export leaves the bot's event loop free
+            await asyncio.to_thread(_write_chunk, sink, rows)
+            count += len(rows)
+    finally:
+        sink.close()
+    logger.info(f"Exported {count} posts to {path}.")
+    return count
+
+
+def default_export_path(fmt: str) -> str:
+    os.makedirs(config.EXPORT_DIR, exist_ok=True)
+    return os.path.join(config.EXPORT_DIR, f"posts_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the posts table to CSV or Parquet.")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--out", help="Output file (default: a timestamped file in EXPORT_DIR)")
+    parser.add_argument("--from", dest="date_from", help="Created on or after (YYYY-MM-DD, UTC)")
+    parser.add_argument("--to", dest="date_to", help="Created before (YYYY-MM-DD, UTC)")
+    parser.add_argument("--category")
+    parser.add_argument("--status")
+    bot_context.add_bot_argument(parser)
+    args = parser.parse_args()
+    bot_context.select_bot(args)
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    path = args.out or default_export_path(args.format)
+
+    async def run():
+        await db.init_db()
+        try:
+            return await export_posts(path, args.format, args.date_from, args.date_to, args.category, args.status)
+        finally:
+            await db.close_db()
+
+    print(f"{asyncio.run(run())} posts written to {path}")
+
+
+if __name__ == "__main__":
+    main()
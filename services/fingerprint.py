@@ -0,0 +1,42 @@
+# selling_bot/services/fingerprint.py
+import hashlib
+import re
+import unicodedata
+
+from constants import CAT_SPECIFIC_DATA_KEY, PARSED_VALUES_KEY
+
+_NON_WORD_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def normalize_text(value) -> str:
+    """'  Toyota CAMRY, 2.5L!' -> 'toyota camry 2 5l'. Case, accents, punctuation and spacing don't count."""
+    text = unicodedata.normalize("NFKD", str(value or "")).lower()
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return _NON_WORD_RE.sub(" ", text).strip()
+
+
+def _price_key(user_data: dict) -> str:
+    # "$15,000" and "15000 USD" are the same price once parsed
+    parsed = user_data.get(PARSED_VALUES_KEY) or {}
+    if parsed.get("price_amount") is not None:
+        return f"{parsed['price_amount']:g} {parsed.get('price_currency') or ''}".strip()
+    return normalize_text(user_data.get("price")).replace(" ", "")
+
+
+def compute_fingerprint(user_data: dict) -> str:
+    """
+    Content hash of a draft: its category, normalized text fields, parsed price and the
+    file_unique_id of every media item (stable across re-sends of the same file, unlike file_id).
+    Media order doesn't matter. Returns a hex digest for the posts.fingerprint column.
+    """
+    specific = user_data.get(CAT_SPECIFIC_DATA_KEY) or {}
+    media = sorted(item.get("file_unique_id") or item.get("file_id") for item in user_data.get("media_files") or [])
+    parts = [
+        user_data.get("category") or "",
+        *(f"{key}={normalize_text(specific[key])}" for key in sorted(specific) if specific[key]),
+        _price_key(user_data),
+        normalize_text(user_data.get("location")),
+        normalize_text(user_data.get("description")),
+        *media,
+    ]
+    return hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=16).hexdigest()
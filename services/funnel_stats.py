@@ -0,0 +1,94 @@
+# selling_bot/services/funnel_stats.py
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, Tuple
+
+import constants
+from services.storage import storage as db
+from services import profiler
+from services.bot_context import PerBot
+from services.quantile_sketch import QuantileSketch
+
+logger = logging.getLogger(__name__)
+
+# Keys kept in user_data to know where the user is in the funnel
+FUNNEL_STATE_KEY = "_funnel_state"
+FUNNEL_SINCE_KEY = "_funnel_since"
+NO_CATEGORY = "-"
+
+# (category, from_state, to_state) -> duration sketch (ms) of the time spent in from_state.
+# Pure in-memory (one dict per bot), flushed to funnel_rollups by flush_funnel_stats().
+_pending = PerBot(lambda bot: {})
+profiler.register_structure("funnel_stats.pending", lambda: len(_pending))
+
+
+def _state_name(state) -> str:
+    return constants.STATE_NAMES.get(state, str(state))
+
+
+def _add(category: str, from_state: str, to_state: str, duration_ms: float):
+    key = (category, from_state, to_state)
+    sketch = _pending.get(key)
+    if sketch is None:
+        sketch = _pending[key] = QuantileSketch()
+    sketch.add(duration_ms)
+
+
+def record_state(user_data: dict, new_state: int):
+    """Records a transition into `new_state`. Staying in the same state (re-asks, extra media) is not a transition."""
+    new_name = _state_name(new_state)
+    previous = user_data.get(FUNNEL_STATE_KEY)
+    now = time.monotonic()
+    if previous == new_name:
+        return
+    if previous is not None:
+        elapsed_ms = (now - user_data.get(FUNNEL_SINCE_KEY, now)) * 1000
+        _add(user_data.get('category') or NO_CATEGORY, previous, new_name, elapsed_ms)
+    user_data[FUNNEL_STATE_KEY] = new_name
+    user_data[FUNNEL_SINCE_KEY] = now
+
+
+def record_outcome(user_data: dict, outcome: str):
+    """Closes the user's funnel with a terminal outcome (PUBLISHED, CANCELLED, ...). No-op if no flow is open."""
+    previous = user_data.pop(FUNNEL_STATE_KEY, None)
+    since = user_data.pop(FUNNEL_SINCE_KEY, None)
+    if previous is None:
+        return
+    elapsed_ms = (time.monotonic() - since) * 1000 if since is not None else 0.0
+    _add(user_data.get('category') or NO_CATEGORY, previous, outcome, elapsed_ms)
+
+
+async def flush_funnel_stats(context=None):
+    """Writes the pending counters as one rollup row per (category, transition). Usable as a JobQueue callback."""
+    if not _pending:
+        return
+    pending = _pending.copy() # Taken first so transitions recorded during the write go to the next batch
+    _pending.clear()
+    bucket = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:00")
+    rows = [
+        (bucket, category, from_state, to_state, int(sketch.count), sketch.sum, sketch.max, sketch.to_dict())
+        for (category, from_state, to_state), sketch in pending.items()
+    ]
+    try:
+        await db.save_funnel_rollups(rows)
+    except Exception as e:
+        logger.error(f"Failed to flush funnel stats, merging back for the next flush: {e}")
+        for key, sketch in pending.items():
+            if key in _pending:
+                sketch.merge(_pending[key])
+            _pending[key] = sketch
+
+
+async def get_funnel_summary(since: str) -> Dict[str, Dict[Tuple[str, str], QuantileSketch]]:
+    """Merges rollups since `since` (UTC 'YYYY-MM-DD HH:MM:SS') into category -> (from, to) -> sketch."""
+    summary: Dict[str, Dict[Tuple[str, str], QuantileSketch]] = {}
+    for category, from_state, to_state, sketch_data in await db.get_funnel_rollups(since):
+        per_category = summary.setdefault(category, {})
+        sketch = QuantileSketch.from_dict(sketch_data)
+        key = (from_state, to_state)
+        if key in per_category:
+            per_category[key].merge(sketch)
+        else:
+            per_category[key] = sketch
+    return summary
@@ -0,0 +1,28 @@
+# selling_bot/services/idempotency.py
+import secrets
+
+from config import IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_CACHE_TTL
+from services import profiler
+from services.ttl_cache import TTLCache
+
+# Tokens of drafts whose Post was already accepted by this process. The unique index on
+# posts.idempotency_token catches anything older than this cache or from before a restart.
+_claimed = TTLCache(IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_CACHE_TTL)
+profiler.register_structure("idempotency.claimed_tokens", lambda: len(_claimed))
+
+
+def new_token() -> str:
+    """Short random token for a draft; fits in callback data next to the action."""
+    return secrets.token_urlsafe(8)
+
+
+def is_claimed(token: str) -> bool:
+    return bool(token) and bool(_claimed.get(token))
+
+
+def claim(token: str) -> bool:
+    """Marks the token as submitted. False if it already was (double tap, retried callback)."""
+    if is_claimed(token):
+        return False
+    _claimed.set(token, True)
+    return True
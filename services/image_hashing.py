@@ -0,0 +1,192 @@
+# selling_bot/services/image_hashing.py
+import asyncio
+import io
+import logging
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+try:
+    from PIL import Image
+except ImportError: # Pillow is optional: without it the pipeline stays off
+    Image = None
+
+from config import IMAGE_HASH_WORKERS, IMAGE_HASH_QUEUE_SIZE, IMAGE_HASH_MAX_DISTANCE
+from services.storage import storage as db
+from services import profiler
+from services.bot_context import PerBot
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+CHUNK_BITS = 16
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+CHUNKS = HASH_BITS // CHUNK_BITS
+
+# The worker processes are the costly part, so the pipelines of all hosted bots share one pool
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_users = 0
+
+
+def compute_dhash(image_bytes: bytes) -> int:
+    """
+    64-bit difference hash: the image is shrunk to 9x8 greyscale and every bit says whether a pixel
+    is brighter than its right neighbour. Survives re-encoding, resizing and small edits.
+    Runs in a worker process (it decodes the whole image), so it must stay a picklable top-level function.
+    """
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        image.draft("L", (64, 64)) # Lets JPEG decode at a reduced size
+        pixels = list(image.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+
+def to_signed(value: int) -> int:
+    """SQLite integers are signed 64-bit."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+class MultiIndexHash:
+    """
+    Near-duplicate lookup for 64-bit hashes (multi-index hashing). Each hash is split into four
+    16-bit chunks with one exact-match table per chunk; two hashes within Hamming distance < 4
+    must agree on at least one chunk, so a query only compares against the hashes sharing a chunk
+    instead of scanning everything.
+    """
+
+    def __init__(self):
+        self._tables: List[Dict[int, Set[int]]] = [defaultdict(set) for _ in range(CHUNKS)]
+        self._entries: Dict[int, Tuple[int, int]] = {} # hash -> (post_id, user_id) of its first occurrence
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _chunks(value: int):
+        return [(value >> (CHUNK_BITS * i)) & CHUNK_MASK for i in range(CHUNKS)]
+
+    def add(self, value: int, post_id: int, user_id: int):
+        if value in self._entries:
+            return
+        self._entries[value] = (post_id, user_id)
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            table[chunk].add(value)
+
+    def query(self, value: int, max_distance: int) -> List[Tuple[int, int, int]]:
+        """(distance, post_id, user_id) of stored hashes within max_distance (< CHUNKS), closest first."""
+        candidates = set()
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            candidates |= table.get(chunk, set())
+        matches = []
+        for candidate in candidates:
+            distance = bin(candidate ^ value).count("1")
+            if distance <= max_distance:
+                matches.append((distance, *self._entries[candidate]))
+        return sorted(matches)
+
+
+class ImageHashPipeline:
+    """
+    Background pipeline for published photos: download through getFile, hash in a process pool,
+    look up near duplicates, persist. Nothing here runs on the user-facing path: publishing only
+    enqueues, and decoding happens in other processes so the event loop never stalls on an image.
+    """
+
+    def __init__(self, workers: int, queue_size: int, max_distance: int):
+        self.workers = workers
+        self.max_distance = min(max_distance, CHUNKS - 1) # The index can't guarantee recall beyond that
+        self.index = MultiIndexHash()
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._tasks: List[asyncio.Task] = []
+        self._bot = None
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def enabled(self) -> bool:
+        return Image is not None and self.workers > 0
+
+    async def start(self, bot):
+        if not self.enabled:
+            logger.warning("Image hashing disabled (Pillow not installed or IMAGE_HASH_WORKERS = 0).")
+            return
+        self._bot = bot
+        async for post_id, user_id, value in db.iter_image_hashes():
+            self.index.add(to_unsigned(value), post_id, user_id)
+        global _executor, _executor_users
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=self.workers)
+        _executor_users += 1
+        self._executor = _executor
+        # One downloader per hashing process keeps the pool busy without piling up downloads
+        self._tasks = [asyncio.create_task(self._run(), name=f"image_hash_{i}") for i in range(self.workers)]
+        logger.info(f"Image hash pipeline started with {len(self.index)} known hashes.")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        global _executor, _executor_users
+        if self._executor:
+            self._executor = None
+            _executor_users -= 1
+            if not _executor_users:
+                _executor.shutdown(wait=False, cancel_futures=True)
+                _executor = None
+
+    async def drain(self):
+        """Waits until every photo queued so far is processed (used by tests/test_image_hashing.py)."""
+        await self._queue.join()
+
+    def enqueue_post(self, post_id: int, user_id: int, media_files: list):
+        """Queues the photos of a just-published post. Drops them (logged) if the queue is full."""
+        if not self._tasks:
+            return
+        for item in media_files:
+            if item.get('type') != 'photo':
+                continue
+            try:
+                self._queue.put_nowait((post_id, user_id, item['file_id'], item.get('file_unique_id') or item['file_id']))
+            except asyncio.QueueFull:
+                logger.warning(f"Image hash queue full, skipping photos of post {post_id}.")
+                return
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            post_id, user_id, file_id, file_unique_id = await self._queue.get()
+            try:
+                telegram_file = await self._bot.get_file(file_id)
+                image_bytes = bytes(await telegram_file.download_as_bytearray())
+                value = await loop.run_in_executor(self._executor, compute_dhash, image_bytes)
+                await self._record(post_id, user_id, file_unique_id, value)
+            except Exception as e:
+                logger.error(f"Hashing photo {file_unique_id} of post {post_id} failed: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def _record(self, post_id: int, user_id: int, file_unique_id: str, value: int):
+        matches = [match for match in self.index.query(value, self.max_distance) if match[1] != post_id]
+        self.index.add(value, post_id, user_id) # Before any await, so a concurrent worker sees it
+        await db.save_image_hash(post_id, file_unique_id, to_signed(value),
+                                 [(matched_post_id, distance) for distance, matched_post_id, _ in matches])
+        if matches:
+            distance, matched_post_id, matched_user_id = matches[0]
+            owner = "same seller" if matched_user_id == user_id else f"user {matched_user_id}"
+            logger.info(f"Photo {file_unique_id} of post {post_id} looks like post {matched_post_id} "
+                        f"({owner}, distance {distance}).")
+
+
+pipeline = PerBot(lambda bot: ImageHashPipeline(IMAGE_HASH_WORKERS, IMAGE_HASH_QUEUE_SIZE, IMAGE_HASH_MAX_DISTANCE))
+profiler.register_structure("image_hashing.index", lambda: len(pipeline.index))
+profiler.register_structure("image_hashing.queue", lambda: len(pipeline))
@@ -1,8 +1,9 @@
 # selling_bot/services/message_formatter.py
 from typing import Dict, Any
 from localization import get_text, get_user_lang, get_category_display_name
-from config import CATEGORIES_KEYS, DEFAULT_LANGUAGE # Import CATEGORIES_KEYS
-from constants import CAT_SPECIFIC_DATA_KEY # Import the key
+from config import CATEGORIES_KEYS, DEFAULT_LANGUAGE, IS_CHANNEL # Import CATEGORIES_KEYS
+from constants import CAT_SPECIFIC_DATA_KEY, AD_DEEP_LINK_PREFIX # Import the key
+from services.bot_context import current_bot
 
 def format_preview_message(user_data: Dict[str, Any]) -> str:
     """Formats the ad preview message based on category."""
@@ -94,4 +95,102 @@ def format_final_post(user_data: Dict[str, Any]) -> str:
     """Formats the final post message (currently uses the same logic as preview)."""
     # For the channel post, you might want a slightly different or more compact format.
     # But for now, reusing the preview format is fine.
-    return format_preview_message(user_data)
\ No newline at end of file
+    return format_preview_message(user_data)
+
+def format_published_post(post: Dict[str, Any]) -> str:
+    """Re-renders a stored post (database_service.get_post) exactly as format_final_post did at publish time."""
+    return format_final_post({
+        'lang': post.get('user_lang') or DEFAULT_LANGUAGE,
+        'category': post.get('category'),
+        CAT_SPECIFIC_DATA_KEY: post.get('category_specific_data') or {},
+        'price': post.get('price'),
+        'location': post.get('location'),
+        'description': post.get('description'),
+        'media_files': post.get('media_files') or [],
+    })
+
+def format_status_label(label: str, ad_text: str) -> str:
+    """Channel text of a post whose status changed (expired, sold): the label on top of the original ad."""
+    return f"{label}\n\n{ad_text or ''}".strip()
+
+def build_post_link(target_chat, message_id) -> str | None:
+    """Public t.me link to a channel message, or None if the target has no linkable address."""
+    if not message_id or target_chat is None:
+        return None
+    target = str(target_chat)
+    if target.startswith('@'):
+        return f"https://t.me/{target[1:]}/{message_id}"
+    if target.startswith('-100'): # Private/supergroup channel ids: -100<internal id>
+        return f"https://t.me/c/{target[4:]}/{message_id}"
+    return None # Admin user id (IS_CHANNEL=False): nothing to link to
+
+
+def build_ad_deep_link(bot_username: str, post_id: int) -> str:
+    """Link that opens the ad in a private chat with the bot (/start ad_<id>)."""
+    return f"https://t.me/{bot_username}?start={AD_DEEP_LINK_PREFIX}{post_id}"
+
+
+def format_digest(entries, category: str, lang: str, bot_username: str, max_length: int = 4096) -> list:
+    """
+    Plain-text digest posts for a category as (text, post_ids listed in it). entries are
+    (post_id, search_fields, price, location); they are split into as many messages as needed to stay
+    under max_length.
+    """
+    header = get_text("digest_header", lang, category=get_category_display_name(category, lang), count=len(entries))
+    messages, current, current_ids = [], header, []
+    for post_id, search_fields, price, location in entries:
+        line_items = [f"#{post_id}"]
+        if search_fields:
+            line_items.append(search_fields[:60])
+        if price:
+            line_items.append(price)
+        if location:
+            line_items.append(location)
+        block = " · ".join(line_items) + "\n" + build_ad_deep_link(bot_username, post_id)
+        if current_ids and len(current) + len(block) + 2 > max_length:
+            messages.append((current, current_ids))
+            current, current_ids = header, []
+        current += "\n\n" + block
+        current_ids.append(post_id)
+    messages.append((current, current_ids))
+    return messages
+
+
+def format_search_results(rows, query: str, lang: str) -> str:
+    """Plain-text list of search results (rows from database_service.search_posts)."""
+    parts = [get_text("search_results_header", lang, query=query), ""]
+    for post_id, category, search_fields, price, location, channel_message_id in rows:
+        line_items = [get_category_display_name(category, lang)]
+        if search_fields:
+            line_items.append(search_fields[:60])
+        if price:
+            line_items.append(price)
+        if location:
+            line_items.append(location)
+        parts.append(f"#{post_id} · " + " · ".join(line_items))
+        link = build_post_link(current_bot().target_chat_id, channel_message_id) if IS_CHANNEL else None
+        if link:
+            parts.append(link)
+        parts.append("")
+    return "\n".join(parts).strip()
+
+
+def format_post_status(status: str, lang: str) -> str:
+    """Localized label for a posts.status value (failed_to_publish_* variants share one label)."""
+    if status and status.startswith("failed_to_publish"):
+        status = "failed"
+    label = get_text(f"post_status_{status}", lang)
+    return status if label == f"_post_status_{status}_" else label
+
+
+def format_my_ads(rows, total_count: int, lang: str) -> str:
+    """Plain-text page of a user's ads (rows from database_service.get_user_posts)."""
+    parts = [get_text("myads_header", lang, count=total_count), ""]
+    for post_id, category, status, created_at, price in rows:
+        line_items = [f"#{post_id}", str(created_at)[:10], get_category_display_name(category, lang)]
+        if price:
+            line_items.append(price)
+        parts.append(" · ".join(line_items))
+        parts.append(format_post_status(status, lang))
+        parts.append("")
+    return "\n".join(parts).strip()
@@ -0,0 +1,73 @@
+# selling_bot/services/moderation.py
+import asyncio
+import logging
+from typing import Optional
+
+from localization import get_text
+from services.storage import storage as db
+from services import message_formatter
+from services import profiler
+from services.bot_context import PerBot
+from services import publishing
+from services.channel_router import channel_router
+from services.notification_queue import notification_queue
+
+logger = logging.getLogger(__name__)
+
+
+class ApprovedPostPublisher:
+    """
+    Publishes approved posts one at a time in the background. A bulk approval only flips statuses
+    and queues ids; sends are paced by the channel router's per-chat buckets, so approving a few
+    hundred posts drains at the channel's rate instead of running into flood limits. Posts still
+    'approved' after a restart are picked up again at start.
+    """
+
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self._bot = None
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    async def start(self, bot):
+        self._bot = bot
+        self.enqueue(await db.get_approved_post_ids())
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="approved_post_publisher")
+            logger.info(f"Approved post publisher started ({len(self)} posts waiting).")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def enqueue(self, post_ids: list):
+        for post_id in post_ids:
+            self._queue.put_nowait(post_id)
+
+    async def _run(self):
+        while True:
+            post_id = await self._queue.get()
+            try:
+                post = await db.get_post(post_id)
+                if not post or post['status'] != 'approved':
+                    continue
+                messages = await publishing.publish_post(self._bot, post)
+                link = message_formatter.build_post_link(channel_router.main_chat, messages[0].message_id) if messages else None
+                notification_queue.enqueue(post['user_id'], get_text("ad_approved", post['user_lang'], post_id=post_id)
+                                           + (f"\n{link}" if link else ""))
+            except Exception as e:
+                logger.error(f"Publishing approved post {post_id} failed: {e}", exc_info=True)
+                await db.update_post_status(post_id, 'failed_to_publish_exception')
+            finally:
+                self._queue.task_done()
+
+
+approved_post_publisher = PerBot(lambda bot: ApprovedPostPublisher())
+profiler.register_structure("moderation.approved_queue", lambda: len(approved_post_publisher))
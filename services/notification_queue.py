@@ -0,0 +1,91 @@
+# selling_bot/services/notification_queue.py
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+from telegram.constants import ParseMode
+from telegram.error import Forbidden, RetryAfter, BadRequest
+
+from config import NOTIFICATION_RATE_PER_SECOND, NOTIFICATION_QUEUE_SIZE
+from services import profiler
+from services.bot_context import PerBot
+from services.rate_limiter import AsyncTokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationQueue:
+    """
+    Fan-out queue for direct messages (saved-search alerts, ...). Producers enqueue without waiting
+    on the Bot API, a single worker drains the queue under a token bucket so alerts never eat
+    the flood budget that user-facing replies need.
+    """
+
+    def __init__(self, rate_per_second: float, max_size: int):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self._bucket = AsyncTokenBucket(rate_per_second)
+        self._worker: Optional[asyncio.Task] = None
+        self._bot = None
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    def start(self, bot):
+        self._bot = bot
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run(), name="notification_queue")
+            logger.info("Notification queue worker started.")
+
+    async def stop(self):
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+            if self._queue.qsize():
+                logger.warning(f"Notification queue stopped with {self._queue.qsize()} undelivered messages.")
+
+    def enqueue(self, chat_id: int, text: str, on_forbidden: Callable[[int], Awaitable[None]] = None) -> bool:
+        """Queues a Markdown message. Returns False (and drops it) if the queue is full."""
+        try:
+            self._queue.put_nowait((chat_id, text, on_forbidden))
+            return True
+        except asyncio.QueueFull:
+            logger.warning(f"Notification queue full, dropping message to {chat_id}.")
+            return False
+
+    async def _run(self):
+        while True:
+            chat_id, text, on_forbidden = await self._queue.get()
+            try:
+                await self._deliver(chat_id, text, on_forbidden)
+            except Exception as e:
+                logger.error(f"Notification to {chat_id} failed: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, chat_id: int, text: str, on_forbidden, attempts: int = 3):
+        for _ in range(attempts):
+            await self._bucket.acquire()
+            try:
+                await self._bot.send_message(chat_id, text, parse_mode=ParseMode.MARKDOWN,
+                                             disable_web_page_preview=True)
+                return
+            except RetryAfter as e:
+                logger.warning(f"Flood limit hit, pausing notifications for {e.retry_after}s.")
+                self._bucket.pause(float(e.retry_after))
+            except Forbidden: # User blocked the bot
+                if on_forbidden:
+                    await on_forbidden(chat_id)
+                return
+            except BadRequest as e:
+                if "parse" in str(e).lower(): # Broken Markdown in user text: fall back to plain text
+                    await self._bot.send_message(chat_id, text, disable_web_page_preview=True)
+                    return
+                raise
+
+
+notification_queue = PerBot(lambda bot: NotificationQueue(NOTIFICATION_RATE_PER_SECOND, NOTIFICATION_QUEUE_SIZE))
+profiler.register_structure("notification_queue.pending", lambda: len(notification_queue))
@@ -0,0 +1,24 @@
+# selling_bot/services/pagination.py
+from typing import Awaitable, Callable
+
+
+async def fetch_keyset_page(fetch: Callable[..., Awaitable[list]], cursor_id: int = None,
+                            direction: str = "next", page_size: int = 5) -> dict:
+    """
+    Keyset pagination over any newest-first listing.
+    `fetch(limit, before_id=None, after_id=None)` must return rows newest first with the post id in row[0].
+    `cursor_id` is the last id of the current page (direction "next") or its first id (direction "prev").
+    Result: {"rows": [...], "has_next": bool, "has_prev": bool}.
+    """
+    limit = page_size + 1 # One extra row tells us whether another page exists
+    if direction == "prev" and cursor_id is not None:
+        rows = await fetch(limit, after_id=cursor_id)
+        has_prev = len(rows) > page_size
+        rows = rows[-page_size:] # The extra row is the newest one, at the front
+        has_next = True
+    else:
+        rows = await fetch(limit, before_id=cursor_id)
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        has_prev = cursor_id is not None
+    return {"rows": rows, "has_next": has_next, "has_prev": has_prev}
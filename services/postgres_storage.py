@@ -0,0 +1,842 @@
+# selling_bot/services/postgres_storage.py
+"""
+PostgreSQL implementation of services/storage.py (STORAGE_BACKEND=postgres, DATABASE_URL), for keeping the
+data on a database server. Same tables and semantics as the SQLite backend:
+
+- One asyncpg connection pool per process (DB_POOL_MIN_SIZE..DB_POOL_MAX_SIZE connections), plus a
+  separate read-only pool (READ_POOL_SIZE) for browse reads, with READ_TIMEOUT as acquire and statement
+  timeout, so searches never hold the connections saving and publishing need.
+- Every query is a fixed SQL text with $n parameters, so asyncpg prepares it once per connection and
+  reuses the statement from its cache (DB_STATEMENT_CACHE_SIZE) on every later call.
+- Timestamps are kept as UTC text in the SQLite format ('YYYY-MM-DD HH:MM:SS'), which callers pass
+  and compare as strings. JSON columns are text too.
+- Search uses a generated tsvector column with a partial GIN index over published posts; the FTS5
+  queries built by search_service are translated to tsquery.
+- The dashboard summaries and the per-user post counters are kept by triggers, as in SQLite. Archive files and sharding are SQLite-only.
+- One bot worker per schema. The background services (broadcast resume, digests, approved-post publishing,
+  the in-memory saved searches and price sketches) assume they are the only writer of their rows, so a
+  worker holds an advisory lock on its schema while it runs (claim_worker) and a second one refuses to start.
+  The CLI tools (export, storage_check) don't take it and may run next to the bot.
+"""
+import json
+import logging
+import re
+
+try:
+    import asyncpg
+except ImportError: # asyncpg is only needed for this backend
+    asyncpg = None
+
+import config
+from constants import CAT_SPECIFIC_DATA_KEY, PARSED_VALUES_KEY
+from services.database_service import EXPORT_SELECT_COLUMNS, NUMERIC_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+NOW_TEXT = "to_char(timezone('UTC', now()), 'YYYY-MM-DD HH24:MI:SS')"
+SCHEMA_LOCK_KEY = 0x5e111b07 # Advisory lock: workers starting together create the schema one at a time
+WORKER_LOCK_KEY = 0x5e111b08 # Advisory lock (with the schema name's hash), held by the one bot worker of a schema
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS posts (
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    user_lang TEXT NOT NULL,
+    category TEXT NOT NULL,
+    title TEXT,
+    price TEXT,
+    location TEXT,
+    description TEXT,
+    media_files TEXT,
+    category_specific_data TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    created_at TEXT NOT NULL DEFAULT {NOW_TEXT},
+    channel_message_id BIGINT,
+    search_text TEXT,
+    search_fields TEXT,
+    price_amount DOUBLE PRECISION,
+    price_currency TEXT,
+    car_year INTEGER,
+    car_mileage_km INTEGER,
+    house_rooms INTEGER,
+    house_area_m2 DOUBLE PRECISION,
+    house_year_built INTEGER,
+    expires_at TEXT,
+    bumped_at TEXT,
+    channel_message_ids TEXT,
+    fingerprint TEXT,
+    idempotency_token TEXT,
+    search_vector tsvector GENERATED ALWAYS AS (to_tsvector('simple',
+        coalesce(search_text, '') || ' ' || coalesce(search_fields, '') || ' ' ||
+        coalesce(location, '') || ' ' || coalesce(description, ''))) STORED
+);
+CREATE INDEX IF NOT EXISTS idx_posts_search ON posts USING GIN (search_vector) WHERE status = 'published';
+CREATE UNIQUE INDEX IF NOT EXISTS idx_posts_idempotency ON posts (idempotency_token) WHERE idempotency_token IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_posts_user_history ON posts (user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_posts_expires ON posts (expires_at, id) WHERE status = 'published';
+CREATE INDEX IF NOT EXISTS idx_posts_pending_review ON posts (id) WHERE status = 'pending_review';
+CREATE INDEX IF NOT EXISTS idx_posts_approved ON posts (id) WHERE status = 'approved';
+CREATE INDEX IF NOT EXISTS idx_posts_fingerprint ON posts (fingerprint) WHERE status = 'published';
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id BIGINT PRIMARY KEY,
+    lang_code TEXT,
+    first_name TEXT,
+    username TEXT,
+    last_seen TEXT DEFAULT {NOW_TEXT},
+    blocked_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_users_reachable ON users (user_id) WHERE blocked_at IS NULL;
+
+CREATE TABLE IF NOT EXISTS post_stats_daily (
+    day TEXT NOT NULL,
+    category TEXT NOT NULL,
+    status TEXT NOT NULL,
+    post_count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, category, status)
+);
+CREATE TABLE IF NOT EXISTS post_stats_totals (
+    category TEXT NOT NULL,
+    status TEXT NOT NULL,
+    post_count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (category, status)
+);
+CREATE OR REPLACE FUNCTION post_stats_add(p_day TEXT, p_category TEXT, p_status TEXT, p_delta INTEGER) RETURNS void AS $$
+BEGIN
+    INSERT INTO post_stats_daily (day, category, status, post_count) VALUES (p_day, p_category, p_status, p_delta)
+    ON CONFLICT (day, category, status) DO UPDATE SET post_count = post_stats_daily.post_count + excluded.post_count;
+    INSERT INTO post_stats_totals (category, status, post_count) VALUES (p_category, p_status, p_delta)
+    ON CONFLICT (category, status) DO UPDATE SET post_count = post_stats_totals.post_count + excluded.post_count;
+END $$ LANGUAGE plpgsql;
+CREATE OR REPLACE FUNCTION post_stats_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM post_stats_add(left(OLD.created_at, 10), OLD.category, OLD.status, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM post_stats_add(left(NEW.created_at, 10), NEW.category, NEW.status, 1);
+    END IF;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+DROP TRIGGER IF EXISTS post_stats_insert_delete ON posts;
+CREATE TRIGGER post_stats_insert_delete AFTER INSERT OR DELETE ON posts
+    FOR EACH ROW EXECUTE FUNCTION post_stats_apply();
+DROP TRIGGER IF EXISTS post_stats_update ON posts;
+CREATE TRIGGER post_stats_update AFTER UPDATE OF status, category, created_at ON posts
+    FOR EACH ROW WHEN (OLD.status IS DISTINCT FROM NEW.status OR OLD.category IS DISTINCT FROM NEW.category
+                       OR OLD.created_at IS DISTINCT FROM NEW.created_at)
+    EXECUTE FUNCTION post_stats_apply();
+
+CREATE TABLE IF NOT EXISTS user_post_counts (
+    user_id BIGINT PRIMARY KEY,
+    post_count BIGINT NOT NULL DEFAULT 0
+);
+CREATE OR REPLACE FUNCTION user_post_counts_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO user_post_counts (user_id, post_count) VALUES (NEW.user_id, 1)
+        ON CONFLICT (user_id) DO UPDATE SET post_count = user_post_counts.post_count + 1;
+    ELSE
+        UPDATE user_post_counts SET post_count = post_count - 1 WHERE user_id = OLD.user_id;
+    END IF;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+DROP TRIGGER IF EXISTS user_post_counts_insert_delete ON posts;
+CREATE TRIGGER user_post_counts_insert_delete AFTER INSERT OR DELETE ON posts
+    FOR EACH ROW EXECUTE FUNCTION user_post_counts_apply();
+DO $$ BEGIN -- Backfill once; CREATE TRIGGER above keeps concurrent inserts out until this commits
+    IF NOT EXISTS (SELECT 1 FROM user_post_counts) THEN
+        INSERT INTO user_post_counts (user_id, post_count) SELECT user_id, COUNT(*) FROM posts GROUP BY user_id;
+    END IF;
+END $$;
+
+CREATE TABLE IF NOT EXISTS image_hashes (
+    post_id BIGINT NOT NULL,
+    file_unique_id TEXT NOT NULL,
+    phash BIGINT NOT NULL,
+    created_at TEXT DEFAULT {NOW_TEXT},
+    PRIMARY KEY (post_id, file_unique_id)
+);
+CREATE TABLE IF NOT EXISTS image_matches (
+    post_id BIGINT NOT NULL,
+    matched_post_id BIGINT NOT NULL,
+    distance INTEGER NOT NULL,
+    created_at TEXT DEFAULT {NOW_TEXT},
+    PRIMARY KEY (post_id, matched_post_id)
+);
+CREATE TABLE IF NOT EXISTS post_targets (
+    post_id BIGINT NOT NULL,
+    chat_id TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    message_ids TEXT,
+    error TEXT,
+    updated_at TEXT DEFAULT {NOW_TEXT},
+    PRIMARY KEY (post_id, chat_id)
+);
+
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    text TEXT NOT NULL,
+    created_by BIGINT,
+    status TEXT NOT NULL DEFAULT 'running',
+    last_user_id BIGINT NOT NULL DEFAULT 0,
+    sent INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    blocked INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT DEFAULT {NOW_TEXT},
+    finished_at TEXT
+);
+CREATE TABLE IF NOT EXISTS funnel_rollups (
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    bucket_start TEXT NOT NULL,
+    category TEXT NOT NULL,
+    from_state TEXT NOT NULL,
+    to_state TEXT NOT NULL,
+    transitions INTEGER NOT NULL,
+    total_ms DOUBLE PRECISION NOT NULL,
+    max_ms DOUBLE PRECISION,
+    duration_sketch TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_funnel_rollups_bucket ON funnel_rollups (bucket_start);
+CREATE TABLE IF NOT EXISTS subscriptions (
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    lang TEXT,
+    query_text TEXT NOT NULL,
+    category TEXT,
+    tokens TEXT,
+    price_min DOUBLE PRECISION,
+    price_max DOUBLE PRECISION,
+    currency TEXT,
+    active BOOLEAN NOT NULL DEFAULT TRUE,
+    created_at TEXT DEFAULT {NOW_TEXT}
+);
+CREATE INDEX IF NOT EXISTS idx_subscriptions_user ON subscriptions (user_id, active);
+CREATE TABLE IF NOT EXISTS rate_limits (
+    scope TEXT NOT NULL,
+    user_id BIGINT NOT NULL,
+    event_times TEXT NOT NULL,
+    PRIMARY KEY (scope, user_id)
+);
+CREATE TABLE IF NOT EXISTS digest_queue (
+    post_id BIGINT PRIMARY KEY,
+    category TEXT NOT NULL,
+    queued_at TEXT DEFAULT {NOW_TEXT}
+);
+CREATE INDEX IF NOT EXISTS idx_digest_queue_category ON digest_queue (category, post_id);
+CREATE TABLE IF NOT EXISTS price_sketches (
+    category TEXT NOT NULL,
+    group_key TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    sketch TEXT NOT NULL,
+    updated_at TEXT DEFAULT {NOW_TEXT},
+    PRIMARY KEY (category, group_key, currency)
+);
+"""
+
+_FTS_TERM_RE = re.compile(r'"([^"]+)"(\*?)')
+_SUBSCRIPTION_COLUMNS = "id, user_id, lang, query_text, category, tokens, price_min, price_max, currency"
+_POST_COLUMNS = ("id, user_id, user_lang, category, status, search_text, media_files, channel_message_id, "
+                 "channel_message_ids, created_at, expires_at, bumped_at, price, location, description, "
+                 "category_specific_data, price_amount, price_currency, search_fields")
+
+
+def fts_to_tsquery(fts_query: str) -> str:
+    """'"toyota" "cam"*' (search_service.build_fts_query) -> "'toyota' & 'cam':*"."""
+    return " & ".join(f"'{word}'" + (":*" if prefix else "") for word, prefix in _FTS_TERM_RE.findall(fts_query))
+
+
+def _subscription_from_row(row) -> dict:
+    return {
+        "id": row[0], "user_id": row[1], "lang": row[2], "query_text": row[3], "category": row[4],
+        "tokens": row[5].split() if row[5] else [], "price_min": row[6], "price_max": row[7], "currency": row[8],
+    }
+
+
+class PostgresStorage:
+    EXPORT_SELECT_COLUMNS = EXPORT_SELECT_COLUMNS
+
+    def __init__(self, dsn: str, schema: str = None, min_size: int = None, max_size: int = None):
+        if asyncpg is None:
+            raise RuntimeError("STORAGE_BACKEND=postgres needs the asyncpg package (pip install asyncpg).")
+        if not dsn:
+            raise RuntimeError("STORAGE_BACKEND=postgres needs DATABASE_URL.")
+        self.dsn = dsn
+        self.schema = schema # Tables go to this schema instead of the default search_path (tests, storage_check)
+        self.min_size = min_size or config.DB_POOL_MIN_SIZE
+        self.max_size = max_size or config.DB_POOL_MAX_SIZE
+        self._pool = None
+        self._read_pool = None
+        self._worker_lock = None # Connection holding WORKER_LOCK_KEY while this process is the schema's bot worker
+
+    async def init_db(self):
+        """Opens the pool and creates the tables, functions and triggers that don't exist yet."""
+        if self._pool is None:
+            server_settings = {"search_path": self.schema} if self.schema else None
+            if self.schema:
+                connection = await asyncpg.connect(self.dsn)
+                try:
+                    await connection.execute(f'CREATE SCHEMA IF NOT EXISTS "{self.schema}"')
+                finally:
+                    await connection.close()
+            self._pool = await asyncpg.create_pool(self.dsn, min_size=self.min_size, max_size=self.max_size,
+                                                   statement_cache_size=config.DB_STATEMENT_CACHE_SIZE,
+                                                   server_settings=server_settings)
+            self._read_pool = await asyncpg.create_pool(
+                self.dsn, min_size=1, max_size=config.READ_POOL_SIZE,
+                statement_cache_size=config.DB_STATEMENT_CACHE_SIZE,
+                server_settings={**(server_settings or {}), "default_transaction_read_only": "on",
+                                 "statement_timeout": str(int(config.READ_TIMEOUT * 1000))}
+            )
+        async with self._pool.acquire() as connection:
+            async with connection.transaction():
+                await connection.execute(f"SELECT pg_advisory_xact_lock({SCHEMA_LOCK_KEY})")
+                await connection.execute(SCHEMA)
+        logger.info("Database initialized/checked successfully.")
+
+    async def claim_worker(self):
+        """
+        Takes the schema's worker lock for as long as the storage is open. Raises if another bot worker
+        already holds it: only one may run per schema.
+        """
+        if self._worker_lock is not None:
+            return
+        connection = await asyncpg.connect(self.dsn, server_settings={"search_path": self.schema} if self.schema else None)
+        if not await connection.fetchval("SELECT pg_try_advisory_lock($1, hashtext(current_schema()))", WORKER_LOCK_KEY):
+            await connection.close()
+            raise RuntimeError(f"Another bot worker is already running on schema '{self.schema or 'public'}'; "
+                               "only one worker per schema is supported.")
+        self._worker_lock = connection
+
+    async def close_db(self):
+        if self._worker_lock is not None:
+            await self._worker_lock.close() # Releases the worker lock
+            self._worker_lock = None
+        if self._pool is not None:
+            await self._pool.close()
+            await self._read_pool.close()
+            self._pool = self._read_pool = None
+
+    async def _read(self, method: str, query: str, *args):
+        """Browse read on the read-only pool: fetch/fetchval through one connection, TimeoutError past READ_TIMEOUT."""
+        async with self._read_pool.acquire(timeout=config.READ_TIMEOUT) as connection:
+            try:
+                return await getattr(connection, method)(query, *args, timeout=config.READ_TIMEOUT)
+            except asyncpg.QueryCanceledError as e: # The server's statement_timeout fired first
+                raise TimeoutError(f"Read took longer than {config.READ_TIMEOUT}s") from e
+
+    async def drop_schema(self):
+        """Drops the schema given at construction with everything in it (disposable check databases)."""
+        if not self.schema:
+            raise ValueError("No schema of its own to drop.")
+        await self._pool.execute(f'DROP SCHEMA IF EXISTS "{self.schema}" CASCADE')
+
+    async def analyze(self):
+        """
+        Refreshes the planner statistics. Autovacuum does this once a table has grown, but until then a
+        freshly loaded one (the storage_check benchmark) is planned as if empty: searches then bitmap-scan
+        every match and sort instead of walking the primary key backwards.
+        """
+        await self._pool.execute("ANALYZE")
+
+    # --- Posts ---
+
+    async def save_post(self, user_data: dict, rendered_text: str = None, fingerprint: str = None,
+                        idempotency_token: str = None) -> int | None:
+        category_specific_data = user_data.get(CAT_SPECIFIC_DATA_KEY, {})
+        parsed_values = user_data.get(PARSED_VALUES_KEY, {})
+        post_id = await self._pool.fetchval(
+            """
+            INSERT INTO posts (user_id, user_lang, category, price, location, description, media_files,
+                               category_specific_data, status, title, search_text, search_fields,
+                               price_amount, price_currency, car_year, car_mileage_km,
+                               house_rooms, house_area_m2, house_year_built, fingerprint, idempotency_token)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, 'pending', $9, $10, $11, $12, $13, $14, $15, $16, $17, $18, $19, $20)
+            ON CONFLICT (idempotency_token) WHERE idempotency_token IS NOT NULL DO NOTHING
+            RETURNING id
+            """,
+            user_data['user_id'], user_data.get('lang', config.DEFAULT_LANGUAGE), user_data['category'],
+            user_data.get('price'), user_data.get('location'), user_data.get('description'),
+            json.dumps(user_data.get('media_files', [])), json.dumps(category_specific_data), user_data.get('title'),
+            rendered_text, " ".join(str(value) for value in category_specific_data.values() if value),
+            *(parsed_values.get(column) for column in NUMERIC_COLUMNS), fingerprint, idempotency_token
+        )
+        if post_id is None:
+            logger.warning(f"Post with idempotency token {idempotency_token} already saved, not saving again.")
+            return None
+        logger.info(f"Post {post_id} saved for user {user_data['user_id']}.")
+        return post_id
+
+    async def update_post_status(self, post_id: int, status: str, channel_message_id: int = None,
+                                 channel_message_ids: list = None):
+        if channel_message_id:
+            await self._pool.execute(
+                "UPDATE posts SET status = $1, channel_message_id = $2, channel_message_ids = $3 WHERE id = $4",
+                status, channel_message_id, json.dumps(channel_message_ids or [channel_message_id]), post_id
+            )
+        else:
+            await self._pool.execute("UPDATE posts SET status = $1 WHERE id = $2", status, post_id)
+        logger.info(f"Post {post_id} status updated to {status}.")
+
+    async def get_post(self, post_id: int) -> dict | None:
+        row = await self._pool.fetchrow(f"SELECT {_POST_COLUMNS} FROM posts WHERE id = $1", post_id)
+        if row is None:
+            return None
+        post = dict(row)
+        post['media_files'] = json.loads(post['media_files']) if post['media_files'] else []
+        post['category_specific_data'] = json.loads(post['category_specific_data']) if post['category_specific_data'] else {}
+        if post['channel_message_ids']:
+            post['channel_message_ids'] = json.loads(post['channel_message_ids'])
+        else:
+            post['channel_message_ids'] = [post['channel_message_id']] if post['channel_message_id'] else []
+        return post
+
+    async def set_post_expiry(self, post_id: int, expires_at: str, channel_message_ids: list = None,
+                              bumped_at: str = None):
+        if bumped_at:
+            await self._pool.execute(
+                """
+                UPDATE posts SET status = 'published', channel_message_id = $1, channel_message_ids = $2,
+                                 bumped_at = $3, expires_at = $4
+                WHERE id = $5
+                """,
+                channel_message_ids[0] if channel_message_ids else None, json.dumps(channel_message_ids or []),
+                bumped_at, expires_at, post_id
+            )
+        else:
+            await self._pool.execute("UPDATE posts SET expires_at = $1 WHERE id = $2", expires_at, post_id)
+
+    async def get_expiring_posts(self, until: str, after: tuple, limit: int) -> list:
+        rows = await self._pool.fetch(
+            """
+            SELECT id, expires_at FROM posts
+            WHERE status = 'published' AND expires_at <= $1 AND (expires_at, id) > ($2, $3)
+            ORDER BY expires_at, id LIMIT $4
+            """,
+            until, after[0], after[1], limit
+        )
+        return [tuple(row) for row in rows]
+
+    async def expire_posts(self, due: list) -> list:
+        if not due:
+            return []
+        rows = await self._pool.fetch(
+            """
+            UPDATE posts p SET status = 'expired'
+            FROM unnest($1::bigint[], $2::text[]) AS d (id, expires_at)
+            WHERE p.id = d.id AND p.status = 'published' AND p.expires_at = d.expires_at
+            RETURNING p.id
+            """,
+            [post_id for post_id, _ in due], [expires_at for _, expires_at in due]
+        )
+        expired = [row[0] for row in rows]
+        if expired:
+            logger.info(f"{len(expired)} posts expired.")
+        return expired
+
+    async def find_duplicate_post(self, fingerprint: str, user_id: int) -> int | None:
+        return await self._pool.fetchval(
+            "SELECT id FROM posts WHERE fingerprint = $1 AND status = 'published' AND user_id = $2 ORDER BY id DESC LIMIT 1",
+            fingerprint, user_id
+        )
+
+    async def update_published_post(self, post_id: int, user_id: int, fields: dict, rendered_text: str) -> bool:
+        assignments = ", ".join(f"{name} = ${i}" for i, name in enumerate(fields, start=1))
+        n = len(fields)
+        status = await self._pool.execute(
+            f"UPDATE posts SET {assignments}, search_text = ${n + 1} WHERE id = ${n + 2} AND user_id = ${n + 3} AND status = 'published'",
+            *fields.values(), rendered_text, post_id, user_id
+        )
+        return status != "UPDATE 0"
+
+    async def mark_posts_sold(self, post_ids: list, user_id: int) -> list:
+        rows = await self._pool.fetch(
+            "UPDATE posts SET status = 'sold' WHERE id = ANY($1::bigint[]) AND user_id = $2 "
+            "AND status IN ('published', 'expired') RETURNING id",
+            post_ids, user_id
+        )
+        sold = sorted((row[0] for row in rows), key=post_ids.index)
+        if sold:
+            logger.info(f"User {user_id} marked posts {sold} as sold.")
+        return sold
+
+    async def search_posts(self, fts_query: str, limit: int, before_id: int = None, after_id: int = None) -> list:
+        if after_id is not None:
+            keyset, params, order = "AND id > $2", (after_id, limit), "ASC"
+        elif before_id is not None:
+            keyset, params, order = "AND id < $2", (before_id, limit), "DESC"
+        else:
+            keyset, params, order = "", (limit,), "DESC"
+        rows = await self._read(
+            "fetch",
+            f"""
+            SELECT id, category, search_fields, price, location, channel_message_id FROM posts
+            WHERE status = 'published' AND search_vector @@ to_tsquery('simple', $1) {keyset}
+            ORDER BY id {order} LIMIT ${len(params) + 1}
+            """,
+            fts_to_tsquery(fts_query), *params
+        )
+        rows = [tuple(row) for row in rows]
+        return rows if order == "DESC" else rows[::-1]
+
+    async def search_posts_with_media(self, fts_query: str, limit: int, before_id: int = None) -> list:
+        keyset, params = ("AND id < $2", (before_id, limit)) if before_id else ("", (limit,))
+        rows = await self._read(
+            "fetch",
+            f"""
+            SELECT id, category, search_fields, price, location, search_text, media_files FROM posts
+            WHERE status = 'published' AND search_vector @@ to_tsquery('simple', $1) {keyset}
+            ORDER BY id DESC LIMIT ${len(params) + 1}
+            """,
+            fts_to_tsquery(fts_query), *params
+        )
+        return [(*row[:6], json.loads(row[6]) if row[6] else []) for row in rows]
+
+    async def get_user_posts(self, user_id: int, limit: int, before_id: int = None, after_id: int = None) -> list:
+        if after_id is not None:
+            keyset, order = "AND (created_at, id) > (SELECT created_at, id FROM posts WHERE id = $2)", "ASC"
+        elif before_id is not None:
+            keyset, order = "AND (created_at, id) < (SELECT created_at, id FROM posts WHERE id = $2)", "DESC"
+        else:
+            keyset, order = "", "DESC"
+        cursor_params = (after_id if after_id is not None else before_id,) if keyset else ()
+        rows = await self._read(
+            "fetch",
+            f"""
+            SELECT id, category, status, created_at, price FROM posts
+            WHERE user_id = $1 {keyset}
+            ORDER BY created_at {order}, id {order} LIMIT ${len(cursor_params) + 2}
+            """,
+            user_id, *cursor_params, limit
+        )
+        rows = [tuple(row) for row in rows]
+        return rows if order == "DESC" else rows[::-1]
+
+    async def get_user_post_count(self, user_id: int) -> int:
+        """Total posts of a user, from the trigger-maintained counter."""
+        return await self._read("fetchval", "SELECT post_count FROM user_post_counts WHERE user_id = $1", user_id) or 0
+
+    async def iter_listed_prices(self):
+        async with self._pool.acquire() as connection:
+            async with connection.transaction():
+                async for row in connection.cursor(
+                    """
+                    SELECT category, category_specific_data, price_amount, price_currency FROM posts
+                    WHERE price_amount IS NOT NULL AND status IN ('published', 'expired', 'sold')
+                    """
+                ):
+                    yield row[0], json.loads(row[1]) if row[1] else {}, row[2], row[3]
+
+    async def iter_posts_for_export(self, chunk_size: int, date_from: str = None, date_to: str = None,
+                                    category: str = None, status: str = None, archive_paths: list = ()):
+        """Keyset chunks in id order, each its own query (no transaction held open). Archive files are SQLite-only."""
+        if archive_paths:
+            logger.warning(f"Export ignores {len(archive_paths)} SQLite archive files on the postgres backend.")
+        conditions, params = ["id > $1"], []
+        for clause, value in (("created_at >= ", date_from), ("created_at < ", date_to),
+                              ("category = ", category), ("status = ", status)):
+            if value:
+                params.append(value)
+                conditions.append(f"{clause}${len(params) + 1}")
+        query = (f"SELECT {', '.join(EXPORT_SELECT_COLUMNS)} FROM posts WHERE {' AND '.join(conditions)} "
+                 f"ORDER BY id LIMIT ${len(params) + 2}")
+        last_id = 0
+        while True:
+            rows = [dict(row) for row in await self._pool.fetch(query, last_id, *params, chunk_size)]
+            if rows:
+                yield rows
+            if len(rows) < chunk_size:
+                break
+            last_id = rows[-1]["id"]
+
+    # --- Moderation ---
+
+    async def get_review_page(self, after_id: int, limit: int) -> list:
+        rows = await self._pool.fetch(
+            """
+            SELECT id, user_id, user_lang, category, search_text FROM posts
+            WHERE status = 'pending_review' AND id > $1 ORDER BY id LIMIT $2
+            """,
+            after_id, limit
+        )
+        return [tuple(row) for row in rows]
+
+    async def count_pending_review(self) -> int:
+        return await self._pool.fetchval("SELECT COUNT(*) FROM posts WHERE status = 'pending_review'")
+
+    async def set_review_status(self, post_ids: list, from_status: str, to_status: str) -> list:
+        rows = await self._pool.fetch(
+            "UPDATE posts SET status = $1 WHERE id = ANY($2::bigint[]) AND status = $3 RETURNING id",
+            to_status, post_ids, from_status
+        )
+        return sorted((row[0] for row in rows), key=post_ids.index)
+
+    async def get_approved_post_ids(self) -> list:
+        return [row[0] for row in await self._pool.fetch("SELECT id FROM posts WHERE status = 'approved' ORDER BY id")]
+
+    # --- Dashboard ---
+
+    async def get_post_stats(self, since_day: str) -> tuple:
+        totals = await self._read("fetch", "SELECT category, status, post_count FROM post_stats_totals WHERE post_count > 0")
+        daily = await self._read(
+            "fetch",
+            "SELECT day, category, status, post_count FROM post_stats_daily WHERE day >= $1 AND post_count > 0 ORDER BY day DESC",
+            since_day
+        )
+        return [tuple(row) for row in totals], [tuple(row) for row in daily]
+
+    async def rebuild_post_stats(self, archive_paths: list = ()) -> int:
+        """Recounts the summaries from posts in one transaction; writers of posts wait for it."""
+        if archive_paths:
+            logger.warning(f"Stats rebuild ignores {len(archive_paths)} SQLite archive files on the postgres backend.")
+        async with self._pool.acquire() as connection:
+            async with connection.transaction():
+                await connection.execute("LOCK TABLE posts IN SHARE MODE")
+                await connection.execute("DELETE FROM post_stats_daily")
+                await connection.execute("DELETE FROM post_stats_totals")
+                await connection.execute("""
+                    INSERT INTO post_stats_daily (day, category, status, post_count)
+                    SELECT left(created_at, 10), category, status, COUNT(*) FROM posts GROUP BY 1, 2, 3
+                """)
+                await connection.execute("""
+                    INSERT INTO post_stats_totals (category, status, post_count)
+                    SELECT category, status, SUM(post_count) FROM post_stats_daily GROUP BY 1, 2
+                """)
+                total = await connection.fetchval("SELECT COALESCE(SUM(post_count), 0) FROM post_stats_totals")
+        logger.info(f"Post stats rebuilt from {total} posts.")
+        return total
+
+    # --- Users ---
+
+    async def get_user_pref_lang(self, user_id: int) -> str | None:
+        return await self._pool.fetchval("SELECT lang_code FROM users WHERE user_id = $1", user_id)
+
+    async def set_user_pref_lang(self, user_id: int, lang_code: str, first_name: str, username: str | None):
+        await self._pool.execute(
+            f"""
+            INSERT INTO users (user_id, lang_code, first_name, username, last_seen) VALUES ($1, $2, $3, $4, {NOW_TEXT})
+            ON CONFLICT (user_id) DO UPDATE SET lang_code = excluded.lang_code, first_name = excluded.first_name,
+                username = excluded.username, last_seen = excluded.last_seen, blocked_at = NULL
+            """,
+            user_id, lang_code, first_name, username
+        )
+        logger.info(f"User {user_id} language preference set to {lang_code}.")
+
+    # --- Publishing targets and digests ---
+
+    async def reset_post_targets(self, post_id: int, chat_ids: list):
+        async with self._pool.acquire() as connection:
+            async with connection.transaction():
+                await connection.execute("DELETE FROM post_targets WHERE post_id = $1", post_id)
+                await connection.executemany(
+                    "INSERT INTO post_targets (post_id, chat_id) VALUES ($1, $2) ON CONFLICT DO NOTHING",
+                    [(post_id, str(chat_id)) for chat_id in chat_ids]
+                )
+
+    async def update_post_target(self, post_id: int, chat_id, status: str, message_ids: list = None,
+                                 error: str = None):
+        await self._pool.execute(
+            f"""
+            UPDATE post_targets SET status = $1, message_ids = $2, error = $3, updated_at = {NOW_TEXT}
+            WHERE post_id = $4 AND chat_id = $5
+            """,
+            status, json.dumps(message_ids) if message_ids else None, error, post_id, str(chat_id)
+        )
+
+    async def get_post_targets(self, post_id: int) -> list:
+        rows = await self._pool.fetch(
+            "SELECT chat_id, status, message_ids, error FROM post_targets WHERE post_id = $1", post_id
+        )
+        return [{"chat_id": chat_id, "status": status, "message_ids": json.loads(message_ids) if message_ids else [],
+                 "error": error} for chat_id, status, message_ids, error in rows]
+
+    async def enqueue_digest(self, post_id: int, category: str):
+        await self._pool.execute(
+            "INSERT INTO digest_queue (post_id, category) VALUES ($1, $2) ON CONFLICT DO NOTHING", post_id, category
+        )
+
+    async def get_digest_batch(self, category: str, limit: int) -> list:
+        rows = await self._pool.fetch(
+            """
+            SELECT q.post_id, p.status, p.search_fields, p.price, p.location
+            FROM digest_queue q LEFT JOIN posts p ON p.id = q.post_id
+            WHERE q.category = $1 ORDER BY q.post_id LIMIT $2
+            """,
+            category, limit
+        )
+        return [tuple(row) for row in rows]
+
+    async def remove_from_digest(self, post_ids: list):
+        await self._pool.execute("DELETE FROM digest_queue WHERE post_id = ANY($1::bigint[])", post_ids)
+
+    async def record_digest_targets(self, post_ids: list, chat_id, message_ids: list):
+        async with self._pool.acquire() as connection:
+            async with connection.transaction():
+                await connection.execute("DELETE FROM post_targets WHERE post_id = ANY($1::bigint[])", post_ids)
+                await connection.executemany(
+                    "INSERT INTO post_targets (post_id, chat_id, status, message_ids) VALUES ($1, $2, 'digest', $3)",
+                    [(post_id, str(chat_id), json.dumps(message_ids)) for post_id in post_ids]
+                )
+
+    async def count_digest_queue(self) -> dict:
+        return dict(await self._pool.fetch("SELECT category, COUNT(*) FROM digest_queue GROUP BY category"))
+
+    # --- Subscriptions ---
+
+    async def add_subscription(self, sub: dict) -> int:
+        sub_id = await self._pool.fetchval(
+            """
+            INSERT INTO subscriptions (user_id, lang, query_text, category, tokens, price_min, price_max, currency)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8) RETURNING id
+            """,
+            sub["user_id"], sub["lang"], sub["query_text"], sub["category"], " ".join(sub["tokens"]),
+            sub["price_min"], sub["price_max"], sub["currency"]
+        )
+        logger.info(f"Subscription {sub_id} saved for user {sub['user_id']}: {sub['query_text']}")
+        return sub_id
+
+    async def iter_active_subscriptions(self):
+        async with self._pool.acquire() as connection:
+            async with connection.transaction():
+                async for row in connection.cursor(f"SELECT {_SUBSCRIPTION_COLUMNS} FROM subscriptions WHERE active"):
+                    yield _subscription_from_row(row)
+
+    async def get_user_subscriptions(self, user_id: int) -> list:
+        rows = await self._pool.fetch(
+            f"SELECT {_SUBSCRIPTION_COLUMNS} FROM subscriptions WHERE user_id = $1 AND active ORDER BY id", user_id
+        )
+        return [_subscription_from_row(row) for row in rows]
+
+    async def deactivate_subscription(self, sub_id: int, user_id: int) -> bool:
+        status = await self._pool.execute(
+            "UPDATE subscriptions SET active = FALSE WHERE id = $1 AND user_id = $2 AND active", sub_id, user_id
+        )
+        return status != "UPDATE 0"
+
+    async def deactivate_user_subscriptions(self, user_id: int) -> list:
+        rows = await self._pool.fetch(
+            "UPDATE subscriptions SET active = FALSE WHERE user_id = $1 AND active RETURNING id", user_id
+        )
+        return sorted(row[0] for row in rows)
+
+    # --- Broadcasts ---
+
+    async def create_broadcast(self, text: str, created_by: int) -> int:
+        return await self._pool.fetchval(
+            "INSERT INTO broadcasts (text, created_by) VALUES ($1, $2) RETURNING id", text, created_by
+        )
+
+    async def get_broadcast(self, broadcast_id: int = None) -> dict | None:
+        if broadcast_id:
+            row = await self._pool.fetchrow("SELECT * FROM broadcasts WHERE id = $1", broadcast_id)
+        else:
+            row = await self._pool.fetchrow("SELECT * FROM broadcasts ORDER BY id DESC LIMIT 1")
+        return dict(row) if row else None
+
+    async def get_running_broadcast_id(self) -> int | None:
+        return await self._pool.fetchval("SELECT id FROM broadcasts WHERE status = 'running' ORDER BY id LIMIT 1")
+
+    async def get_broadcast_recipients(self, after_user_id: int, limit: int) -> list:
+        rows = await self._pool.fetch(
+            "SELECT user_id, lang_code FROM users WHERE blocked_at IS NULL AND user_id > $1 ORDER BY user_id LIMIT $2",
+            after_user_id, limit
+        )
+        return [tuple(row) for row in rows]
+
+    async def checkpoint_broadcast(self, broadcast_id: int, last_user_id: int, sent: int, failed: int,
+                                   blocked_user_ids: list):
+        async with self._pool.acquire() as connection:
+            async with connection.transaction():
+                await connection.execute(
+                    """
+                    UPDATE broadcasts SET last_user_id = $1, sent = sent + $2, failed = failed + $3, blocked = blocked + $4
+                    WHERE id = $5
+                    """,
+                    last_user_id, sent, failed, len(blocked_user_ids), broadcast_id
+                )
+                await connection.execute(f"UPDATE users SET blocked_at = {NOW_TEXT} WHERE user_id = ANY($1::bigint[])",
+                                         blocked_user_ids)
+
+    async def finish_broadcast(self, broadcast_id: int, status: str):
+        await self._pool.execute(
+            f"UPDATE broadcasts SET status = $1, finished_at = {NOW_TEXT} WHERE id = $2 AND status = 'running'",
+            status, broadcast_id
+        )
+
+    # --- State saved by in-memory services ---
+
+    async def save_image_hash(self, post_id: int, file_unique_id: str, phash: int, matches: list):
+        async with self._pool.acquire() as connection:
+            async with connection.transaction():
+                await connection.execute(
+                    """
+                    INSERT INTO image_hashes (post_id, file_unique_id, phash) VALUES ($1, $2, $3)
+                    ON CONFLICT (post_id, file_unique_id) DO UPDATE SET phash = excluded.phash
+                    """,
+                    post_id, file_unique_id, phash
+                )
+                if matches:
+                    await connection.executemany(
+                        """
+                        INSERT INTO image_matches (post_id, matched_post_id, distance) VALUES ($1, $2, $3)
+                        ON CONFLICT (post_id, matched_post_id) DO UPDATE
+                        SET distance = LEAST(image_matches.distance, excluded.distance)
+                        """,
+                        [(post_id, matched_post_id, distance) for matched_post_id, distance in matches]
+                    )
+
+    async def iter_image_hashes(self):
+        async with self._pool.acquire() as connection:
+            async with connection.transaction():
+                async for row in connection.cursor(
+                    "SELECT h.post_id, p.user_id, h.phash FROM image_hashes h JOIN posts p ON p.id = h.post_id"
+                ):
+                    yield tuple(row)
+
+    async def save_funnel_rollups(self, rows: list):
+        await self._pool.executemany(
+            """
+            INSERT INTO funnel_rollups (bucket_start, category, from_state, to_state,
+                                        transitions, total_ms, max_ms, duration_sketch)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+            """,
+            [(*row[:7], json.dumps(row[7])) for row in rows]
+        )
+        logger.info(f"Flushed {len(rows)} funnel rollup rows.")
+
+    async def get_funnel_rollups(self, since: str) -> list:
+        rows = await self._pool.fetch(
+            "SELECT category, from_state, to_state, duration_sketch FROM funnel_rollups WHERE bucket_start >= $1", since
+        )
+        return [(row[0], row[1], row[2], json.loads(row[3] or "{}")) for row in rows]
+
+    async def save_rate_limit_state(self, rows: list):
+        async with self._pool.acquire() as connection:
+            async with connection.transaction():
+                await connection.executemany(
+                    """
+                    INSERT INTO rate_limits (scope, user_id, event_times) VALUES ($1, $2, $3)
+                    ON CONFLICT (scope, user_id) DO UPDATE SET event_times = excluded.event_times
+                    """,
+                    [row for row in rows if row[2] != "[]"]
+                )
+                await connection.executemany(
+                    "DELETE FROM rate_limits WHERE scope = $1 AND user_id = $2", [row[:2] for row in rows if row[2] == "[]"]
+                )
+
+    async def iter_rate_limit_state(self):
+        for row in await self._pool.fetch("SELECT scope, user_id, event_times FROM rate_limits"):
+            yield tuple(row)
+
+    async def save_price_sketches(self, rows: list):
+        await self._pool.executemany(
+            f"""
+            INSERT INTO price_sketches (category, group_key, currency, sketch) VALUES ($1, $2, $3, $4)
+            ON CONFLICT (category, group_key, currency) DO UPDATE SET sketch = excluded.sketch, updated_at = {NOW_TEXT}
+            """,
+            [(*row[:3], json.dumps(row[3])) for row in rows]
+        )
+
+    async def iter_price_sketches(self):
+        for row in await self._pool.fetch("SELECT category, group_key, currency, sketch FROM price_sketches"):
+            yield row[0], row[1], row[2], json.loads(row[3])
@@ -0,0 +1,108 @@
+# selling_bot/services/price_hints.py
+import logging
+import re
+from typing import Optional, Tuple
+
+import config
+from localization import strings
+from services.storage import storage as db
+from services import profiler
+from services.bot_context import PerBot
+from services.quantile_sketch import QuantileSketch
+
+logger = logging.getLogger(__name__)
+
+WHOLE_CATEGORY = "*"
+MAX_GROUP_KEY_LENGTH = 64
+# The field whose value narrows the price range within a category
+GROUP_FIELDS = {"cars": "car_make_model", "houses": "house_property_type"}
+# Property types are saved as localized button labels; every language's label maps back to one key
+_PROPERTY_TYPES = {text.casefold(): key for texts in strings.values() for key, text in texts.items()
+                   if key.startswith("property_type_")}
+
+# (category, group_key) -> currency -> price sketch. Updated as ads are published, never by scanning posts;
+# changed entries are saved by flush_price_hints(). Per bot: each one's ads have their own price ranges.
+_sketches = PerBot(lambda bot: {})
+_dirty = PerBot(lambda bot: set())
+profiler.register_structure("price_hints.sketches", lambda: len(_sketches))
+
+
+def group_key(category: str, category_specific_data: dict) -> Optional[str]:
+    """Normalized make/model or property type of an ad, None if its category isn't grouped or the field is empty."""
+    field = GROUP_FIELDS.get(category)
+    value = (category_specific_data or {}).get(field) if field else None
+    if not value:
+        return None
+    value = re.sub(r"\s+", " ", str(value)).strip().casefold()
+    return _PROPERTY_TYPES.get(value, value)[:MAX_GROUP_KEY_LENGTH] or None
+
+
+def record_price(category: str, category_specific_data: dict, amount: float, currency: str):
+    """Adds a listed price to the category's sketch and to its make/model or property type sketch."""
+    if amount is None or amount <= 0:
+        return
+    currency = currency or ""
+    for group in (WHOLE_CATEGORY, group_key(category, category_specific_data)):
+        if group is None:
+            continue
+        per_currency = _sketches.setdefault((category, group), {})
+        sketch = per_currency.get(currency)
+        if sketch is None:
+            sketch = per_currency[currency] = QuantileSketch()
+        sketch.add(amount)
+        _dirty.add((category, group, currency))
+
+
+def get_hint(category: str, category_specific_data: dict) -> Optional[Tuple[float, float, str]]:
+    """
+    (p25, p75, currency) of similar ads: the make/model or property type if it has enough samples,
+    else the whole category, in the currency most of them used. None without enough data.
+    """
+    for group in (group_key(category, category_specific_data), WHOLE_CATEGORY):
+        per_currency = _sketches.get((category, group)) if group else None
+        if not per_currency:
+            continue
+        currency, sketch = max(per_currency.items(), key=lambda item: item[1].count)
+        if sketch.count >= config.PRICE_HINT_MIN_SAMPLES:
+            return sketch.quantile(0.25), sketch.quantile(0.75), currency
+    return None
+
+
+def format_amount(amount: float) -> str:
+    """Three significant digits with thousands separators: 15234 -> 15,200."""
+    if amount >= 1000:
+        digits = len(str(int(amount)))
+        amount = round(amount, 3 - digits)
+    return f"{amount:,.0f}" if amount >= 10 else f"{amount:,.2g}"
+
+
+async def load_price_hints():
+    """Restores the saved sketches; seeds them from the listed ads when nothing was saved yet."""
+    count = 0
+    async for category, group, currency, sketch_data in db.iter_price_sketches():
+        _sketches.setdefault((category, group), {})[currency] = QuantileSketch.from_dict(sketch_data)
+        count += 1
+    if count:
+        logger.info(f"Restored {count} price sketches.")
+        return
+    async for category, category_specific_data, amount, currency in db.iter_listed_prices():
+        record_price(category, category_specific_data, amount, currency)
+        count += 1
+    if count:
+        logger.info(f"Price sketches seeded from {count} listed ads.")
+        await flush_price_hints()
+
+
+async def flush_price_hints(context=None):
+    """Saves the changed sketches (JobQueue callback, also called on shutdown)."""
+    if not _dirty:
+        return
+    dirty = _dirty.copy() # Taken first so prices recorded during the write are saved next time
+    _dirty.clear()
+    rows = [(category, group, currency, _sketches[(category, group)][currency].to_dict())
+            for category, group, currency in dirty]
+    try:
+        await db.save_price_sketches(rows)
+    except Exception as e:
+        logger.error(f"Failed to save price sketches, retrying at the next flush: {e}")
+        _dirty.update(dirty)
@@ -0,0 +1,175 @@
+# selling_bot/services/profiler.py
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from config import PROFILE_OUTPUT_DIR, PROFILE_SAMPLE_INTERVAL, PROFILE_MAX_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Frames from these module prefixes are treated as "our" handlers when attributing samples.
+HANDLER_MODULE_PREFIX = "handlers."
+IDLE_LABEL = "<idle>"
+OTHER_LABEL = "<other>"
+
+# Only one profiling window may run at a time. Nothing here is touched while profiling is off,
+# so the hot path pays nothing except this module being imported.
+_active_lock = asyncio.Lock()
+
+# name -> zero-arg callable returning a size (entries, bytes, ...). Caches register themselves here
+# so a profiling window can show which in-memory structures grow.
+_tracked_structures: Dict[str, Callable[[], int]] = {}
+
+
+class _StackSampler(threading.Thread):
+    """Background thread that periodically samples the event loop thread's Python stack."""
+
+    def __init__(self, target_thread_id: int, interval: float):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.target_thread_id = target_thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.per_handler: Counter = Counter()
+        self.sample_count = 0
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.target_thread_id)
+            if frame is None:
+                continue
+            self._record(frame)
+
+    def _record(self, frame):
+        labels = []
+        handler = None
+        while frame is not None:
+            code = frame.f_code
+            module = frame.f_globals.get("__name__", "?")
+            labels.append(f"{module}:{code.co_name}")
+            if module.startswith(HANDLER_MODULE_PREFIX):
+                handler = code.co_name  # Keeps overwriting, so we end up with the outermost handler frame
+            frame = frame.f_back
+        labels.reverse()  # Root first, as collapsed-stack format expects
+
+        if handler is None:
+            # Loop sitting in select()/epoll with nothing to run is idle time, everything else is framework work
+            leaf = labels[-1] if labels else ""
+            handler = IDLE_LABEL if leaf.endswith((":select", ":poll", ":_run_once")) else OTHER_LABEL
+        self.stacks[";".join([handler] + labels)] += 1
+        self.per_handler[handler] += 1
+        self.sample_count += 1
+
+
+def is_running() -> bool:
+    return _active_lock.locked()
+
+
+def register_structure(name: str, size_fn: Callable[[], int]):
+    """Registers an in-memory structure whose size is reported in the memory diff of a profiling window."""
+    _tracked_structures[name] = size_fn
+
+
+def measure_structures(extra: Optional[Callable[[], Dict[str, int]]] = None) -> Dict[str, int]:
+    sizes = {}
+    for name, size_fn in _tracked_structures.items():
+        try:
+            sizes[name] = int(size_fn())
+        except Exception as e:
+            logger.warning(f"Could not measure structure {name}: {e}")
+    if extra:
+        sizes.update(extra())
+    return sizes
+
+
+def _write_collapsed(path: str, stacks: Counter):
+    """Writes stacks in Brendan Gregg's collapsed format (flamegraph.pl / speedscope compatible)."""
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+def _write_memory_report(path: str, diff_stats, structures_before: Dict[str, int], structures_after: Dict[str, int],
+                         top_n: int = 30):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("# Tracked structures (before -> after, delta)\n")
+        for name in sorted(set(structures_before) | set(structures_after)):
+            before = structures_before.get(name, 0)
+            after = structures_after.get(name, 0)
+            f.write(f"{name}: {before} -> {after} ({after - before:+d})\n")
+        f.write(f"\n# Top {top_n} allocation sites by growth\n")
+        for stat in diff_stats[:top_n]:
+            f.write(f"{stat}\n")
+
+
+def _write_reports(stacks_path: str, memory_path: str, stacks: Counter, snapshot_before, snapshot_after,
+                   structures_before: Dict[str, int], structures_after: Dict[str, int]):
+    """Diffs the snapshots and writes both report files (runs in a worker thread)."""
+    _write_collapsed(stacks_path, stacks)
+    diff_stats = snapshot_after.compare_to(snapshot_before, "lineno")
+    _write_memory_report(memory_path, diff_stats, structures_before, structures_after)
+
+
+async def run_profile_window(seconds: float,
+                             structure_probe: Optional[Callable[[], Dict[str, int]]] = None) -> Dict[str, str]:
+    """
+    Samples the event loop thread for `seconds` and takes a tracemalloc diff over the same window.
+    Must be awaited from the event loop thread. Returns a dict with output paths and a short summary.
+    """
+    if _active_lock.locked():
+        raise RuntimeError("A profiling window is already running.")
+
+    seconds = max(1.0, min(float(seconds), PROFILE_MAX_SECONDS))
+    async with _active_lock:
+        os.makedirs(PROFILE_OUTPUT_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        stacks_path = os.path.join(PROFILE_OUTPUT_DIR, f"profile-{stamp}.collapsed")
+        memory_path = os.path.join(PROFILE_OUTPUT_DIR, f"memory-{stamp}.txt")
+
+        started_tracemalloc = not tracemalloc.is_tracing()
+        if started_tracemalloc:
+            tracemalloc.start(10)
+        try:
+            # Snapshots, the diff and the report files are slow in a big process: off the loop, so updates keep flowing
+            snapshot_before = await asyncio.to_thread(tracemalloc.take_snapshot)
+            structures_before = measure_structures(structure_probe)
+
+            sampler = _StackSampler(threading.get_ident(), PROFILE_SAMPLE_INTERVAL)
+            started_at = time.monotonic()
+            sampler.start()
+            logger.info(f"Profiling window started for {seconds:.0f}s (interval {PROFILE_SAMPLE_INTERVAL * 1000:.0f} ms).")
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                sampler.stop()
+                sampler.join()
+            elapsed = time.monotonic() - started_at
+            structures_after = measure_structures(structure_probe)
+            snapshot_after = await asyncio.to_thread(tracemalloc.take_snapshot)
+        finally:
+            if started_tracemalloc:
+                tracemalloc.stop()  # Back to zero overhead
+
+        await asyncio.to_thread(_write_reports, stacks_path, memory_path, sampler.stacks, snapshot_before, snapshot_after,
+                                structures_before, structures_after)
+
+        summary_lines = [f"{sampler.sample_count} samples over {elapsed:.1f}s"]
+        for handler, count in sampler.per_handler.most_common(10):
+            share = 100.0 * count / sampler.sample_count if sampler.sample_count else 0.0
+            summary_lines.append(f"{handler}: {share:.1f}%")
+        for name in sorted(structures_after):
+            delta = structures_after[name] - structures_before.get(name, 0)
+            summary_lines.append(f"{name}: {structures_after[name]} ({delta:+d})")
+
+        logger.info(f"Profiling window finished. Stacks: {stacks_path}, memory: {memory_path}")
+        return {"stacks_path": stacks_path, "memory_path": memory_path, "summary": "\n".join(summary_lines)}
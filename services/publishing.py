@@ -0,0 +1,45 @@
+# selling_bot/services/publishing.py
+import logging
+
+from services.storage import storage as db
+from services import message_formatter
+from services import expiry_scheduler
+from services import image_hashing
+from services import price_hints
+from services import subscriptions
+from services.channel_router import channel_router
+from services.digest import digest_publisher
+
+logger = logging.getLogger(__name__)
+
+
+async def publish_post(bot, post: dict) -> list:
+    """
+    Publishes a saved post (database_service.get_post): sends it to the channels, or queues it for
+    its category's digest, marks it published, starts its lifetime and hands it to the background
+    pipelines (photo hashing, price hints, saved-search alerts). Returns the main channel messages ([] for a
+    digest). Raises if the main send fails; the post status is then left to the caller.
+    """
+    if digest_publisher.handles(post['category']):
+        await digest_publisher.enqueue(post['id'], post['category'])
+        messages = []
+    else: # Main chat first; channels routed for this category and language follow in the background
+        messages = await channel_router.publish(bot, post['id'], post['search_text'], post['media_files'],
+                                                post['category'], post['user_lang'])
+    await db.update_post_status(post['id'], 'published', messages[0].message_id if messages else None,
+                                [message.message_id for message in messages])
+    await expiry_scheduler.schedule_post(post['id'])
+    image_hashing.pipeline.enqueue_post(post['id'], post['user_id'], post['media_files'])
+    price_hints.record_price(post['category'], post['category_specific_data'], post['price_amount'], post['price_currency'])
+    subscriptions.notify_matching_subscribers(
+        {
+            "id": post['id'], "user_id": post['user_id'], "category": post['category'],
+            "price_amount": post['price_amount'], "price_currency": post['price_currency'],
+            "location": post['location'], "description": post['description'],
+            "search_fields": post['search_fields'],
+        },
+        post['search_text'],
+        message_formatter.build_post_link(channel_router.main_chat, messages[0].message_id) if messages
+        else message_formatter.build_ad_deep_link(bot.username, post['id'])
+    )
+    return messages
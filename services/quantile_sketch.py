@@ -0,0 +1,96 @@
+# selling_bot/services/quantile_sketch.py
+import math
+from typing import Dict, Optional
+
+
+class QuantileSketch:
+    """
+    Log-bucketed (DDSketch-style) quantile sketch for positive values.
+    Quantiles are within `relative_accuracy` of the true value, memory grows with log(max/min),
+    and two sketches with the same accuracy merge by adding bucket counts.
+    """
+
+    MIN_INDEXABLE = 1e-9
+
+    def __init__(self, relative_accuracy: float = 0.02):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, float] = {}
+        self.zero_count = 0.0
+        self.count = 0.0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def _key(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, key: int) -> float:
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value: float, weight: float = 1.0):
+        if value is None or value < 0:
+            return
+        if value <= self.MIN_INDEXABLE:
+            self.zero_count += weight
+        else:
+            key = self._key(value)
+            self.buckets[key] = self.buckets.get(key, 0.0) + weight
+        self.count += weight
+        self.sum += value * weight
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "QuantileSketch"):
+        if other.count == 0:
+            return
+        if abs(other.gamma - self.gamma) > 1e-12:
+            raise ValueError("Cannot merge sketches with different relative accuracy.")
+        for key, weight in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0.0) + weight
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Returns the approximate q-quantile (0 <= q <= 1), or None if the sketch is empty."""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        running = self.zero_count
+        for key in sorted(self.buckets):
+            running += self.buckets[key]
+            if running > rank:
+                # Clamp to the observed range so p0/p100 are exact
+                return min(max(self._value(key), self.min), self.max)
+        return self.max
+
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def to_dict(self) -> dict:
+        return {
+            "a": self.relative_accuracy,
+            "b": {str(k): v for k, v in self.buckets.items()},
+            "z": self.zero_count,
+            "n": self.count,
+            "s": self.sum,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QuantileSketch":
+        sketch = cls(data.get("a", 0.02))
+        sketch.buckets = {int(k): v for k, v in data.get("b", {}).items()}
+        sketch.zero_count = data.get("z", 0.0)
+        sketch.count = data.get("n", 0.0)
+        sketch.sum = data.get("s", 0.0)
+        sketch.min = data.get("min")
+        sketch.max = data.get("max")
+        return sketch
@@ -0,0 +1,57 @@
+# selling_bot/services/rate_limiter.py
+import asyncio
+import time
+
+
+class AsyncTokenBucket:
+    """
+    Token bucket for pacing outgoing API calls: `rate` tokens per second, bursts up to `capacity`.
+    acquire() waits (without blocking the event loop) until a token is available.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0):
+        async with self._lock: # Waiters are served in order
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Drains the bucket so nothing goes out for `seconds` (e.g. after a RetryAfter from Telegram)."""
+        self._refill()
+        self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+
+class ChatBuckets:
+    """
+    One AsyncTokenBucket per chat, created on first use: `per_minute` messages into any one chat, in bursts
+    of up to a tenth of that. Everything that sends to or edits in a chat draws from its bucket.
+    """
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self._buckets = {}
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def get(self, chat_id) -> AsyncTokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = AsyncTokenBucket(self.per_minute / 60.0,
+                                                               capacity=max(1.0, self.per_minute / 6.0))
+        return bucket
@@ -0,0 +1,89 @@
+# selling_bot/services/search_service.py
+import logging
+import re
+import time
+
+from config import INLINE_RESULTS_PER_PAGE, INLINE_CACHE_SIZE, INLINE_CACHE_TTL
+from services.storage import storage as db
+from services import profiler
+from services.bot_context import PerBot
+from services.pagination import fetch_keyset_page
+from services.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+SEARCH_PAGE_SIZE = 5
+MAX_QUERY_TOKENS = 8
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# (normalized FTS query, offset) -> (rows, next_offset). Inline queries arrive on every keystroke,
+# and most of them repeat what someone typed a moment ago. One cache per bot, each searches its own ads.
+_inline_cache = PerBot(lambda bot: TTLCache(INLINE_CACHE_SIZE, INLINE_CACHE_TTL))
+profiler.register_structure("search_service.inline_cache", lambda: len(_inline_cache))
+
+
+def build_fts_query(text: str, prefix_last: bool = False) -> str | None:
+    """
+    Turns free user text into a safe FTS5 query: every word is quoted (so FTS syntax like
+    AND/NEAR/* in user input is treated literally) and words are ANDed together.
+    With prefix_last the last word also matches as a prefix ("toyo" -> toyota), for as-you-type search.
+    """
+    tokens = _TOKEN_RE.findall(text.lower())[:MAX_QUERY_TOKENS]
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    if prefix_last and len(tokens[-1]) >= 2: # The FTS index keeps 2- and 3-char prefixes
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+async def search_page(text: str, cursor_id: int = None, direction: str = "next",
+                      page_size: int = SEARCH_PAGE_SIZE, prefix_last: bool = False) -> dict:
+    """
+    Returns one page of published posts matching `text`, newest first.
+    `cursor_id` is the last id of the current page (direction "next") or the first one (direction "prev").
+    Result: {"rows": [...], "has_next": bool, "has_prev": bool}.
+    """
+    fts_query = build_fts_query(text, prefix_last=prefix_last)
+    if not fts_query:
+        return {"rows": [], "has_next": False, "has_prev": False}
+
+    started = time.perf_counter()
+    page = await fetch_keyset_page(
+        lambda limit, **keyset: db.search_posts(fts_query, limit, **keyset), cursor_id, direction, page_size
+    )
+    logger.debug(f"Search {fts_query!r} ({direction}, cursor {cursor_id}) took {(time.perf_counter() - started) * 1000:.1f} ms")
+    return page
+
+
+def inline_cache_key(text: str, offset: str = "") -> tuple | None:
+    fts_query = build_fts_query(text, prefix_last=True)
+    return (fts_query, offset or "") if fts_query else None
+
+
+def get_cached_inline_results(text: str, offset: str = ""):
+    """Cached (rows, next_offset) for an inline query, or None on a miss."""
+    key = inline_cache_key(text, offset)
+    return _inline_cache.get(key) if key else None
+
+
+async def inline_search(text: str, offset: str = "") -> tuple:
+    """
+    Results for an inline query: (rows, next_offset). `offset` is the last post id of the previous
+    batch (Telegram hands back whatever next_offset we gave it), so paging is keyset-based too.
+    """
+    key = inline_cache_key(text, offset)
+    if not key:
+        return [], ""
+    cached = _inline_cache.get(key)
+    if cached is not None:
+        return cached
+    fts_query, _ = key
+    before_id = int(offset) if offset and offset.isdigit() else None
+    started = time.perf_counter()
+    rows = await db.search_posts_with_media(fts_query, INLINE_RESULTS_PER_PAGE, before_id=before_id)
+    next_offset = str(rows[-1][0]) if len(rows) == INLINE_RESULTS_PER_PAGE else ""
+    logger.debug(f"Inline search {fts_query!r} (offset {offset!r}) took {(time.perf_counter() - started) * 1000:.1f} ms")
+    result = (rows, next_offset)
+    _inline_cache.set(key, result)
+    return result
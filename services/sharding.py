@@ -0,0 +1,80 @@
+# selling_bot/services/sharding.py
+"""
+Changes how many SQLite files posts and users are split over (config.SHARD_COUNT). Stop the bot first,
+run the tool, then start the bot with the new SHARD_COUNT:
+
+    python -m services.sharding --reshard 4
+    python -m services.sharding --status
+
+Users are moved to the shard of their hash bucket together with their posts (and each post's targets
+and photo hashes). Posts whose id doesn't encode their user's bucket, i.e. saved before sharding, are
+listed in post_buckets. Every step is idempotent: an interrupted run is finished by running it again.
+SHARD_COUNT applies to every hosted bot, so with several bots (config.BOTS) run it once per --bot.
+"""
+import argparse
+import asyncio
+import logging
+import os
+
+import config
+from services import database_service as db
+from services import bot_context
+
+logger = logging.getLogger(__name__)
+
+
+async def reshard(shard_count: int) -> int:
+    """Moves the data from the stored split to shard_count files. Returns how many posts moved."""
+    if not 1 <= shard_count <= config.SHARD_BUCKETS:
+        raise ValueError(f"The shard count must be between 1 and {config.SHARD_BUCKETS}.")
+    current_count = await db.get_stored_shard_count()
+    paths = db.shard_paths(max(current_count, shard_count))
+    await db.init_shard_files(paths)
+    for path in paths:
+        added = await db.record_post_buckets(path)
+        if added:
+            logger.info(f"{added} posts of {path} listed in post_buckets.")
+
+    moved = 0
+    for source_index, source in enumerate(paths):
+        for target_index, target in enumerate(paths[:shard_count]):
+            if target_index == source_index:
+                continue
+            belongs = lambda user_id, target_index=target_index: db.user_bucket(user_id) % shard_count == target_index
+            count = await db.move_shard_rows(source, target, belongs)
+            if count:
+                logger.info(f"Moved {count} posts from {source} to {target}.")
+            moved += count
+
+    # New ids of a bucket must stay above every id it had in its previous shard
+    sequence = max([await db.get_posts_sequence(path) for path in paths])
+    for path in paths[:shard_count]:
+        await db.set_posts_sequence(path, sequence)
+    await db.store_shard_count(shard_count)
+    for path in paths[shard_count:]: # Emptied by the moves above
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    logger.info(f"Resharded from {current_count} to {shard_count} shard(s), {moved} posts moved.")
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split posts and users over a different number of database files.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--reshard", type=int, metavar="N", help="Move the data to N shard files (stop the bot first)")
+    group.add_argument("--status", action="store_true", help="Print the current number of shards")
+    bot_context.add_bot_argument(parser)
+    args = parser.parse_args()
+    bot_context.select_bot(args)
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    if args.status:
+        count = asyncio.run(db.get_stored_shard_count())
+        print(f"{count} shard(s): {', '.join(db.shard_paths(count))}")
+    else:
+        asyncio.run(reshard(args.reshard))
+        print(f"Done. Start the bot with SHARD_COUNT={args.reshard}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# selling_bot/services/spam_limiter.py
+import json
+import logging
+import time
+from array import array
+from typing import Dict, List, Tuple
+
+import config
+from services.storage import storage as db
+from services import profiler
+from services.bot_context import PerBot
+
+logger = logging.getLogger(__name__)
+
+
+class SlidingWindowLimiter:
+    """
+    Per-user sliding-window limits, e.g. [(3, 600), (10, 86400)] = at most 3 events in any
+    10 minutes and 10 in any day. Each user has a ring buffer of their last N event times
+    (N = the largest limit): an event is allowed when, for every rule, the limit-th most recent
+    event is older than the window. Checks are O(number of rules), memory is 8 bytes * N per user.
+    """
+
+    def __init__(self, scope: str, rules: List[Tuple[int, float]]):
+        self.scope = scope
+        self.rules = sorted(rules)
+        self.capacity = max(limit for limit, _ in rules)
+        self.longest_window = max(window for _, window in rules)
+        self._buffers: Dict[int, list] = {} # user_id -> [array of times, next slot, count]
+        self._dirty = set()
+
+    def __len__(self) -> int:
+        return len(self._buffers)
+
+    def _nth_latest(self, buffer: list, n: int) -> float | None:
+        times, head, count = buffer
+        return times[(head - n) % self.capacity] if count >= n else None
+
+    def retry_after(self, user_id: int, now: float = None) -> float:
+        """Seconds until the user may act again (0 if allowed now)."""
+        buffer = self._buffers.get(user_id)
+        if buffer is None:
+            return 0.0
+        now = now if now is not None else time.time()
+        wait = 0.0
+        for limit, window in self.rules:
+            oldest = self._nth_latest(buffer, limit)
+            if oldest is not None and now - oldest < window:
+                wait = max(wait, oldest + window - now)
+        return wait
+
+    def record(self, user_id: int, now: float = None):
+        buffer = self._buffers.get(user_id)
+        if buffer is None:
+            buffer = self._buffers[user_id] = [array("d", [0.0] * self.capacity), 0, 0]
+        times, head, count = buffer
+        times[head] = now if now is not None else time.time()
+        buffer[1] = (head + 1) % self.capacity
+        buffer[2] = min(count + 1, self.capacity)
+        self._dirty.add(user_id)
+
+    def hit(self, user_id: int, now: float = None) -> float:
+        """Records the event if allowed. Returns 0 if it was, otherwise the seconds to wait."""
+        now = now if now is not None else time.time()
+        wait = self.retry_after(user_id, now)
+        if not wait:
+            self.record(user_id, now)
+        return wait
+
+    def events(self, user_id: int) -> List[float]:
+        """The user's remembered event times, oldest first."""
+        buffer = self._buffers.get(user_id)
+        if buffer is None:
+            return []
+        return [self._nth_latest(buffer, n) for n in range(buffer[2], 0, -1)]
+
+    def take_dirty(self, now: float = None) -> List[Tuple[int, List[float]]]:
+        """(user_id, recent times) of users changed since the last call; forgets users idle past every window."""
+        now = now if now is not None else time.time()
+        changed = [(user_id, [t for t in self.events(user_id) if now - t < self.longest_window])
+                   for user_id in self._dirty if user_id in self._buffers]
+        self._dirty.clear()
+        for user_id, buffer in list(self._buffers.items()):
+            if now - self._nth_latest(buffer, 1) >= self.longest_window:
+                del self._buffers[user_id]
+        return changed
+
+    def load(self, user_id: int, times: List[float]):
+        for moment in sorted(times)[-self.capacity:]:
+            self.record(user_id, moment)
+        self._dirty.discard(user_id)
+
+
+post_limiter = PerBot(lambda bot: SlidingWindowLimiter("posts", config.POST_RATE_LIMITS))
+update_limiter = PerBot(lambda bot: SlidingWindowLimiter("updates", config.UPDATE_RATE_LIMITS))
+LIMITERS = (post_limiter, update_limiter)
+for _limiter in LIMITERS:
+    profiler.register_structure(f"spam_limiter.{_limiter.scope}", lambda limiter=_limiter: len(limiter))
+
+
+async def load_limits():
+    """Restores the recent events saved before the last restart."""
+    limiters = {limiter.scope: limiter for limiter in LIMITERS}
+    now = time.time()
+    count = 0
+    async for scope, user_id, times_json in db.iter_rate_limit_state():
+        limiter = limiters.get(scope)
+        if limiter is not None:
+            limiter.load(user_id, [t for t in json.loads(times_json) if now - t < limiter.longest_window])
+            count += 1
+    logger.info(f"Restored rate-limit windows of {count} users.")
+
+
+async def flush_limits(context=None):
+    """Saves changed windows (JobQueue callback, also called on shutdown)."""
+    rows = []
+    for limiter in LIMITERS:
+        rows.extend((limiter.scope, user_id, json.dumps(times)) for user_id, times in limiter.take_dirty())
+    if rows:
+        await db.save_rate_limit_state(rows)
@@ -0,0 +1,116 @@
+# selling_bot/services/storage.py
+"""
+The storage interface the handlers and services use, and the backend chosen by config.STORAGE_BACKEND:
+
+    sqlite    services/database_service.py, files next to the bot (default)
+    postgres  services/postgres_storage.py, a database server (one bot worker per schema)
+
+Code that runs inside the bot imports `from services.storage import storage as db`. The SQLite file tools
+(services/archive.py, services/sharding.py) work on database_service directly and only apply to that
+backend. tests/test_storage.py runs the same conformance tests on either one.
+
+With several bots in the process (services/bot_context.py) SQLite picks the current bot's files itself;
+on PostgreSQL each bot with data of its own gets a storage object, and so a pool, on a schema named after it.
+"""
+from typing import AsyncIterator, Protocol
+
+import config
+from services.bot_context import PerBot
+
+
+class Storage(Protocol):
+    EXPORT_SELECT_COLUMNS: tuple
+
+    async def init_db(self): ...
+    async def close_db(self): ...
+
+    # Posts
+    async def save_post(self, user_data: dict, rendered_text: str = None, fingerprint: str = None,
+                        idempotency_token: str = None) -> int | None: ...
+    async def update_post_status(self, post_id: int, status: str, channel_message_id: int = None,
+                                 channel_message_ids: list = None): ...
+    async def get_post(self, post_id: int) -> dict | None: ...
+    async def set_post_expiry(self, post_id: int, expires_at: str, channel_message_ids: list = None,
+                              bumped_at: str = None): ...
+    async def get_expiring_posts(self, until: str, after: tuple, limit: int) -> list: ...
+    async def expire_posts(self, due: list) -> list: ...
+    async def find_duplicate_post(self, fingerprint: str, user_id: int) -> int | None: ...
+    async def update_published_post(self, post_id: int, user_id: int, fields: dict, rendered_text: str) -> bool: ...
+    async def mark_posts_sold(self, post_ids: list, user_id: int) -> list: ...
+    async def search_posts(self, fts_query: str, limit: int, before_id: int = None, after_id: int = None) -> list: ...
+    async def search_posts_with_media(self, fts_query: str, limit: int, before_id: int = None) -> list: ...
+    async def get_user_posts(self, user_id: int, limit: int, before_id: int = None, after_id: int = None) -> list: ...
+    async def get_user_post_count(self, user_id: int) -> int: ...
+    def iter_listed_prices(self) -> AsyncIterator[tuple]: ...
+    def iter_posts_for_export(self, chunk_size: int, date_from: str = None, date_to: str = None,
+                              category: str = None, status: str = None,
+                              archive_paths: list = ()) -> AsyncIterator[list]: ...
+
+    # Moderation
+    async def get_review_page(self, after_id: int, limit: int) -> list: ...
+    async def count_pending_review(self) -> int: ...
+    async def set_review_status(self, post_ids: list, from_status: str, to_status: str) -> list: ...
+    async def get_approved_post_ids(self) -> list: ...
+
+    # Dashboard
+    async def get_post_stats(self, since_day: str) -> tuple: ...
+    async def rebuild_post_stats(self, archive_paths: list = ()) -> int: ...
+
+    # Users
+    async def get_user_pref_lang(self, user_id: int) -> str | None: ...
+    async def set_user_pref_lang(self, user_id: int, lang_code: str, first_name: str, username: str | None): ...
+
+    # Publishing targets and digests
+    async def reset_post_targets(self, post_id: int, chat_ids: list): ...
+    async def update_post_target(self, post_id: int, chat_id, status: str, message_ids: list = None,
+                                 error: str = None): ...
+    async def get_post_targets(self, post_id: int) -> list: ...
+    async def enqueue_digest(self, post_id: int, category: str): ...
+    async def get_digest_batch(self, category: str, limit: int) -> list: ...
+    async def remove_from_digest(self, post_ids: list): ...
+    async def record_digest_targets(self, post_ids: list, chat_id, message_ids: list): ...
+    async def count_digest_queue(self) -> dict: ...
+
+    # Subscriptions
+    async def add_subscription(self, sub: dict) -> int: ...
+    def iter_active_subscriptions(self) -> AsyncIterator[dict]: ...
+    async def get_user_subscriptions(self, user_id: int) -> list: ...
+    async def deactivate_subscription(self, sub_id: int, user_id: int) -> bool: ...
+    async def deactivate_user_subscriptions(self, user_id: int) -> list: ...
+
+    # Broadcasts
+    async def create_broadcast(self, text: str, created_by: int) -> int: ...
+    async def get_broadcast(self, broadcast_id: int = None) -> dict | None: ...
+    async def get_running_broadcast_id(self) -> int | None: ...
+    async def get_broadcast_recipients(self, after_user_id: int, limit: int) -> list: ...
+    async def checkpoint_broadcast(self, broadcast_id: int, last_user_id: int, sent: int, failed: int,
+                                   blocked_user_ids: list): ...
+    async def finish_broadcast(self, broadcast_id: int, status: str): ...
+
+    # State saved by in-memory services
+    async def save_image_hash(self, post_id: int, file_unique_id: str, phash: int, matches: list): ...
+    def iter_image_hashes(self) -> AsyncIterator[tuple]: ...
+    async def save_funnel_rollups(self, rows: list): ...
+    async def get_funnel_rollups(self, since: str) -> list: ...
+    async def save_rate_limit_state(self, rows: list): ...
+    def iter_rate_limit_state(self) -> AsyncIterator[tuple]: ...
+    async def save_price_sketches(self, rows: list): ...
+    def iter_price_sketches(self) -> AsyncIterator[tuple]: ...
+
+
+STORAGE_BACKENDS = ("sqlite", "postgres")
+
+
+def create_storage(backend: str = None, **options) -> Storage:
+    """The backend's storage object; options go to the server backend (dsn, schema, pool sizes)."""
+    backend = backend or config.STORAGE_BACKEND
+    if backend == "sqlite":
+        from services import database_service # The module itself implements the interface
+        return database_service
+    if backend == "postgres":
+        from services.postgres_storage import PostgresStorage
+        return PostgresStorage(options.pop("dsn", None) or config.DATABASE_URL, **options)
+    raise ValueError(f"Unknown storage backend '{backend}' (available: {', '.join(STORAGE_BACKENDS)}).")
+
+
+storage: Storage = create_storage() if config.STORAGE_BACKEND == "sqlite" else PerBot(lambda bot: create_storage(schema=bot.data))
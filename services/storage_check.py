@@ -0,0 +1,142 @@
+# selling_bot/services/storage_check.py
+"""
+Benchmark of the storage backends (services/storage.py): throughput and latency percentiles of the hot
+operations. Both backends' behaviour is covered by the conformance tests in tests/test_storage.py.
+
+    python -m services.storage_check                                   # SQLite, in a temporary directory
+    python -m services.storage_check --backend postgres --dsn postgresql://localhost/scratch
+    python -m services.storage_check --benchmark 5000 --concurrency 32
+
+The last benchmark step measures isolation: the same saves alone, then while `--concurrency` browse
+readers search and page through /myads nonstop. Save latency should stay close to the idle figures.
+
+Runs only against disposable storage: SQLite in a temporary directory, PostgreSQL in a schema of its
+own that is dropped afterwards (the database itself is left alone).
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+import time
+import uuid
+
+from constants import CAT_SPECIFIC_DATA_KEY, PARSED_VALUES_KEY
+from services.storage import STORAGE_BACKENDS, create_storage
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_WORDS = ("toyota", "camry", "house", "garden", "sedan", "villa", "diesel", "central")
+ISOLATION_WRITERS = 4 # Concurrent saves in the isolation step, about what a busy bot sees
+
+
+def _post(user_id: int, category: str, text: str, token: str = None, amount: float = None) -> tuple:
+    """(user_data, rendered_text, fingerprint, idempotency_token) for save_post."""
+    user_data = {"user_id": user_id, "lang": "en", "category": category, "price": f"{amount or 1}$",
+                 "location": "Tashkent", "description": text, "media_files": [{"type": "photo", "file_id": "f1"}],
+                 CAT_SPECIFIC_DATA_KEY: {"car_make_model": "Toyota Camry"},
+                 PARSED_VALUES_KEY: {"price_amount": amount, "price_currency": "USD" if amount else None}}
+    return user_data, text, None, token
+
+
+async def _timed(latencies: list, operation):
+    started = time.perf_counter()
+    await operation
+    latencies.append((time.perf_counter() - started) * 1000)
+
+
+async def _measure(name: str, operations: list, concurrency: int):
+    """Runs the awaitables with at most `concurrency` in flight and prints ops/s and latency percentiles."""
+    semaphore, latencies = asyncio.Semaphore(concurrency), []
+
+    async def limited(operation):
+        async with semaphore:
+            await _timed(latencies, operation)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(limited(operation) for operation in operations))
+    elapsed = time.perf_counter() - started
+    p50, p95, p99 = (statistics.quantiles(latencies, n=100)[i] for i in (49, 94, 98)) if len(latencies) > 1 else latencies * 3
+    print(f"  {name:<18} {len(latencies) / elapsed:>9.0f} ops/s   p50 {p50:7.2f} ms   p95 {p95:7.2f} ms   p99 {p99:7.2f} ms")
+
+
+async def _browse(db, users: list, worker: int, stop: asyncio.Event, counts: dict):
+    """One browse reader looping over searches and /myads pages until stopped."""
+    i = worker
+    while not stop.is_set():
+        i += 1
+        try:
+            if i % 2:
+                await db.search_posts(f'"{BENCHMARK_WORDS[i % len(BENCHMARK_WORDS)]}"', 5)
+            else:
+                await db.get_user_posts(users[i % len(users)], 5)
+            counts["done"] += 1
+        except TimeoutError:
+            counts["timed_out"] += 1
+
+
+async def run_benchmark(db, count: int, concurrency: int):
+    users = [3000 + i for i in range(max(1, count // 20))]
+    post_ids = []
+
+    async def save(i):
+        user_id = users[i % len(users)]
+        post_id = await db.save_post(*_post(user_id, "bench", " ".join(BENCHMARK_WORDS[j % len(BENCHMARK_WORDS)]
+                                                                        for j in range(i, i + 3)), None, 1000 + i))
+        await db.update_post_status(post_id, "published", channel_message_id=post_id)
+        post_ids.append(post_id)
+
+    await _measure("save + publish", [save(i) for i in range(count)], concurrency)
+    if hasattr(db, "analyze"): # PostgreSQL: plan the reads on the loaded data, as autovacuum soon would
+        await db.analyze()
+    await _measure("get_post", [db.get_post(post_ids[i % len(post_ids)]) for i in range(count)], concurrency)
+    await _measure("search", [db.search_posts(f'"{BENCHMARK_WORDS[i % len(BENCHMARK_WORDS)]}"', 5) for i in range(count)],
+                   concurrency)
+    await _measure("get_user_posts", [db.get_user_posts(users[i % len(users)], 5) for i in range(count)], concurrency)
+    await _measure("mixed 9:1 read", [db.get_post(post_ids[i % len(post_ids)]) if i % 10 else save(count + i)
+                                      for i in range(count)], concurrency)
+
+    writes = max(2, count // 4)
+    await _measure("save, idle", [save(2 * count + i) for i in range(writes)], ISOLATION_WRITERS)
+    stop, counts = asyncio.Event(), {"done": 0, "timed_out": 0}
+    readers = [asyncio.create_task(_browse(db, users, worker, stop, counts)) for worker in range(concurrency)]
+    try:
+        await _measure("save, browse load", [save(3 * count + i) for i in range(writes)], ISOLATION_WRITERS)
+    finally:
+        stop.set()
+        await asyncio.gather(*readers)
+    print(f"  {'':<18} browse reads meanwhile: {counts['done']} done, {counts['timed_out']} timed out")
+
+
+async def main_async(args):
+    if args.backend == "postgres":
+        db = create_storage("postgres", dsn=args.dsn, schema=f"storage_check_{uuid.uuid4().hex[:8]}")
+    else:
+        from services import database_service
+        directory = tempfile.mkdtemp(prefix="storage_check_")
+        database_service.DATABASE_NAME = os.path.join(directory, "check.db")
+        db = create_storage("sqlite")
+    await db.init_db()
+    try:
+        print(f"Benchmark ({args.backend}, {args.benchmark} operations each, {args.concurrency} concurrent):")
+        await run_benchmark(db, args.benchmark, args.concurrency)
+    finally:
+        if args.backend == "postgres":
+            await db.drop_schema()
+        await db.close_db()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the storage benchmark on a disposable database.")
+    parser.add_argument("--backend", choices=STORAGE_BACKENDS, default="sqlite")
+    parser.add_argument("--dsn", help="PostgreSQL server to use (a temporary schema is created and dropped)")
+    parser.add_argument("--benchmark", type=int, default=1000, metavar="N", help="Operations per benchmark step")
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.WARNING)
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
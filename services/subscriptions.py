@@ -0,0 +1,241 @@
+# selling_bot/services/subscriptions.py
+import bisect
+import logging
+import math
+import re
+from typing import Dict, List, Optional, Set
+
+import config
+from localization import get_text
+from services.storage import storage as db
+from services import profiler
+from services.bot_context import PerBot
+from services.notification_queue import notification_queue
+from services.value_parser import parse_price
+
+logger = logging.getLogger(__name__)
+
+ANY_CATEGORY = "*"
+NO_PRICE = ""     # Index currency slot of subscriptions without a price range
+ANY_CURRENCY = "?" # ... and of price ranges given without a currency
+MAX_SUBSCRIPTION_TOKENS = 5
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Words that pick a category when they appear in a saved search
+CATEGORY_SYNONYMS = {
+    "cars": {"car", "cars", "auto", "avto", "mashina", "машина", "машины", "авто", "автомобиль", "автомобили"},
+    "houses": {"house", "houses", "apartment", "flat", "uy", "kvartira", "дом", "квартира", "недвижимость"},
+    "animals": {"animal", "animals", "pet", "hayvon", "животное", "животные"},
+}
+_STOP_WORDS = {"in", "the", "a", "for", "and", "with", "в", "на", "и", "для", "da", "va", "uchun"}
+
+# "under $10k", "до 100 млн сум", "10000$ gacha" / "from 5000", "от 5000", "5000 dan". Suffixes must be whole
+# words, so "under 8000 mercedes" doesn't read as 8000 million plus the word "ercedes"
+_PRICE_CHUNK = (r"[$€₽]?\s?\d[\d.,' ]*(?:\s?(?:k|к|ming|mln|млн|m)(?!\w))?"
+                r"(?:\s?(?:\$|€|₽|usd|eur|rub|руб|so'm|som|sum|сум|uzs)(?!\w))?")
+_UPPER_RE = re.compile(rf"(?:under|below|max|up to|до|не дороже|<)\s*({_PRICE_CHUNK})|({_PRICE_CHUNK})\s*gacha", re.IGNORECASE)
+_LOWER_RE = re.compile(rf"(?:over|above|from|min|от|>)\s*({_PRICE_CHUNK})|({_PRICE_CHUNK})\s*dan\b", re.IGNORECASE)
+
+
+def tokenize(text: str) -> Set[str]:
+    return set(_TOKEN_RE.findall((text or "").lower()))
+
+
+def parse_subscription_query(text: str) -> Optional[dict]:
+    """
+    "cars under $10k in Tashkent" -> {"category": "cars", "tokens": ["tashkent"], "price_min": None,
+    "price_max": 10000.0, "currency": "USD"}. Returns None if nothing usable was found.
+    """
+    remaining = text
+    bounds = {}
+    for key, regex in (("price_max", _UPPER_RE), ("price_min", _LOWER_RE)):
+        match = regex.search(remaining)
+        if match:
+            parsed = parse_price(match.group(1) or match.group(2))
+            if parsed:
+                bounds[key] = parsed
+                remaining = remaining[:match.start()] + " " + remaining[match.end():]
+
+    category = None
+    tokens = []
+    for word in _TOKEN_RE.findall(remaining.lower()):
+        matched_category = next((key for key, words in CATEGORY_SYNONYMS.items() if word in words), None)
+        if matched_category and not category:
+            category = matched_category
+        elif word not in _STOP_WORDS and word not in tokens:
+            tokens.append(word)
+    tokens = tokens[:MAX_SUBSCRIPTION_TOKENS]
+
+    currency = next((b["currency"] for b in bounds.values() if b["currency"]), None)
+    if not (category or tokens or bounds):
+        return None
+    return {
+        "category": category,
+        "tokens": tokens,
+        "price_min": bounds["price_min"]["amount"] if "price_min" in bounds else None,
+        "price_max": bounds["price_max"]["amount"] if "price_max" in bounds else None,
+        "currency": currency,
+    }
+
+
+class _PostingList:
+    """Subscriptions sharing one index key, kept sorted by their upper price bound (unbounded = inf)."""
+
+    def __init__(self):
+        self.keys: List[float] = []
+        self.ids: List[int] = []
+
+    def add(self, price_max: float, sub_id: int):
+        position = bisect.bisect_left(self.keys, price_max)
+        self.keys.insert(position, price_max)
+        self.ids.insert(position, sub_id)
+
+    def remove(self, price_max: float, sub_id: int):
+        position = bisect.bisect_left(self.keys, price_max)
+        while position < len(self.ids) and self.keys[position] == price_max:
+            if self.ids[position] == sub_id:
+                del self.keys[position]
+                del self.ids[position]
+                return
+            position += 1
+
+    def ids_with_max_at_least(self, amount: float) -> List[int]:
+        return self.ids[bisect.bisect_left(self.keys, amount):]
+
+
+class SubscriptionMatcher:
+    """
+    Inverted index over saved searches. Each subscription is filed under a single key
+    (category, anchor token, currency), where the anchor is its most selective token, and within
+    that key ordered by upper price bound. A new post probes only the keys built from its own
+    category, tokens and currency and bisects past every subscription whose price cap is too low,
+    so matching costs about the number of matches rather than the number of subscriptions.
+    """
+
+    def __init__(self):
+        self._subs: Dict[int, dict] = {}
+        self._lists: Dict[tuple, _PostingList] = {}
+
+    def __len__(self) -> int:
+        return len(self._subs)
+
+    @staticmethod
+    def _index_key(sub: dict) -> tuple:
+        anchor = max(sub["tokens"], key=len) if sub["tokens"] else ""
+        if sub["price_min"] is None and sub["price_max"] is None:
+            currency = NO_PRICE
+        else:
+            currency = sub["currency"] or ANY_CURRENCY
+        return (sub["category"] or ANY_CATEGORY, anchor, currency)
+
+    @staticmethod
+    def _price_cap(sub: dict) -> float:
+        return sub["price_max"] if sub["price_max"] is not None else math.inf
+
+    def add(self, sub: dict):
+        self.remove(sub["id"])
+        self._subs[sub["id"]] = sub
+        self._lists.setdefault(self._index_key(sub), _PostingList()).add(self._price_cap(sub), sub["id"])
+
+    def remove(self, sub_id: int):
+        sub = self._subs.pop(sub_id, None)
+        if sub is None:
+            return
+        key = self._index_key(sub)
+        posting_list = self._lists.get(key)
+        if posting_list:
+            posting_list.remove(self._price_cap(sub), sub_id)
+            if not posting_list.ids:
+                del self._lists[key]
+
+    def match(self, post: dict) -> List[dict]:
+        """post: category, tokens (set), price_amount, price_currency. Returns the matching subscriptions."""
+        post_tokens = post["tokens"]
+        amount = post.get("price_amount")
+        # (currency slot, price to bisect with); subscriptions without a price range take any post
+        lookups = [(NO_PRICE, None)]
+        if amount is not None:
+            if post.get("price_currency"):
+                lookups.append((post["price_currency"], amount))
+            lookups.append((ANY_CURRENCY, amount))
+        matches = []
+        for category in (post["category"], ANY_CATEGORY):
+            for anchor in list(post_tokens) + [""]:
+                for currency, bound in lookups:
+                    posting_list = self._lists.get((category, anchor, currency))
+                    if posting_list is None:
+                        continue
+                    candidate_ids = posting_list.ids if bound is None else posting_list.ids_with_max_at_least(bound)
+                    for sub_id in candidate_ids:
+                        sub = self._subs[sub_id]
+                        if self._matches(sub, post_tokens, amount):
+                            matches.append(sub)
+        return matches
+
+    @staticmethod
+    def _matches(sub: dict, post_tokens: Set[str], amount: Optional[float]) -> bool:
+        if any(token not in post_tokens for token in sub["tokens"]):
+            return False
+        if sub["price_min"] is not None or sub["price_max"] is not None:
+            if amount is None:
+                return False
+            if sub["price_min"] is not None and amount < sub["price_min"]:
+                return False
+            if sub["price_max"] is not None and amount > sub["price_max"]:
+                return False
+        return True
+
+
+matcher = PerBot(lambda bot: SubscriptionMatcher())
+profiler.register_structure("subscriptions.matcher", lambda: len(matcher))
+
+
+async def load_subscriptions():
+    """Rebuilds the in-memory index from the DB (at startup)."""
+    count = 0
+    async for sub in db.iter_active_subscriptions():
+        matcher.add(sub)
+        count += 1
+    logger.info(f"Loaded {count} saved-search subscriptions into the matcher.")
+
+
+async def add_subscription(user_id: int, lang: str, query_text: str, parsed: dict) -> int:
+    sub = {**parsed, "user_id": user_id, "lang": lang, "query_text": query_text}
+    sub["id"] = await db.add_subscription(sub)
+    matcher.add(sub)
+    return sub["id"]
+
+
+async def remove_subscription(sub_id: int, user_id: int) -> bool:
+    removed = await db.deactivate_subscription(sub_id, user_id)
+    if removed:
+        matcher.remove(sub_id)
+    return removed
+
+
+async def _drop_blocked_user(user_id: int):
+    """The user blocked the bot: stop matching their subscriptions."""
+    for sub_id in await db.deactivate_user_subscriptions(user_id):
+        matcher.remove(sub_id)
+    logger.info(f"User {user_id} blocked the bot, their subscriptions were deactivated.")
+
+
+def notify_matching_subscribers(post: dict, ad_text: str, link: Optional[str]) -> int:
+    """
+    Matches a just-published post against all saved searches and queues one DM per matching user.
+    post: id, user_id, category, price_amount, price_currency, and text fields used for tokens.
+    Returns the number of queued notifications. Never waits on the Bot API.
+    """
+    post_tokens = tokenize(" ".join(str(post.get(field) or "") for field in ("location", "search_fields", "search_text", "description")))
+    matches = matcher.match({**post, "tokens": post_tokens})
+    notified_users = set()
+    for sub in matches:
+        if sub["user_id"] == post.get("user_id") or sub["user_id"] in notified_users:
+            continue # No alerts about your own ad, and one alert per user per ad
+        notified_users.add(sub["user_id"])
+        header = get_text("subscription_alert", sub["lang"] or config.DEFAULT_LANGUAGE, query=sub["query_text"])
+        text = f"{header}\n\n{ad_text}" + (f"\n\n{link}" if link else "")
+        notification_queue.enqueue(sub["user_id"], text, on_forbidden=_drop_blocked_user)
+    if notified_users:
+        logger.info(f"Post {post.get('id')} matched {len(matches)} subscriptions, {len(notified_users)} alerts queued.")
+    return len(notified_users)
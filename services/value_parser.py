@@ -0,0 +1,164 @@
+# selling_bot/services/value_parser.py
+"""
+Normalizes free-text numeric answers ("$15,000", "15 000 so'm", "55k km", "120 m²") into numbers
+at input time, so they can be stored in typed, indexed columns next to the original text.
+Every parser returns None when it can't find a sensible value.
+"""
+import re
+from datetime import datetime
+
+# A number with optional thousands separators (space, nbsp, comma, dot, apostrophe) and decimals
+_NUMBER_RE = re.compile(r"\d(?:[\d,.' \u00a0\u202f]*\d)?")
+
+# Suffix multipliers, checked against the word right after the number
+_MULTIPLIERS = {
+    "k": 1_000, "к": 1_000, "тыс": 1_000, "ming": 1_000, "thousand": 1_000,
+    "m": 1_000_000, "mln": 1_000_000, "million": 1_000_000, "млн": 1_000_000,
+    "mlrd": 1_000_000_000, "млрд": 1_000_000_000, "bn": 1_000_000_000,
+}
+
+_CURRENCIES = [
+    ("USD", ("$", "usd", "dollar", "долл", "доллар", "у.е", "dollor")),
+    ("EUR", ("€", "eur", "euro", "евро")),
+    ("RUB", ("₽", "rub", "руб")),
+    ("UZS", ("so'm", "soʻm", "so‘m", "som", "sum", "сум", "сўм", "uzs")),
+]
+
+_MILE_UNITS = ("mile", "miles", "mi", "миль", "мили")
+_AREA_UNITS = [ # (factor to m², markers). Order matters: longer/more specific markers first.
+    (0.092903, ("sqft", "sq ft", "ft²", "ft2", "кв.фут")),
+    (10_000.0, ("hectare", "гектар", "ga", "га", "ha")),
+    (100.0, ("sotix", "sotik", "sotka", "сотих", "сотка", "соток", "сот")),
+    (1.0, ("m²", "m2", "sqm", "sq m", "кв.м", "кв м", "м²", "м2", "kv.m", "kvm", "metr", "метр")),
+]
+
+
+def _to_float(raw: str) -> float | None:
+    """Parses one number token, deciding whether ',' and '.' are thousands or decimal separators."""
+    token = re.sub(r"[\s'\u00a0\u202f]", "", raw)
+    if "," in token and "." in token:
+        decimal_sep = "," if token.rfind(",") > token.rfind(".") else "."
+        thousands_sep = "." if decimal_sep == "," else ","
+        token = token.replace(thousands_sep, "").replace(decimal_sep, ".")
+    else:
+        for sep in (",", "."):
+            if sep not in token:
+                continue
+            groups = token.split(sep)
+            # "15,000" / "1.500.000" are thousands, "150.00" / "1,5" are decimals
+            if len(groups) > 2 or (len(groups[-1]) == 3 and groups[0] != "0"):
+                token = token.replace(sep, "")
+            else:
+                token = token.replace(sep, ".")
+    try:
+        return float(token)
+    except ValueError:
+        return None
+
+
+def _first_number(text: str, allow_multiplier: bool = True):
+    """Returns (value, rest_of_text_after_number) with any k/mln multiplier applied, or (None, text)."""
+    match = _NUMBER_RE.search(text)
+    if not match:
+        return None, text
+    value = _to_float(match.group(0))
+    if value is None:
+        return None, text
+    rest = text[match.end():].lstrip()
+    # A multiplier word must end there: "15k" / "1.5 mln" yes, "120 m2" no
+    suffix = re.match(r"([^\W\d_]+)\.?(?![\w²])", rest) if allow_multiplier else None
+    if suffix:
+        word = suffix.group(1).lower()
+        if word in _MULTIPLIERS:
+            value *= _MULTIPLIERS[word]
+            rest = rest[suffix.end():]
+    return value, rest
+
+
+def _contains_marker(text: str, markers) -> bool:
+    for marker in markers:
+        if marker.isalpha():
+            if re.search(rf"(?<![^\W\d_]){re.escape(marker)}", text):
+                return True
+        elif marker in text:
+            return True
+    return False
+
+
+def parse_price(text: str) -> dict | None:
+    """"$15,000" -> {"amount": 15000.0, "currency": "USD"}. Currency is None if it can't be recognized."""
+    value, _ = _first_number(text)
+    if value is None:
+        return None
+    lowered = text.lower()
+    currency = None
+    for code, markers in _CURRENCIES:
+        if _contains_marker(lowered, markers):
+            currency = code
+            break
+    return {"amount": value, "currency": currency}
+
+
+def parse_mileage(text: str) -> int | None:
+    """"55k km" -> 55000, "30 000 miles" -> 48280 (always kilometres)."""
+    value, rest = _first_number(text)
+    if value is None:
+        return None
+    if _contains_marker(rest.lower(), _MILE_UNITS):
+        value *= 1.609344
+    return int(round(value))
+
+
+def parse_area(text: str) -> float | None:
+    """"120 m²" -> 120.0, "6 sotix" -> 600.0, "1200 sqft" -> 111.48 (always square metres)."""
+    value, rest = _first_number(text, allow_multiplier=False)
+    if value is None or value <= 0:
+        return None
+    lowered = rest.lower()
+    for factor, markers in _AREA_UNITS:
+        if _contains_marker(lowered, markers):
+            return round(value * factor, 2)
+    return round(value, 2) # No unit: square metres is what everyone here means
+
+
+def parse_year(text: str) -> int | None:
+    """A four-digit year between 1900 and next year."""
+    match = re.search(r"\b(1[89]\d\d|20\d\d)\b", text)
+    if not match:
+        return None
+    year = int(match.group(1))
+    return year if 1900 <= year <= datetime.now().year + 1 else None
+
+
+def parse_rooms(text: str) -> int | None:
+    value, _ = _first_number(text, allow_multiplier=False)
+    if value is None or value != int(value) or not 1 <= value <= 100:
+        return None
+    return int(value)
+
+
+# Category-specific fields that get a typed companion value -> (posts column, parser)
+FIELD_PARSERS = {
+    "car_year": ("car_year", parse_year),
+    "car_mileage": ("car_mileage_km", parse_mileage),
+    "house_rooms": ("house_rooms", parse_rooms),
+    "house_area": ("house_area_m2", parse_area),
+    "house_year_built": ("house_year_built", parse_year),
+}
+
+
+def parse_price_columns(text: str) -> dict:
+    """Typed price columns for a price text ({} if no amount could be found)."""
+    parsed = parse_price(text) if text else None
+    return {"price_amount": parsed["amount"], "price_currency": parsed["currency"]} if parsed else {}
+
+
+def parse_all_columns(price_text: str, category_specific_data: dict) -> dict:
+    """Typed columns for a whole post, used to backfill rows saved before parsing existed."""
+    columns = parse_price_columns(price_text)
+    for field_key, (column, parser) in FIELD_PARSERS.items():
+        raw = (category_specific_data or {}).get(field_key)
+        value = parser(str(raw)) if raw else None
+        if value is not None:
+            columns[column] = value
+    return columns
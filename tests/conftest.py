@@ -0,0 +1,65 @@
+# selling_bot/tests/conftest.py
+"""
+Shared fixtures. Tests are plain `async def` functions, each run on a fresh event loop (no plugin needed).
+
+open_storage gives a disposable, initialized storage backend: SQLite in the test's temporary directory,
+and PostgreSQL in a schema of its own (dropped afterwards) when STORAGE_TEST_DSN names a server, e.g.
+
+    STORAGE_TEST_DSN=postgresql://localhost/scratch python -m pytest
+"""
+import asyncio
+import inspect
+import os
+import uuid
+from contextlib import asynccontextmanager
+
+import pytest
+
+from services import database_service
+from services.storage import create_storage
+
+STORAGE_TEST_DSN = os.environ.get("STORAGE_TEST_DSN")
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    if inspect.iscoroutinefunction(pyfuncitem.obj):
+        arguments = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+        asyncio.run(pyfuncitem.obj(**arguments))
+        return True
+    return None
+
+
+@pytest.fixture
+def sqlite_storage(tmp_path, monkeypatch):
+    """Async context manager factory: the SQLite backend (the module-level storage) on files in tmp_path."""
+    monkeypatch.setattr(database_service, "DATABASE_NAME", str(tmp_path / "test.db"))
+
+    @asynccontextmanager
+    async def open_sqlite():
+        db = create_storage("sqlite")
+        await db.init_db()
+        try:
+            yield db
+        finally:
+            await db.close_db()
+    return open_sqlite
+
+
+@pytest.fixture(params=["sqlite", pytest.param("postgres", marks=pytest.mark.skipif(
+    not STORAGE_TEST_DSN, reason="STORAGE_TEST_DSN not set"))])
+def open_storage(request, sqlite_storage):
+    """Async context manager factory for every backend the conformance tests run on."""
+    if request.param == "sqlite":
+        return sqlite_storage
+
+    @asynccontextmanager
+    async def open_postgres():
+        db = create_storage("postgres", dsn=STORAGE_TEST_DSN, schema=f"storage_test_{uuid.uuid4().hex[:8]}")
+        await db.init_db()
+        try:
+            yield db
+        finally:
+            await db.drop_schema()
+            await db.close_db()
+    return open_postgres
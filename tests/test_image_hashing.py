@@ -0,0 +1,265 @@
+# selling_bot/tests/test_image_hashing.py
+"""
+The photo near-duplicate pipeline (services/image_hashing.py): the dHash itself, the multi-index lookup
+against a brute-force scan, and the whole pipeline (getFile, download, hashing in the process pool,
+persisting matches, queue overflow) against a stand-in Bot API server on localhost. Needs Pillow.
+"""
+import asyncio
+import io
+import json
+import random
+from urllib.parse import parse_qs
+
+import aiosqlite
+import pytest
+from telegram import Bot
+
+from config import IMAGE_HASH_MAX_DISTANCE
+from constants import CAT_SPECIFIC_DATA_KEY, PARSED_VALUES_KEY
+from services import database_service
+from services import image_hashing
+from services.image_hashing import Image, ImageHashPipeline, MultiIndexHash, compute_dhash, to_signed, to_unsigned
+from services.storage import storage as db
+
+pytestmark = pytest.mark.skipif(Image is None, reason="Pillow is not installed")
+
+BOT_TOKEN = "123456:image-hash-test"
+
+
+def distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _picture(seed: int, size=(640, 480)) -> "Image.Image":
+    """A photo-like test picture: a gradient with a few random shapes, different for every seed."""
+    from PIL import ImageDraw
+    rng = random.Random(seed)
+    image = Image.linear_gradient("L").resize(size).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        radius = rng.randrange(20, 120)
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius),
+                     fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    return image
+
+
+def _jpeg(image, quality: int = 90, scale: float = 1.0) -> bytes:
+    if scale != 1.0:
+        image = image.resize((int(image.width * scale), int(image.height * scale)))
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=quality)
+    return output.getvalue()
+
+
+class StandInBotApi:
+    """
+    Just enough of the Bot API for the pipeline, on localhost: getMe, getFile and file downloads,
+    served from `files` (file_id -> bytes). Unknown file ids get the error Telegram gives.
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.downloads = 0
+        self._server = None
+
+    async def start(self) -> int:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def bot(self, port: int) -> Bot:
+        return Bot(BOT_TOKEN, base_url=f"http://127.0.0.1:{port}/bot", base_file_url=f"http://127.0.0.1:{port}/file/bot")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            _, path, _ = (await reader.readline()).decode().split(" ", 2)
+            headers = {}
+            while (line := (await reader.readline()).decode().strip()):
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            status, content_type, payload = self._respond(path, headers.get("content-type", ""), body)
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(payload)}\r\n"
+                         f"Connection: close\r\n\r\n".encode() + payload)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    def _respond(self, path: str, content_type: str, body: bytes) -> tuple:
+        if path.startswith("/file/bot"): # /file/bot<token>/photos/<file_id>.jpg
+            file_id = path.rsplit("/", 1)[-1].removesuffix(".jpg")
+            if file_id not in self.files:
+                return "404 Not Found", "text/plain", b"Not Found"
+            self.downloads += 1
+            return "200 OK", "image/jpeg", self.files[file_id]
+        method = path.rsplit("/", 1)[-1]
+        if content_type.startswith("application/json"):
+            parameters = json.loads(body or b"{}")
+        else:
+            parameters = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+        if method == "getMe":
+            result = {"id": 123456, "is_bot": True, "first_name": "Check", "username": "image_hash_test_bot"}
+        elif method == "getFile" and parameters.get("file_id") in self.files:
+            file_id = parameters["file_id"]
+            result = {"file_id": file_id, "file_unique_id": f"u_{file_id}", "file_size": len(self.files[file_id]),
+                      "file_path": f"photos/{file_id}.jpg"}
+        else:
+            error = {"ok": False, "error_code": 400, "description": "Bad Request: invalid file_id"}
+            return "400 Bad Request", "application/json", json.dumps(error).encode()
+        return "200 OK", "application/json", json.dumps({"ok": True, "result": result}).encode()
+
+
+async def _published_post(user_id: int, file_ids: list) -> tuple:
+    """A published post with the given photos; returns (post_id, media_files)."""
+    media_files = [{"type": "photo", "file_id": file_id, "file_unique_id": f"u_{file_id}"} for file_id in file_ids]
+    user_data = {"user_id": user_id, "lang": "en", "category": "other", "price": "1$", "location": "Tashkent",
+                 "description": "image hash check", "media_files": media_files,
+                 CAT_SPECIFIC_DATA_KEY: {}, PARSED_VALUES_KEY: {}}
+    post_id = await db.save_post(user_data, "image hash check", None, None)
+    await db.update_post_status(post_id, "published", channel_message_id=post_id)
+    return post_id, media_files
+
+
+async def _stored_hashes() -> dict:
+    """post_id -> the stored hashes of its photos."""
+    hashes = {}
+    async for post_id, _, value in db.iter_image_hashes():
+        hashes.setdefault(post_id, []).append(to_unsigned(value))
+    return hashes
+
+
+async def _stored_matches() -> set:
+    async with aiosqlite.connect(database_service.database_path()) as connection:
+        async with connection.execute("SELECT post_id, matched_post_id, distance FROM image_matches") as cursor:
+            return {tuple(row) async for row in cursor}
+
+
+# --- Tests ---
+
+def test_dhash():
+    original = _picture(1)
+    value = compute_dhash(_jpeg(original))
+    assert 0 <= value < 1 << 64, "a 64-bit unsigned hash"
+    assert compute_dhash(_jpeg(original)) == value, "the same bytes hash the same"
+    for quality, scale in ((60, 1.0), (90, 0.5), (40, 0.75), (95, 1.6)):
+        copy = compute_dhash(_jpeg(original, quality, scale))
+        assert distance(copy, value) <= IMAGE_HASH_MAX_DISTANCE, \
+            f"a re-encoded copy (quality {quality}, scale {scale}) is within {IMAGE_HASH_MAX_DISTANCE} bits"
+    others = [distance(compute_dhash(_jpeg(_picture(seed))), value) for seed in range(2, 12)]
+    assert min(others) > 3 * IMAGE_HASH_MAX_DISTANCE, f"different pictures are far apart (closest {min(others)} bits)"
+    for extreme in (0, 1, (1 << 63) - 1, 1 << 63, (1 << 64) - 1):
+        assert -(1 << 63) <= to_signed(extreme) < 1 << 63 and to_unsigned(to_signed(extreme)) == extreme, \
+            f"{extreme} round-trips through a signed 64-bit column"
+
+
+def test_index():
+    rng = random.Random(36)
+    index = MultiIndexHash()
+    stored = {}
+    for post_id in range(1, 3001):
+        value = rng.getrandbits(64)
+        index.add(value, post_id, post_id % 7)
+        stored.setdefault(value, (post_id, post_id % 7))
+    index.add(next(iter(stored)), 99999, 0)
+    assert len(index) == len(stored) and index.query(next(iter(stored)), 0)[0][1] != 99999, \
+        "a known hash keeps its first post"
+
+    values = list(stored)
+    for flips in range(IMAGE_HASH_MAX_DISTANCE + 1):
+        for value in rng.sample(values, 200):
+            query = value
+            for bit in rng.sample(range(64), flips):
+                query ^= 1 << bit
+            assert (flips, *stored[value]) in index.query(query, IMAGE_HASH_MAX_DISTANCE), \
+                f"a hash {flips} bits away is found"
+    for value in rng.sample(values, 50):
+        query = value
+        for bit in rng.sample(range(64), IMAGE_HASH_MAX_DISTANCE + 1):
+            query ^= 1 << bit
+        assert all(match[0] <= IMAGE_HASH_MAX_DISTANCE for match in index.query(query, IMAGE_HASH_MAX_DISTANCE)), \
+            "nothing beyond max_distance is returned"
+
+    # Against a full scan, on a crowded neighbourhood where every chunk table has candidates
+    base = rng.getrandbits(64)
+    crowded = MultiIndexHash()
+    near = {}
+    for post_id in range(1, 2001):
+        value = base
+        for bit in rng.sample(range(64), rng.randrange(0, 9)):
+            value ^= 1 << bit
+        crowded.add(value, post_id, 0)
+        near.setdefault(value, post_id)
+    for _ in range(100):
+        query = base ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64))
+        expected = sorted((distance(value, query), post_id, 0) for value, post_id in near.items()
+                          if distance(value, query) <= IMAGE_HASH_MAX_DISTANCE)
+        assert crowded.query(query, IMAGE_HASH_MAX_DISTANCE) == expected, "the index agrees with a full scan"
+
+
+async def test_pipeline(sqlite_storage):
+    async with sqlite_storage(), StandInBotApi() as api:
+        original, other = _picture(101), _picture(102)
+        api.files.update({"orig": _jpeg(original), "reupload": _jpeg(original, 70, 0.8), "other": _jpeg(other)})
+        bot = api.bot(await api.start())
+        pipeline = ImageHashPipeline(workers=2, queue_size=100, max_distance=IMAGE_HASH_MAX_DISTANCE)
+        async with bot:
+            await pipeline.start(bot)
+            try:
+                first, first_media = await _published_post(4001, ["orig"])
+                pipeline.enqueue_post(first, 4001, first_media)
+                await asyncio.wait_for(pipeline.drain(), 30)
+                # A different seller re-uploads the picture; a missing file must not stop the pipeline
+                second, second_media = await _published_post(4002, ["missing", "reupload", "other"])
+                second_media.append({"type": "video", "file_id": "orig"})
+                pipeline.enqueue_post(second, 4002, second_media)
+                await asyncio.wait_for(pipeline.drain(), 30)
+            finally:
+                await pipeline.stop()
+        hashes = await _stored_hashes()
+        assert len(hashes.get(first, [])) == 1 and len(hashes.get(second, [])) == 2, \
+            "every downloadable photo is hashed once; the missing file and the video are skipped"
+        assert api.downloads == 3, f"three photos downloaded, got {api.downloads}"
+        matches = await _stored_matches()
+        assert len(matches) == 1 and next(iter(matches))[:2] == (second, first), \
+            f"the re-upload matches the original: {matches}"
+        assert next(iter(matches))[2] <= IMAGE_HASH_MAX_DISTANCE, "with its distance"
+
+        restarted = ImageHashPipeline(workers=1, queue_size=10, max_distance=IMAGE_HASH_MAX_DISTANCE)
+        async with bot:
+            await restarted.start(bot)
+            await restarted.stop()
+        assert len(restarted.index) == 3, "the index is rebuilt from the stored hashes at startup"
+
+
+async def test_queue_overflow(sqlite_storage):
+    async with sqlite_storage(), StandInBotApi() as api:
+        api.files.update({f"flood{i}": _jpeg(_picture(200 + i), scale=0.25) for i in range(5)})
+        bot = api.bot(await api.start())
+        pipeline = ImageHashPipeline(workers=1, queue_size=2, max_distance=IMAGE_HASH_MAX_DISTANCE)
+        post_id, media = await _published_post(4003, [f"flood{i}" for i in range(5)])
+        pipeline.enqueue_post(post_id, 4003, media)
+        assert len(pipeline) == 0, "nothing is queued before the pipeline runs"
+        async with bot:
+            await pipeline.start(bot)
+            try:
+                pipeline.enqueue_post(post_id, 4003, media) # All at once: the worker can't take any in between
+                assert len(pipeline) == 2, f"the queue stops at its bound, got {len(pipeline)}"
+                await asyncio.wait_for(pipeline.drain(), 30)
+                pipeline.enqueue_post(post_id, 4003, media[2:3])
+                await asyncio.wait_for(pipeline.drain(), 30)
+            finally:
+                await pipeline.stop()
+        assert len((await _stored_hashes()).get(post_id, [])) == 3, \
+            "the dropped photos are skipped, later ones still run"
+        assert image_hashing._executor is None, "the process pool is shut down with its last pipeline"
@@ -0,0 +1,219 @@
+# selling_bot/tests/test_storage.py
+"""
+Conformance tests for the storage backends (services/storage.py): both must behave the same. PostgreSQL runs
+too when STORAGE_TEST_DSN is set (tests/conftest.py); `python -m services.storage_check` is the benchmark.
+"""
+import uuid
+
+from constants import CAT_SPECIFIC_DATA_KEY, PARSED_VALUES_KEY
+
+
+def _post(user_id: int, category: str, text: str, token: str = None, amount: float = None) -> tuple:
+    """(user_data, rendered_text, fingerprint, idempotency_token) for save_post."""
+    user_data = {"user_id": user_id, "lang": "en", "category": category, "price": f"{amount or 1}$",
+                 "location": "Tashkent", "description": text, "media_files": [{"type": "photo", "file_id": "f1"}],
+                 CAT_SPECIFIC_DATA_KEY: {"car_make_model": "Toyota Camry"},
+                 PARSED_VALUES_KEY: {"price_amount": amount, "price_currency": "USD" if amount else None}}
+    return user_data, text, None, token
+
+
+async def _publish(db, *args) -> int:
+    post_id = await db.save_post(*_post(*args))
+    await db.update_post_status(post_id, "published", channel_message_id=post_id * 10)
+    return post_id
+
+
+# --- Conformance (each test works on its own users, categories and words) ---
+
+async def test_posts(open_storage):
+    async with open_storage() as db:
+        token = uuid.uuid4().hex
+        post_id = await db.save_post(*_post(1001, "check_posts", "first ad", token, 1500))
+        assert isinstance(post_id, int), "save_post returns the new id"
+        assert await db.save_post(*_post(1001, "check_posts", "first ad", token, 1500)) is None, \
+            "a repeated idempotency token isn't saved again"
+        post = await db.get_post(post_id)
+        assert post["status"] == "pending" and post["user_id"] == 1001, "get_post returns the saved post"
+        assert post["media_files"] == [{"type": "photo", "file_id": "f1"}], "media_files round-trips as a list"
+        assert post["category_specific_data"] == {"car_make_model": "Toyota Camry"}, "category data round-trips"
+        assert post["price_amount"] == 1500 and len(post["created_at"]) == 19, "typed values and text timestamps"
+        await db.update_post_status(post_id, "published", channel_message_id=7, channel_message_ids=[7, 8])
+        post = await db.get_post(post_id)
+        assert post["status"] == "published" and post["channel_message_ids"] == [7, 8], "status and album message ids"
+        assert await db.get_post(10 ** 12) is None, "a missing post is None"
+
+        await db.set_post_expiry(post_id, "2090-01-02 00:00:00")
+        second = await _publish(db, 1001, "check_posts", "second ad")
+        await db.set_post_expiry(second, "2090-01-01 00:00:00")
+        due = await db.get_expiring_posts("2090-12-31 00:00:00", ("", 0), 10)
+        assert due == [(second, "2090-01-01 00:00:00"), (post_id, "2090-01-02 00:00:00")], \
+            "expiring posts in deadline order"
+        assert await db.get_expiring_posts("2090-12-31 00:00:00", (due[0][1], due[0][0]), 10) == due[1:], \
+            "expiry keyset"
+        await db.set_post_expiry(second, "2091-01-01 00:00:00", channel_message_ids=[5], bumped_at="2090-01-01 00:00:00")
+        assert await db.expire_posts(due) == [post_id], "expire_posts skips posts bumped since they were scheduled"
+        assert (await db.get_post(second))["channel_message_ids"] == [5], "a bump replaces the channel messages"
+        assert await db.find_duplicate_post("nope", 1001) is None, "no duplicate without a matching fingerprint"
+
+
+async def test_search(open_storage):
+    async with open_storage() as db:
+        word = f"zq{uuid.uuid4().hex[:8]}"
+        ids = [await _publish(db, 1002, "check_search", f"{word} sedan number {i}") for i in range(5)]
+        await db.save_post(*_post(1002, "check_search", f"{word} not published"))
+        rows = await db.search_posts(f'"{word}"', 3)
+        assert [row[0] for row in rows] == ids[::-1][:3], "search returns published posts newest first"
+        assert len(rows[0]) == 6, "search rows are (id, category, search_fields, price, location, channel_message_id)"
+        older = await db.search_posts(f'"{word}"', 3, before_id=rows[-1][0])
+        assert [row[0] for row in older] == ids[1::-1], "before_id pages to older posts"
+        newer = await db.search_posts(f'"{word}"', 3, after_id=older[0][0])
+        assert [row[0] for row in newer] == [row[0] for row in rows], "after_id pages back, still newest first"
+        assert [row[0] for row in await db.search_posts(f'"{word[:5]}"*', 10)] == ids[::-1], "prefix search"
+        assert await db.search_posts(f'"{word}" "missingword"', 10) == [], "words are ANDed"
+        inline = await db.search_posts_with_media(f'"{word}"', 2)
+        assert [row[0] for row in inline] == ids[:2:-1] and inline[0][6] == [{"type": "photo", "file_id": "f1"}], \
+            "inline search returns the media list"
+        assert await db.update_published_post(ids[0], 1002, {"location": "Samarkand"}, f"{word} edited"), \
+            "the owner edits a published post"
+        assert not await db.update_published_post(ids[0], 9999, {"location": "x"}, "x"), "others can't edit it"
+        assert [row[0] for row in await db.search_posts('"samarkand"', 10)][:1] == [ids[0]], "edits are searchable"
+        await db.update_post_status(ids[1], "sold")
+        assert ids[1] not in [row[0] for row in await db.search_posts(f'"{word}"', 10)], \
+            "unpublished posts leave the index"
+        mixed_word = f"zq{uuid.uuid4().hex[:8]}"
+        mixed = [await _publish(db, 1100 + i % 5, "check_search", f"{mixed_word} seller {i}") for i in range(10)]
+        assert [row[0] for row in await db.search_posts(f'"{mixed_word}"', 10)] == mixed[::-1], \
+            "posts of different sellers (so different shards) come newest first"
+
+
+async def test_user_history(open_storage):
+    async with open_storage() as db:
+        user_id = 1003
+        ids = [await _publish(db, user_id, "check_history", f"history {i}") for i in range(4)]
+        assert await db.get_user_post_count(user_id) == 4, "per-user post count"
+        rows = await db.get_user_posts(user_id, 2)
+        assert [row[0] for row in rows] == ids[:1:-1] and len(rows[0]) == 5, "user posts newest first"
+        older = await db.get_user_posts(user_id, 2, before_id=rows[-1][0])
+        assert [row[0] for row in older] == ids[1::-1], "before_id pages to older posts"
+        assert [row[0] for row in await db.get_user_posts(user_id, 2, after_id=older[0][0])] == [row[0] for row in rows], \
+            "after_id pages back"
+        assert await db.mark_posts_sold([ids[2], ids[0], 10 ** 12], user_id) == [ids[2], ids[0]], \
+            "mark_posts_sold returns the changed ids in the given order"
+        assert await db.mark_posts_sold([ids[1]], 9999) == [], "only the owner marks posts sold"
+
+
+async def test_moderation(open_storage):
+    async with open_storage() as db:
+        pending_before = await db.count_pending_review()
+        ids = []
+        for i in range(3):
+            post_id = await db.save_post(*_post(1004, "check_moderation", f"review {i}"))
+            await db.update_post_status(post_id, "pending_review")
+            ids.append(post_id)
+        assert await db.count_pending_review() == pending_before + 3, "pending count"
+        page = [row for row in await db.get_review_page(0, 1000) if row[0] in ids]
+        assert [row[0] for row in page] == ids and page[0][1:4] == (1004, "en", "check_moderation"), \
+            "review page in id order"
+        assert [row[0] for row in await db.get_review_page(ids[0], 1000) if row[0] in ids] == ids[1:], "review keyset"
+        assert await db.set_review_status([ids[1], ids[0]], "pending_review", "approved") == [ids[1], ids[0]], "approve"
+        assert await db.set_review_status([ids[0]], "pending_review", "rejected") == [], \
+            "a decided post isn't decided again"
+        assert set(ids[:2]) <= set(await db.get_approved_post_ids()), "approved posts are listed for publishing"
+
+
+async def test_stats(open_storage):
+    async with open_storage() as db:
+        category = f"check_stats_{uuid.uuid4().hex[:6]}"
+        for status in ("published", "published", "sold"):
+            post_id = await db.save_post(*_post(1005, category, "stats"))
+            await db.update_post_status(post_id, status)
+
+        async def counts():
+            totals, daily = await db.get_post_stats("2000-01-01")
+            return ({(row[1]): row[2] for row in totals if row[0] == category},
+                    sum(row[3] for row in daily if row[1] == category))
+
+        assert await counts() == ({"published": 2, "sold": 1}, 3), "summaries follow inserts and status changes"
+        await db.rebuild_post_stats()
+        assert await counts() == ({"published": 2, "sold": 1}, 3), "a rebuild gives the same summaries"
+        totals, daily = await db.get_post_stats("2000-01-01")
+        assert [row[0] for row in daily] == sorted((row[0] for row in daily), reverse=True), "daily rows newest first"
+
+
+async def test_users_and_broadcasts(open_storage):
+    async with open_storage() as db:
+        users = [2001, 2002, 2003]
+        for user_id in users:
+            await db.set_user_pref_lang(user_id, "ru", "Name", None)
+        assert await db.get_user_pref_lang(2001) == "ru" and await db.get_user_pref_lang(2999) is None, \
+            "language preference"
+        broadcast_id = await db.create_broadcast("hello", 1)
+        assert await db.get_running_broadcast_id() == broadcast_id, "a new broadcast is running"
+        recipients = [row for row in await db.get_broadcast_recipients(2000, 100) if row[0] in users]
+        assert recipients == [(2001, "ru"), (2002, "ru"), (2003, "ru")], "recipients in user_id order"
+        await db.checkpoint_broadcast(broadcast_id, 2002, 1, 0, [2002])
+        broadcast = await db.get_broadcast(broadcast_id)
+        assert (broadcast["last_user_id"], broadcast["sent"], broadcast["blocked"]) == (2002, 1, 1), "checkpoint"
+        assert 2002 not in [row[0] for row in await db.get_broadcast_recipients(2000, 100)], "blocked users are skipped"
+        await db.set_user_pref_lang(2002, "en", "Name", "name")
+        assert 2002 in [row[0] for row in await db.get_broadcast_recipients(2000, 100)], "coming back clears the block"
+        await db.finish_broadcast(broadcast_id, "done")
+        assert (await db.get_broadcast())["status"] == "done" and await db.get_running_broadcast_id() is None, "finish"
+
+
+async def test_targets_and_digests(open_storage):
+    async with open_storage() as db:
+        post_id = await _publish(db, 1006, "check_digest", "digest ad")
+        await db.reset_post_targets(post_id, [-100, "@channel"])
+        await db.update_post_target(post_id, -100, "published", [1, 2])
+        targets = {target["chat_id"]: target for target in await db.get_post_targets(post_id)}
+        assert targets["-100"]["message_ids"] == [1, 2] and targets["@channel"]["status"] == "pending", "post targets"
+        await db.enqueue_digest(post_id, "check_digest")
+        await db.enqueue_digest(post_id, "check_digest")
+        assert (await db.count_digest_queue()).get("check_digest") == 1, "a post is queued once"
+        assert await db.get_digest_batch("check_digest", 10) == [(post_id, "published", "Toyota Camry", "1$", "Tashkent")], \
+            "digest batch with the post fields"
+        await db.record_digest_targets([post_id], -200, [9])
+        assert [(t["chat_id"], t["status"]) for t in await db.get_post_targets(post_id)] == [("-200", "digest")], \
+            "the digest becomes the only target"
+        await db.remove_from_digest([post_id])
+        assert "check_digest" not in await db.count_digest_queue(), "removed from the queue"
+
+
+async def test_subscriptions(open_storage):
+    async with open_storage() as db:
+        sub = {"user_id": 1007, "lang": "en", "query_text": "toyota", "category": "cars", "tokens": ["toyota"],
+               "price_min": 1000.0, "price_max": None, "currency": "USD"}
+        first, second = await db.add_subscription(sub), await db.add_subscription({**sub, "query_text": "camry"})
+        listed = await db.get_user_subscriptions(1007)
+        assert [s["id"] for s in listed] == [first, second] and listed[0]["tokens"] == ["toyota"], "user subscriptions"
+        assert first in [s["id"] async for s in db.iter_active_subscriptions()], "active subscriptions are streamed"
+        assert await db.deactivate_subscription(first, 1007) and not await db.deactivate_subscription(first, 1007), \
+            "deactivated once"
+        assert await db.deactivate_user_subscriptions(1007) == [second], "all of a user's subscriptions"
+
+
+async def test_saved_state(open_storage):
+    async with open_storage() as db:
+        post_id = await _publish(db, 1008, "check_state", "state", None)
+        await db.save_image_hash(post_id, "u1", -12345, [(1, 5)])
+        await db.save_image_hash(post_id, "u1", -12345, [(1, 3)])
+        assert (post_id, 1008, -12345) in [row async for row in db.iter_image_hashes()], "image hashes (signed 64-bit)"
+        await db.save_funnel_rollups([("2090-01-01 00:00:00", "check_state", "a", "b", 2, 10.0, 6.0, {"n": 2})])
+        assert ("check_state", "a", "b", {"n": 2}) in await db.get_funnel_rollups("2090-01-01 00:00:00"), \
+            "funnel rollups"
+        await db.save_rate_limit_state([("check", 1008, "[1.5]"), ("check", 1009, "[]")])
+        await db.save_rate_limit_state([("check", 1008, "[2.5]")])
+        assert [row for row in [row async for row in db.iter_rate_limit_state()] if row[0] == "check"] == [("check", 1008, "[2.5]")], \
+            "rate limit windows upserted, empty ones removed"
+        await db.save_price_sketches([("check_state", "*", "USD", {"count": 1})])
+        await db.save_price_sketches([("check_state", "*", "USD", {"count": 2})])
+        assert ("check_state", "*", "USD", {"count": 2}) in [row async for row in db.iter_price_sketches()], \
+            "price sketches"
+        priced = await _publish(db, 1008, "check_state", "priced", None, 2500)
+        assert ("check_state", {"car_make_model": "Toyota Camry"}, 2500, "USD") in [row async for row in db.iter_listed_prices()], \
+            "listed prices"
+        chunks = [chunk async for chunk in db.iter_posts_for_export(1, category="check_state")]
+        assert [chunk[0]["id"] for chunk in chunks] == [post_id, priced] and set(chunks[0][0]) == set(db.EXPORT_SELECT_COLUMNS), \
+            "export chunks in id order with the export columns"
+
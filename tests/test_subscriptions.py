@@ -0,0 +1,28 @@
+# selling_bot/tests/test_subscriptions.py
+"""Saved-search parsing (services/subscriptions.py): each query gives exactly the expected fields."""
+import pytest
+
+from services.subscriptions import parse_subscription_query
+
+# query -> (category, tokens, price_min, price_max, currency)
+QUERY_CASES = {
+    "cars under $10k in Tashkent": ("cars", ["tashkent"], None, 10000.0, "USD"),
+    "до 100 млн сум квартира": ("houses", [], None, 100000000.0, "UZS"),
+    "10000$ gacha": (None, [], None, 10000.0, "USD"),
+    "5000 dan uy": ("houses", [], 5000.0, None, None),
+    "от 5000 руб": (None, [], 5000.0, None, "RUB"),
+    "under 5m": (None, [], None, 5000000.0, None),
+    "under 15 000 so'm": (None, [], None, 15000.0, "UZS"),
+    # A word after the number is not a multiplier or currency just because it starts like one
+    "under 8000 mercedes": (None, ["mercedes"], None, 8000.0, None),
+    "under 5000 mashina": ("cars", [], None, 5000.0, None),
+    "under 20000 malibu": (None, ["malibu"], None, 20000.0, None),
+    "from 300 usd sumka": (None, ["sumka"], 300.0, None, "USD"),
+}
+
+
+@pytest.mark.parametrize("query, expected", QUERY_CASES.items(), ids=list(QUERY_CASES))
+def test_parse_subscription_query(query, expected):
+    parsed = parse_subscription_query(query)
+    assert parsed is not None
+    assert (parsed["category"], parsed["tokens"], parsed["price_min"], parsed["price_max"], parsed["currency"]) == expected